@@ -1,13 +1,15 @@
+import multiprocessing
 import os
 import shutil
 import sys
 import threading
+import time
 import webbrowser
-import xml.etree.ElementTree as ET
-import xml.dom.minidom as minidom
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from PIL import Image
+from functools import partial
 from PyQt5.QtWidgets import (
+    QAbstractItemView,
     QApplication,
     QFrame,
     QLabel,
@@ -19,6 +21,7 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QShortcut,
     QTextEdit,
+    QTreeView,
     QTreeWidget,
     QTreeWidgetItem,
     QDialog,
@@ -30,9 +33,11 @@ from PyQt5.QtWidgets import (
     QGroupBox,
     QCheckBox,
     QProgressBar,
+    QSpinBox,
 )
 from PyQt5.QtCore import (
     Qt,
+    QItemSelectionModel,
     QThread,
     pyqtSignal,
     QSettings,
@@ -43,206 +48,327 @@ from PyQt5.QtGui import QIcon, QPixmap, QKeySequence
 import subprocess
 import winshell
 import json
+import numpy as np
 import requests
 from bs4 import BeautifulSoup
+from nfo_parser import NFORecord, parse_nfo, parse_nfo_chunk, parse_single_nfo
+from nfo_cache import NFOCache
+from nfo_columns import argsort_groups, argsort_strings
+from nfo_index import NFOIndex, path_key
+from nfo_query import CompiledQuery, QueryError
+from nfo_search import sorted_ids
+from nfo_jobs import (
+    BatchEditJob,
+    JournalReplayJob,
+    SaveQueue,
+    add_tags,
+    apply_editor_fields,
+    fill_field,
+    replace_tags,
+)
+from nfo_journal import UNDONE, Journal, JournalRecorder
+from nfo_preview import MAX_PREFETCH_NEIGHBORS, POSTER, THUMB, PreviewLoader, PreviewRequest, fit_image, needs_decode
+from nfo_scanner import scan_library
 
 
 # ================ 异步加载和缓存机制 ================
 
-class NFOCache:
-    """NFO文件缓存管理器"""
-
-    def __init__(self):
-        self.cache = {}
-        self.file_paths = []
-
-    def get(self, path):
-        return self.cache.get(path)
-
-    def set(self, path, data):
-        self.cache[path] = data
-        if path not in self.file_paths:
-            self.file_paths.append(path)
-
-    def remove(self, path):
-        if path in self.cache:
-            del self.cache[path]
-        if path in self.file_paths:
-            self.file_paths.remove(path)
-
-    def clear(self):
-        self.cache.clear()
-        self.file_paths.clear()
-
-    def get_all_paths(self):
-        return self.file_paths.copy()
-
-    def size(self):
-        return len(self.cache)
-
-
 class LoadFilesThread(QThread):
     """异步加载NFO文件的线程"""
 
     progress = pyqtSignal(int, int, str)
-    item_ready = pyqtSignal(object, dict)
+    # 一批 [(nfo_path, NFORecord)]，只含纯数据，由 GUI 线程写入缓存和文件列表模型
+    batch_ready = pyqtSignal(list)
+    # 完整扫描结束时的目录快照 {nfo_path: (mtime_ns, size)}，供增量更新比对
+    snapshot_ready = pyqtSignal(dict)
     finished_signal = pyqtSignal(int)
     error = pyqtSignal(str)
 
-    def __init__(self, folder_path, batch_size=100):
+    # 每个进程池任务解析的文件数；待解析文件少于两块时不启动进程池
+    parse_chunk_size = 64
+    # 两次批量发送的最小间隔（秒），凑满 batch_size 或超时即发送
+    emit_interval = 0.1
+
+    def __init__(self, folder_path, batch_size=100, workers=0):
         super().__init__()
         self.folder_path = folder_path
         self.batch_size = batch_size
+        self.workers = workers
         self.is_running = True
+        self._executor = None
 
     def run(self):
         try:
-            nfo_files = []
-            for root, dirs, files in os.walk(self.folder_path):
-                if not self.is_running:
-                    return
-                for file in files:
-                    if file.endswith(".nfo"):
-                        nfo_files.append(os.path.join(root, file))
-
-            total = len(nfo_files)
-            if total == 0:
-                self.finished_signal.emit(0)
-                return
+            index, cached = self._open_index()
+            updates = []
 
-            for i, nfo_path in enumerate(nfo_files, 1):
-                if not self.is_running:
+            try:
+                nfo_files = self._collect_nfo_files(index)
+                if nfo_files is None:
                     return
 
-                try:
-                    cache_data = self._parse_nfo(nfo_path)
-                    relative_path = os.path.relpath(nfo_path, self.folder_path)
-                    parts = relative_path.split(os.sep)
-
-                    if len(parts) > 1:
-                        first_level = os.sep.join(parts[:-2]) if len(parts) > 2 else ""
-                        second_level = parts[-2]
-                        nfo_file = parts[-1]
-                    else:
-                        first_level = ""
-                        second_level = ""
-                        nfo_file = parts[-1]
+                total = len(nfo_files)
+                if total == 0:
+                    if index:
+                        index.remove_keys(cached.keys())
+                    self.snapshot_ready.emit({})
+                    self.finished_signal.emit(0)
+                    return
 
-                    tree_item = QTreeWidgetItem([first_level, second_level, nfo_file])
-                    self.item_ready.emit(tree_item, {nfo_path: cache_data})
-                    self.progress.emit(i, total, os.path.basename(nfo_path))
+                # 第一遍只做索引比对（stat 来自扫描器），找出需要重新解析的文件
+                plan = []
+                pending = []
+                for nfo_path, stat in nfo_files:
+                    if not self.is_running:
+                        return
+                    stat, record, fresh = self._lookup(nfo_path, cached, stat)
+                    plan.append((nfo_path, stat, record, fresh))
+                    if stat is not None and not fresh:
+                        pending.append(nfo_path)
+
+                parsed = self._parse_pending(pending)
+                batch = []
+                last_emit = time.monotonic()
+                snapshot = {}
+
+                for i, (nfo_path, stat, record, fresh) in enumerate(plan, 1):
+                    if not self.is_running:
+                        return
+                    if stat is None:
+                        continue
+                    snapshot[nfo_path] = (stat.st_mtime_ns, stat.st_size)
+
+                    if not fresh:
+                        record, error_msg = next(parsed)
+                        if error_msg:
+                            print(f"解析文件失败 {nfo_path}: {error_msg}")
+                        updates.append((nfo_path, stat, record))
+                    if record is None:
+                        continue
 
-                except Exception as e:
-                    print(f"解析文件失败 {nfo_path}: {str(e)}")
-                    continue
+                    batch.append((nfo_path, record))
+                    now = time.monotonic()
+                    if len(batch) >= self.batch_size or now - last_emit >= self.emit_interval:
+                        self._emit_batch(batch, i, total)
+                        batch = []
+                        last_emit = now
+
+                if batch:
+                    self._emit_batch(batch, total, total)
+
+                # 只有完整扫描后，索引里剩下的才是已删除的文件
+                if index:
+                    index.remove_keys(cached.keys())
+                self.snapshot_ready.emit(snapshot)
+            finally:
+                self._shutdown_executor()
+                if index:
+                    try:
+                        index.store(updates)
+                    except Exception as e:
+                        print(f"更新NFO索引失败: {str(e)}")
+                    index.close()
 
             self.finished_signal.emit(total)
 
         except Exception as e:
             self.error.emit(f"加载过程出错: {str(e)}")
 
-    def _parse_nfo(self, nfo_path):
-        tree = ET.parse(nfo_path)
-        root = tree.getroot()
-
-        data = {
-            'path': nfo_path,
-            'num': '',
-            'title': '',
-            'plot': '',
-            'series': '',
-            'rating': 0.0,
-            'release': '',
-            'actors': [],
-            'tags': [],
-        }
+    def _collect_nfo_files(self, index):
+        """用共享扫描器收集 [(NFO 路径, stat)]，中途停止返回 None
+
+        index 为 None（索引不可用）时不使用目录清单。
+        """
+        nfo_files = []
+        for manifest in scan_library(
+            self.folder_path,
+            index=index,
+            use_index=index is not None,
+            stat_files=True,
+            is_running=lambda: self.is_running,
+        ):
+            nfo_stats = manifest.nfo_stats
+            for nfo_path in manifest.nfos:
+                stat = nfo_stats.get(nfo_path)
+                if stat is not None:
+                    nfo_files.append((nfo_path, stat))
+        if not self.is_running:
+            return None
+        return nfo_files
 
-        for field in ['num', 'title', 'plot', 'series']:
-            elem = root.find(field)
-            if elem is not None and elem.text:
-                data[field] = elem.text.strip()
+    def _emit_batch(self, batch, current, total):
+        self.batch_ready.emit(batch)
+        self.progress.emit(current, total, os.path.basename(batch[-1][0]))
 
-        rating_elem = root.find('rating')
-        if rating_elem is not None and rating_elem.text:
+    def _open_index(self):
+        """打开持久化索引并读出本目录的记录，失败时退化为全量解析"""
+        index = None
+        try:
+            index = NFOIndex()
+            return index, index.load_folder(self.folder_path)
+        except Exception as e:
+            print(f"打开NFO索引失败: {str(e)}")
+            if index:
+                index.close()
+            return None, {}
+
+    def _lookup(self, nfo_path, cached, stat=None):
+        """返回 (stat, 记录, 索引是否有效)；stat 为 None 表示文件不可读"""
+        if stat is None:
             try:
-                data['rating'] = float(rating_elem.text.strip())
-            except ValueError:
-                data['rating'] = 0.0
+                stat = os.stat(nfo_path)
+            except OSError as e:
+                print(f"读取文件信息失败 {nfo_path}: {str(e)}")
+                return None, None, False
+
+        entry = cached.pop(path_key(nfo_path), None)
+        if entry is not None and entry.matches(stat):
+            if entry.failed:
+                return stat, None, True
+            try:
+                return stat, entry.record(nfo_path), True
+            except Exception as e:
+                print(f"读取NFO索引失败 {nfo_path}: {str(e)}")
+        return stat, None, False
+
+    def _parse_pending(self, paths):
+        """按原顺序产出 (NFORecord 或 None, 错误信息)；文件较多且开启多进程时分块并行解析"""
+        workers = min(self.workers, os.cpu_count() or 1)
+        chunk_size = self.parse_chunk_size
+        if workers <= 1 or len(paths) < chunk_size * 2:
+            for path in paths:
+                yield self._parse_one(path)
+            return
 
-        release_elem = root.find('release')
-        if release_elem is not None and release_elem.text:
-            data['release'] = release_elem.text.strip()
+        chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+        try:
+            # 显式使用 spawn：在带 Qt 线程的进程里 fork 并不安全
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            futures = [self._executor.submit(parse_nfo_chunk, chunk) for chunk in chunks]
+        except Exception as e:
+            print(f"启动解析进程池失败，改为单线程解析: {str(e)}")
+            self._shutdown_executor()
+            futures = [None] * len(chunks)
+
+        for chunk, future in zip(chunks, futures):
+            try:
+                results = future.result() if future is not None else None
+            except Exception as e:
+                print(f"解析进程出错，改为单线程解析: {str(e)}")
+                results = None
 
-        actors = []
-        for actor in root.findall('actor'):
-            name_elem = actor.find('name')
-            if name_elem is not None and name_elem.text:
-                actors.append(name_elem.text.strip())
-        data['actors'] = actors
+            if results is None:
+                for path in chunk:
+                    yield self._parse_one(path)
+                continue
+
+            for values, error_msg in results:
+                yield (NFORecord.from_tuple(values) if values is not None else None), error_msg
 
-        tags = []
-        for tag in root.findall('tag'):
-            if tag is not None and tag.text:
-                tags.append(tag.text.strip())
-        data['tags'] = tags
+    @staticmethod
+    def _parse_one(path):
+        try:
+            return parse_nfo(path), None
+        except Exception as e:
+            return None, str(e)
 
-        return data
+    def _shutdown_executor(self):
+        if self._executor is not None:
+            # 取消尚未开始的任务，不等待正在运行的块
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
     def stop(self):
         self.is_running = False
 
 
-def parse_single_nfo(nfo_path):
-    try:
-        tree = ET.parse(nfo_path)
-        root = tree.getroot()
-
-        data = {
-            'path': nfo_path,
-            'num': '',
-            'title': '',
-            'plot': '',
-            'series': '',
-            'rating': 0.0,
-            'release': '',
-            'actors': [],
-            'tags': [],
-        }
+class LibraryUpdateThread(LoadFilesThread):
+    """目录变化后的增量更新：与上次快照比对，只解析新增和修改过的NFO"""
+
+    # ([(nfo_path, NFORecord 或 None)] 新增/修改，[nfo_path] 已删除，新快照)
+    changes_ready = pyqtSignal(list, list, dict)
 
-        for field in ['num', 'title', 'plot', 'series']:
-            elem = root.find(field)
-            if elem is not None and elem.text:
-                data[field] = elem.text.strip()
+    def __init__(self, folder_path, snapshot, workers=0):
+        super().__init__(folder_path, workers=workers)
+        self.snapshot = snapshot
 
-        rating_elem = root.find('rating')
-        if rating_elem is not None and rating_elem.text:
+    def run(self):
+        try:
+            index = self._open_index_only()
             try:
-                data['rating'] = float(rating_elem.text.strip())
-            except ValueError:
-                data['rating'] = 0.0
+                # 未变化的子目录直接复用目录清单，只有被修改的目录才重新读取
+                nfo_files = self._collect_nfo_files(index)
+                if nfo_files is None:
+                    return
 
-        release_elem = root.find('release')
-        if release_elem is not None and release_elem.text:
-            data['release'] = release_elem.text.strip()
+                snapshot = {}
+                changed = []
+                for nfo_path, stat in nfo_files:
+                    signature = (stat.st_mtime_ns, stat.st_size)
+                    snapshot[nfo_path] = signature
+                    if self.snapshot.get(nfo_path) != signature:
+                        changed.append((nfo_path, stat))
+
+                removed = [path for path in self.snapshot if path not in snapshot]
+                if changed or removed:
+                    changed_records = self._load_changed(index, changed, removed)
+                    if changed_records is None:
+                        return
+                else:
+                    changed_records = []
+            finally:
+                self._shutdown_executor()
+                if index:
+                    index.close()
 
-        actors = []
-        for actor in root.findall('actor'):
-            name_elem = actor.find('name')
-            if name_elem is not None and name_elem.text:
-                actors.append(name_elem.text.strip())
-        data['actors'] = actors
+            self.changes_ready.emit(changed_records, removed, snapshot)
+            self.finished_signal.emit(len(changed_records) + len(removed))
 
-        tags = []
-        for tag in root.findall('tag'):
-            if tag is not None and tag.text:
-                tags.append(tag.text.strip())
-        data['tags'] = tags
+        except Exception as e:
+            self.error.emit(f"更新文件列表出错: {str(e)}")
+
+    def _load_changed(self, index, changed, removed):
+        """读取变化文件 [(路径, stat)] 的记录（先查索引，再解析），同步更新索引；中途停止返回 None"""
+        cached = index.lookup([path for path, _ in changed]) if index else {}
+        records = []
+        updates = []
+        pending = []
+        for nfo_path, stat in changed:
+            stat, record, fresh = self._lookup(nfo_path, cached, stat)
+            if stat is None:
+                continue
+            if fresh:
+                records.append((nfo_path, record))
+            else:
+                pending.append((nfo_path, stat))
+
+        parsed = self._parse_pending([path for path, _ in pending])
+        for nfo_path, stat in pending:
+            if not self.is_running:
+                return None
+            record, error_msg = next(parsed)
+            if error_msg:
+                print(f"解析文件失败 {nfo_path}: {error_msg}")
+            updates.append((nfo_path, stat, record))
+            records.append((nfo_path, record))
+
+        if index:
+            try:
+                index.store(updates)
+                index.remove_keys(path_key(path) for path in removed)
+            except Exception as e:
+                print(f"更新NFO索引失败: {str(e)}")
+        return records
 
-        return data
+    def _open_index_only(self):
+        try:
+            return NFOIndex()
+        except Exception as e:
+            print(f"打开NFO索引失败: {str(e)}")
+            return None
 
-    except Exception as e:
-        print(f"解析NFO文件失败 {nfo_path}: {str(e)}")
-        return None
 
 # ================ 结束 ================
 
@@ -265,7 +391,21 @@ class ConfigManager:
                     {"name": "", "url_template": "", "enabled": False},
                     {"name": "", "url_template": "", "enabled": False}
                 ]
-            }
+            },
+            "performance": {
+                # 首次扫描时并行解析NFO的进程数，0 表示关闭（单线程解析）
+                "parse_workers": 0,
+                # 保存时只改写变化的元素，其余内容保持原样
+                "minimal_diff": True,
+                # 选择停稳后预读当前排序下前后各 N 行的记录和图片，0 表示关闭
+                "prefetch_neighbors": 3,
+            },
+            "journal": {
+                # 撤销记录的容量上限（MB），0 表示不记录
+                "max_mb": 64,
+                # 同时保存压缩的原始文件，撤销时可完全还原格式和修改时间
+                "keep_originals": True,
+            },
         }
 
     def load_config(self):
@@ -323,6 +463,10 @@ class SettingsDialog(QDialog):
 
         search_group = self.create_search_sites_group()
         scroll_layout.addWidget(search_group)
+        performance_group = self.create_performance_group()
+        scroll_layout.addWidget(performance_group)
+        journal_group = self.create_journal_group()
+        scroll_layout.addWidget(journal_group)
         scroll_layout.addStretch()
 
         scroll.setWidget(scroll_widget)
@@ -412,6 +556,55 @@ class SettingsDialog(QDialog):
 
         return group
 
+    def create_performance_group(self):
+        group = QGroupBox("性能设置")
+        layout = QHBoxLayout(group)
+
+        layout.addWidget(QLabel("并行解析进程数:"))
+        self.parse_workers_spin = QSpinBox()
+        self.parse_workers_spin.setRange(0, os.cpu_count() or 1)
+        self.parse_workers_spin.setSpecialValueText("关闭")
+        self.parse_workers_spin.setFixedWidth(80)
+        layout.addWidget(self.parse_workers_spin)
+
+        help_label = QLabel("首次扫描大量NFO时使用多个进程解析，0 为关闭")
+        help_label.setStyleSheet("color: gray; font-style: italic;")
+        layout.addWidget(help_label)
+
+        self.minimal_diff_cb = QCheckBox("保存时只改写变化的部分")
+        self.minimal_diff_cb.setToolTip("保留NFO原有的格式、注释和未修改的内容；关闭后每次保存整份重新格式化")
+        layout.addWidget(self.minimal_diff_cb)
+
+        layout.addWidget(QLabel("预读相邻条目:"))
+        self.prefetch_spin = QSpinBox()
+        self.prefetch_spin.setRange(0, MAX_PREFETCH_NEIGHBORS)
+        self.prefetch_spin.setSpecialValueText("关闭")
+        self.prefetch_spin.setFixedWidth(80)
+        self.prefetch_spin.setToolTip("用方向键浏览时，提前在后台加载前后各 N 个文件的NFO和图片")
+        layout.addWidget(self.prefetch_spin)
+        layout.addStretch()
+
+        return group
+
+    def create_journal_group(self):
+        group = QGroupBox("撤销记录")
+        layout = QHBoxLayout(group)
+
+        layout.addWidget(QLabel("容量上限 (MB):"))
+        self.journal_size_spin = QSpinBox()
+        self.journal_size_spin.setRange(0, 4096)
+        self.journal_size_spin.setSpecialValueText("关闭")
+        self.journal_size_spin.setFixedWidth(80)
+        self.journal_size_spin.setToolTip("保存和批量修改的撤销记录，超出上限时删除最旧的记录")
+        layout.addWidget(self.journal_size_spin)
+
+        self.journal_originals_cb = QCheckBox("保存原始文件")
+        self.journal_originals_cb.setToolTip("同时保存压缩的原始NFO，撤销时完全还原格式和修改时间")
+        layout.addWidget(self.journal_originals_cb)
+        layout.addStretch()
+
+        return group
+
     def toggle_custom_site_inputs(self, state, widgets):
         enabled = state == Qt.Checked
         for widget in widgets:
@@ -437,6 +630,15 @@ class SettingsDialog(QDialog):
                 widgets['name'].setEnabled(enabled)
                 widgets['url'].setEnabled(enabled)
 
+        performance = self.config.get('performance', {})
+        self.parse_workers_spin.setValue(int(performance.get('parse_workers', 0)))
+        self.minimal_diff_cb.setChecked(bool(performance.get('minimal_diff', True)))
+        self.prefetch_spin.setValue(int(performance.get('prefetch_neighbors', 3)))
+
+        journal = self.config.get('journal', {})
+        self.journal_size_spin.setValue(int(journal.get('max_mb', 64)))
+        self.journal_originals_cb.setChecked(bool(journal.get('keep_originals', True)))
+
     def get_current_settings(self):
         config = self.config.copy()
 
@@ -457,6 +659,17 @@ class SettingsDialog(QDialog):
             'custom_sites': custom_sites
         }
 
+        performance = dict(config.get('performance', {}))
+        performance['parse_workers'] = self.parse_workers_spin.value()
+        performance['minimal_diff'] = self.minimal_diff_cb.isChecked()
+        performance['prefetch_neighbors'] = self.prefetch_spin.value()
+        config['performance'] = performance
+
+        journal = dict(config.get('journal', {}))
+        journal['max_mb'] = self.journal_size_spin.value()
+        journal['keep_originals'] = self.journal_originals_cb.isChecked()
+        config['journal'] = journal
+
         return config
 
     def apply_settings(self):
@@ -676,15 +889,51 @@ class NFOEditorQt5(NFOEditorQt):
         super().__init__()
 
         # 成员变量初始化
-        self.nfo_files = []
-        self.selected_index_cache = None
         self.move_thread = None
         self.file_watcher = QFileSystemWatcher()
         self._pending_select_folder = None   # 命令行 --select-folder 的延迟选择路径
 
         # 缓存和异步加载
         self.nfo_cache = NFOCache()
+        self.file_model.cache = self.nfo_cache
         self.load_thread = None
+        self.update_thread = None
+        self.edit_job = None  # 后台批量编辑（BatchEditJob），同一时间只运行一个
+        self.journal = None  # 撤销记录（nfo_journal.Journal），首次写入时打开
+        self._library_snapshot = None  # 上次完整扫描的 {nfo_path: (mtime_ns, size)}
+
+        # 未保存检测：加载/保存时记录编辑区取值和文件 (mtime_ns, size)，之后由编辑信号标记改动
+        self._loaded_values = None
+        self._loaded_stat = None
+        self._fields_dirty = False
+
+        # 详情区异步加载：每次选择递增代号，过期的结果直接丢弃
+        self._preview_generation = 0
+        self._fields_loading = False
+        # 编辑区的保存在后台写回，同一文件短时间内的重复保存合并为一次
+        self.save_queue = SaveQueue(parent=self)
+        self.save_queue.saved.connect(self._on_save_done)
+        self.save_queue.failed.connect(self._on_save_failed)
+        self.save_queue.start()
+        self._save_baselines = {}  # 待写回的文件 -> 提交前的编辑区快照（写回失败时恢复）
+
+        self.preview_loader = PreviewLoader(self)
+        self.preview_loader.fields_ready.connect(self._on_preview_fields)
+        self.preview_loader.missing.connect(self._on_preview_missing)
+        self.preview_loader.image_ready.connect(self._on_preview_image)
+        self.preview_loader.start()
+        # 相邻预读：选择停止变化 PREFETCH_DELAY_MS 后开始，按最近的移动方向优先预读
+        self.prefetch_timer = QTimer()
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.timeout.connect(self._prefetch_neighbors)
+        self._last_selected_row = -1
+        self._select_direction = 1
+        # 缩放窗口：当前文件已解码的图片 {种类: (QImage, (原始宽, 原始高))}，缩放时直接从内存缩放，
+        # 停止缩放 IMAGE_RESIZE_DELAY_MS 后再平滑缩放，只有图片框超过已解码分辨率时才重新读取
+        self._preview_sources = {}
+        self.image_resize_timer = QTimer()
+        self.image_resize_timer.setSingleShot(True)
+        self.image_resize_timer.timeout.connect(self._finish_image_resize)
         self._show_progress = True  # 控制进度条显示
 
         self.progress_bar = QProgressBar()
@@ -696,8 +945,20 @@ class NFOEditorQt5(NFOEditorQt):
         self.reload_timer.setSingleShot(True)
         self.reload_timer.timeout.connect(self._delayed_reload)
 
+        # 边输入边筛选：停止输入 FILTER_DELAY_MS 后执行
+        self.filter_timer = QTimer()
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.timeout.connect(self._apply_filter_typed)
+        self._filter_typed = False  # 本次筛选由输入防抖触发（而非回车/按钮）
+        self._compiled_query = None  # 上次解析的组合查询，文本不变时复用
+        self._filter_state = None  # (索引版本, 字段, 小写关键词, 包含结果) 供增量缩小
+        self._unfiltered = None  # (索引版本, 显示顺序) 筛选前的列表，清空筛选时还原
+        self._sort_applied = False  # 本次加载后是否按排序选项排过序，清空筛选后据此重新排序
+
         # 配置和搜索管理器
         self.config_manager = ConfigManager()
+        self._prefetch_count = self._load_prefetch_count()
+        self._load_write_settings()
         self.search_site_manager = SearchSiteManager()
 
         # 默认勾选显示图片选项
@@ -750,28 +1011,34 @@ class NFOEditorQt5(NFOEditorQt):
                 btn.clicked.connect(self.show_photo_wall)
             elif text == "🔜":
                 btn.clicked.connect(self.start_move_thread)
+            elif text == "↩":
+                btn.clicked.connect(self.show_journal)
             elif text == "⚙️":
                 btn.clicked.connect(self.open_settings)
             elif text == "批量填充 (Batch Filling)":
                 btn.clicked.connect(self.batch_filling)
             elif text == "批量新增 (Batch Add)":
                 btn.clicked.connect(self.batch_add)
+            elif text == "标签管理 (Tags)":
+                btn.clicked.connect(self.manage_tags)
 
         self.show_images_checkbox.stateChanged.connect(self.toggle_image_display)
 
-        self.file_tree.itemSelectionChanged.connect(self.on_file_select)
-        self.file_tree.itemDoubleClicked.connect(self.on_file_double_click)
+        self.file_tree.selectionModel().selectionChanged.connect(
+            lambda selected, deselected: self.on_file_select()
+        )
+        self.file_tree.doubleClicked.connect(self.on_file_double_click)
 
         self.file_tree.setStyleSheet("""
-            QTreeWidget {
+            QTreeView {
                 selection-background-color: #3daee9;
                 selection-color: white;
             }
-            QTreeWidget::item:selected {
+            QTreeView::item:selected {
                 background-color: #3daee9;
                 color: white;
             }
-            QTreeWidget::item:selected:!focus {
+            QTreeView::item:selected:!focus {
                 background-color: #bfbfbf;
                 color: black;
             }
@@ -795,6 +1062,7 @@ class NFOEditorQt5(NFOEditorQt):
 
         for field_name, widget in self.fields_entries.items():
             if isinstance(widget, QTextEdit):
+                widget.textChanged.connect(self._on_field_edited)
                 original_keyPressEvent = widget.keyPressEvent
                 def make_keyPressEvent(original_func):
                     def new_keyPressEvent(event):
@@ -816,6 +1084,8 @@ class NFOEditorQt5(NFOEditorQt):
                 break
 
         self.filter_entry.returnPressed.connect(self.apply_filter)
+        self.filter_entry.textChanged.connect(self._schedule_filter)
+        self.condition_combo.currentIndexChanged.connect(self._schedule_filter)
 
         if "num" in self.fields_entries:
             self.fields_entries["num"].mousePressEvent = lambda event: self.open_number_search(event)
@@ -858,7 +1128,8 @@ class NFOEditorQt5(NFOEditorQt):
                 return
         elif event.key() == Qt.Key_Right:
             focus_widget = self.focusWidget()
-            if isinstance(focus_widget, QTreeWidget):
+            # 文件列表（QTreeView）和整理目录树（QTreeWidget）都按→跳到评分
+            if isinstance(focus_widget, QTreeView):
                 event.accept()
                 self.focus_rating()
                 return
@@ -905,16 +1176,22 @@ class NFOEditorQt5(NFOEditorQt):
             QMessageBox.critical(self, "错误", f"打开设置失败: {str(e)}")
 
     def on_settings_changed(self):
-        pass
+        self._prefetch_count = self._load_prefetch_count()
+        self._load_write_settings()
+        if self.journal is not None:
+            self.journal.max_bytes = self._journal_max_bytes
+            try:
+                self.journal.trim()
+            except Exception as e:
+                print(f"清理撤销记录失败: {str(e)}")
 
     def set_nfo_folder(self, folder_path):
         self.folder_path = folder_path
         settings = QSettings("NFOEditor", "Directories")
         settings.setValue("last_nfo_dir", folder_path)
+        # 切换目录时先撤掉旧库的监控，加载完成后再监控新库
+        self._pause_watcher()
         self.load_files_in_folder()
-
-        if self.folder_path in self.file_watcher.directories():
-            self.file_watcher.removePath(self.folder_path)
         self.file_watcher.addPath(self.folder_path)
 
     def open_folder(self):
@@ -973,25 +1250,29 @@ class NFOEditorQt5(NFOEditorQt):
 
         current_selection_path = None
         if not auto_select:
-            selected_items = self.file_tree.selectedItems()
-            if selected_items and self.current_file_path:
+            if self.file_tree.selectionModel().hasSelection() and self.current_file_path:
                 current_selection_path = self.current_file_path
 
         # 停止旧线程并断开所有信号，防止残留回调污染新数据
         if self.load_thread is not None and self.load_thread.isRunning():
             self.load_thread.stop()
             try:
-                self.load_thread.item_ready.disconnect()
+                self.load_thread.batch_ready.disconnect()
+                self.load_thread.snapshot_ready.disconnect()
                 self.load_thread.progress.disconnect()
                 self.load_thread.finished_signal.disconnect()
                 self.load_thread.error.disconnect()
             except Exception:
                 pass
             self.load_thread.wait()
+        self._stop_update_thread()
 
-        self.file_tree.clear()
-        self.nfo_files = []
+        self.file_model.reset(self.folder_path)
         self.nfo_cache.clear()  # 清空旧缓存，避免已删除文件残留
+        self._library_snapshot = None
+        self._filter_state = None
+        self._unfiltered = None
+        self._sort_applied = False
 
         self._show_progress = show_progress
 
@@ -1000,9 +1281,15 @@ class NFOEditorQt5(NFOEditorQt):
             self.progress_bar.show()
             self.status_bar.showMessage("正在加载文件...")
 
-        self.load_thread = LoadFilesThread(self.folder_path, batch_size=100)
+        performance = self.config_manager.load_config().get("performance", {})
+        self.load_thread = LoadFilesThread(
+            self.folder_path,
+            batch_size=100,
+            workers=int(performance.get("parse_workers", 0)),
+        )
         self.load_thread.progress.connect(self._on_load_progress)
-        self.load_thread.item_ready.connect(self._on_item_ready)
+        self.load_thread.batch_ready.connect(self._on_batch_ready)
+        self.load_thread.snapshot_ready.connect(self._on_snapshot_ready)
         self.load_thread.finished_signal.connect(
             lambda count: self._on_load_finished(count, auto_select, current_selection_path)
         )
@@ -1014,28 +1301,63 @@ class NFOEditorQt5(NFOEditorQt):
             return
         self.progress_bar.setMaximum(total)
         self.progress_bar.setValue(current)
-        if current % 100 == 0 or current == total:
-            self.status_bar.showMessage(f"正在加载: {current}/{total} - {filename}")
+        # 进度已由加载线程按批节流，这里每次都可以刷新
+        self.status_bar.showMessage(f"正在加载: {current}/{total} - {filename}")
+
+    def _on_batch_ready(self, batch):
+        """整批写入缓存，再一次性追加到文件列表模型"""
+        paths = []
+        for nfo_path, record in batch:
+            self.nfo_cache.set(nfo_path, record)
+            paths.append(nfo_path)
+        self.file_model.append_paths(paths)
+
+    def _load_write_settings(self):
+        """读取保存相关设置（启动时和设置保存后各一次），保存时不再读配置文件"""
+        config = self.config_manager.load_config()
+        # 保存时是否只改写变化的部分（性能设置）
+        self._minimal_diff = bool(config.get("performance", {}).get("minimal_diff", True))
+        journal = config.get("journal", {})
+        try:
+            max_mb = int(journal.get("max_mb", 64))
+        except (TypeError, ValueError):
+            max_mb = 0
+        self._journal_max_bytes = max(0, max_mb) * 1024 * 1024
+        self._journal_keep_originals = bool(journal.get("keep_originals", True))
+
+    def _journal_recorder(self, label):
+        """为一次写操作创建撤销记录收集器；撤销记录关闭或无法打开时返回 None"""
+        if self._journal_max_bytes <= 0:
+            return None
+        if self.journal is None:
+            try:
+                self.journal = Journal(max_bytes=self._journal_max_bytes)
+            except Exception as e:
+                print(f"打开撤销记录失败: {str(e)}")
+                return None
+        return JournalRecorder(self.journal, label, self._journal_keep_originals)
+
+    def _update_cached_record(self, nfo_path, record):
+        """保存/外部修改后更新缓存，并同步文件列表的数值列和显示"""
+        self.nfo_cache.set(nfo_path, record)
+        self.file_model.refresh_path(nfo_path)
 
-    def _on_item_ready(self, tree_item, cache_data):
-        self.file_tree.addTopLevelItem(tree_item)
-        for path, data in cache_data.items():
-            self.nfo_cache.set(path, data)
-            self.nfo_files.append(path)
+    def _on_snapshot_ready(self, snapshot):
+        self._library_snapshot = snapshot
 
     def _on_load_finished(self, count, auto_select, selection_path):
         if self._show_progress:
             self.progress_bar.hide()
 
-        total_folders = len(set(os.path.dirname(f) for f in self.nfo_files))
+        total_folders = len(set(os.path.dirname(f) for f in self.file_model.all_paths()))
+        cache_bytes, entry_bytes = self.nfo_cache.memory_usage()
         self.status_bar.showMessage(
             f"加载完成: {count} 个NFO文件 ({total_folders} 个文件夹) - 目录: {self.folder_path}"
+            f" - 缓存约 {cache_bytes / 1048576:.1f} MB ({entry_bytes} 字节/条)"
         )
 
-        if auto_select and self.file_tree.topLevelItemCount() > 0:
-            first_item = self.file_tree.topLevelItem(0)
-            self.file_tree.setCurrentItem(first_item)
-            self.on_file_select()
+        if auto_select and self.file_model.rowCount() > 0:
+            self._select_row(0)
         elif selection_path:
             self._restore_selection(selection_path)
 
@@ -1049,24 +1371,27 @@ class NFOEditorQt5(NFOEditorQt):
             self.load_thread.deleteLater()
             self.load_thread = None
 
+        self._watch_library_dirs()
+
     def _restore_selection(self, target_path):
-        for i in range(self.file_tree.topLevelItemCount()):
-            item = self.file_tree.topLevelItem(i)
-            values = [item.text(j) for j in range(3)]
-
-            if values[2]:
-                item_path = (
-                    os.path.join(self.folder_path, values[0], values[1], values[2])
-                    if values[1]
-                    else os.path.join(self.folder_path, values[0], values[2])
-                )
+        row = self.file_model.row_of(target_path)
+        if row >= 0:
+            self._select_row(row)
+        else:
+            self.file_tree.clearSelection()
 
-                if os.path.normpath(item_path) == os.path.normpath(target_path):
-                    self.file_tree.setCurrentItem(item)
-                    self.file_tree.scrollToItem(item)
-                    return
+    def _select_row(self, row):
+        """选中并滚动到文件列表的某一行（选择变化会触发 on_file_select）"""
+        index = self.file_model.index(row, 0)
+        self.file_tree.selectionModel().setCurrentIndex(
+            index, QItemSelectionModel.ClearAndSelect | QItemSelectionModel.Rows
+        )
+        self.file_tree.scrollTo(index)
 
-        self.file_tree.clearSelection()
+    def selected_nfo_paths(self):
+        """文件列表中选中行对应的 NFO 路径，按显示顺序"""
+        rows = sorted(index.row() for index in self.file_tree.selectionModel().selectedRows())
+        return [self.file_model.path_at(row) for row in rows]
 
     def _on_load_error(self, error_msg):
         if self._show_progress:
@@ -1079,30 +1404,148 @@ class NFOEditorQt5(NFOEditorQt):
     # ================================================================
 
     def on_file_changed(self, path):
-        """文件变化响应 - 更新缓存（外部修改触发，保存时已屏蔽）"""
-        if path == self.current_file_path:
+        """文件变化响应 - 更新缓存（外部修改触发，保存队列自己的写回忽略）"""
+        if path == self.current_file_path and path not in self._save_baselines and self._changed_on_disk():
             cache_data = parse_single_nfo(path)
             if cache_data:
-                self.nfo_cache.set(path, cache_data)
+                self._update_cached_record(path, cache_data)
             self.load_nfo_fields()
 
     def on_directory_changed(self, path):
-        """目录变化响应 - 防抖动延迟重载"""
-        if path == self.folder_path:
+        """目录变化响应 - 防抖动延迟更新（监控范围见 _watch_library_dirs）"""
+        if self.folder_path:
             self.reload_timer.start(500)
 
     def _delayed_reload(self):
-        """延迟重新加载（防抖动，静默模式）"""
+        """延迟更新（防抖动，静默模式）"""
         if self.folder_path:
+            self.update_library()
+
+    def update_library(self):
+        """增量更新文件列表：与上次快照比对，只处理新增/删除/修改的NFO
+
+        还没有完整快照（首次加载未完成）时退回静默全量加载。
+        """
+        if not self.folder_path:
+            return
+
+        busy = [t for t in (self.load_thread, self.update_thread) if t is not None and t.isRunning()]
+        if busy:
+            # 正在扫描时稍后再比对，避免漏掉扫描开始后的变化
+            self.reload_timer.start(500)
+            return
+
+        if self._library_snapshot is None:
             self.load_files_in_folder(auto_select=False, show_progress=False)
+            return
+
+        performance = self.config_manager.load_config().get("performance", {})
+        self.update_thread = LibraryUpdateThread(
+            self.folder_path,
+            self._library_snapshot,
+            workers=int(performance.get("parse_workers", 0)),
+        )
+        self.update_thread.changes_ready.connect(self._on_library_changes)
+        self.update_thread.error.connect(lambda msg: self.status_bar.showMessage(msg, 5000))
+        self.update_thread.finished.connect(self._on_update_thread_finished)
+        self.update_thread.start()
+
+    def _on_library_changes(self, changed, removed, snapshot):
+        """把增量结果应用到缓存和文件列表，保留选择和滚动位置"""
+        self._library_snapshot = snapshot
+
+        gone = list(removed)
+        added = []
+        modified = 0
+        for nfo_path, record in changed:
+            if record is None:
+                # 修改后解析失败的文件与全量加载一致：不在列表中显示
+                gone.append(nfo_path)
+                continue
+            is_new = nfo_path not in self.nfo_cache
+            self.nfo_cache.set(nfo_path, record)
+            if is_new:
+                added.append(nfo_path)
+            else:
+                modified += 1
+                self.file_model.refresh_path(nfo_path)
+
+        for nfo_path in gone:
+            self.nfo_cache.remove(nfo_path)
+        self.file_model.remove_paths(gone)
+        self.file_model.append_paths(added)
+
+        if added or gone or modified:
+            self.status_bar.showMessage(
+                f"文件列表已更新: 新增 {len(added)}，删除 {len(gone)}，修改 {modified}", 3000
+            )
+        self._watch_library_dirs()
+
+    def _on_update_thread_finished(self):
+        if self.update_thread is not None and not self.update_thread.isRunning():
+            self.update_thread.deleteLater()
+            self.update_thread = None
+
+    def _stop_update_thread(self):
+        if self.update_thread is not None and self.update_thread.isRunning():
+            self.update_thread.stop()
+            try:
+                self.update_thread.changes_ready.disconnect()
+            except Exception:
+                pass
+            self.update_thread.wait()
+        self.update_thread = None
+
+    # 最多监控的目录数：Windows 上每 63 个目录占用一个监控线程，Linux 受 inotify 数量限制
+    MAX_WATCHED_DIRS = 8192
+
+    def _watch_library_dirs(self):
+        """监控库根目录、一级子目录以及所有含 NFO 的目录（和它们的上级目录）
+
+        其他工具增删影片文件夹或改写 NFO 都能及时增量更新。目录超过 MAX_WATCHED_DIRS 时
+        优先监控较浅的目录，其余 NFO 在被选中时按 mtime/大小 重新核对（_on_preview_fields）。
+        """
+        if not self.folder_path or not os.path.isdir(self.folder_path):
+            return
+        root = os.path.normpath(self.folder_path)
+        wanted = {root}
+        try:
+            with os.scandir(root) as entries:
+                wanted.update(os.path.normpath(entry.path) for entry in entries if entry.is_dir())
+        except OSError as e:
+            print(f"读取目录失败 {self.folder_path}: {str(e)}")
+        for nfo_path in self._library_snapshot or ():
+            directory = os.path.dirname(os.path.normpath(nfo_path))
+            while directory not in wanted and len(directory) > len(root):
+                wanted.add(directory)
+                directory = os.path.dirname(directory)
+        if len(wanted) > self.MAX_WATCHED_DIRS:
+            wanted = set(sorted(wanted, key=lambda d: (d.count(os.sep), d))[: self.MAX_WATCHED_DIRS])
+
+        watched = set(self.file_watcher.directories())
+        stale = [d for d in watched if os.path.normpath(d) not in wanted]
+        if stale:
+            self.file_watcher.removePaths(stale)
+        watched = {os.path.normpath(d) for d in watched}
+        new_dirs = [d for d in wanted if d not in watched]
+        if new_dirs:
+            self.file_watcher.addPaths(new_dirs)
+
+    def _pause_watcher(self):
+        directories = self.file_watcher.directories()
+        if directories:
+            self.file_watcher.removePaths(directories)
 
     # ================================================================
     #  文件选择与字段加载
     # ================================================================
 
+    # 选择停止变化多久后开始预读相邻条目
+    PREFETCH_DELAY_MS = 150
+
     def on_file_select(self):
-        selected_items = self.file_tree.selectedItems()
-        if not selected_items:
+        selected_paths = self.selected_nfo_paths()
+        if not selected_paths:
             return
 
         if self.current_file_path and self.has_unsaved_changes():
@@ -1117,173 +1560,218 @@ class NFOEditorQt5(NFOEditorQt):
                 return
             elif reply == QMessageBox.Yes:
                 self.save_changes()
+        elif self.current_file_path:
+            self._refresh_if_changed_on_disk()
+
+        self.current_file_path = selected_paths[0]
+        # 回到还没写完的文件时先写完，避免从磁盘读到旧内容
+        self.save_queue.flush([self.current_file_path])
+        self._request_preview(want_fields=True)
+
+        row = self.file_model.row_of(self.current_file_path)
+        if row != self._last_selected_row and self._last_selected_row >= 0 and row >= 0:
+            self._select_direction = 1 if row > self._last_selected_row else -1
+        self._last_selected_row = row
+        if self._prefetch_count > 0:
+            self.prefetch_timer.start(self.PREFETCH_DELAY_MS)
+
+    def _load_prefetch_count(self):
+        performance = self.config_manager.load_config().get("performance", {})
+        try:
+            count = int(performance.get("prefetch_neighbors", 3))
+        except (TypeError, ValueError):
+            count = 0
+        return max(0, min(count, MAX_PREFETCH_NEIGHBORS))
+
+    def _prefetch_neighbors(self):
+        """预读当前排序下前后各 N 行；沿移动方向的一侧优先"""
+        if not self.current_file_path or self._prefetch_count <= 0:
+            return
+        row = self.file_model.row_of(self.current_file_path)
+        if row < 0:
+            return
+        paths = []
+        for step in range(1, self._prefetch_count + 1):
+            for offset in (step * self._select_direction, -step * self._select_direction):
+                path = self.file_model.path_at(row + offset)
+                if path is not None:
+                    paths.append(path)
+        sizes = {}
+        if self.show_images_checkbox.isChecked():
+            sizes = {POSTER: self.poster_label.size(), THUMB: self.thumb_label.size()}
+        self.preview_loader.prefetch(paths, sizes)
 
-        item = selected_items[0]
-        values = [item.text(i) for i in range(3)]
+    def _request_preview(self, want_fields, kinds=(POSTER, THUMB)):
+        """把当前文件的字段/图片加载交给后台线程；加载字段即开始一次新的选择
 
-        if values[2]:
-            self.current_file_path = (
-                os.path.join(self.folder_path, values[0], values[1], values[2])
-                if values[1]
-                else os.path.join(self.folder_path, values[0], values[2])
-            )
+        kinds 为要加载的图片种类，默认封面和缩略图都加载。
+        """
+        if not self.current_file_path:
+            return
+        if want_fields:
+            self._preview_generation += 1
+            self._fields_loading = True
+            self._preview_sources = {}
+            self._clear_fields()
 
-            if not os.path.exists(self.current_file_path):
-                self.file_tree.takeTopLevelItem(
-                    self.file_tree.indexOfTopLevelItem(item)
-                )
-                return
+        sizes = {}
+        if self.show_images_checkbox.isChecked():
+            labels = self._image_labels()
+            sizes = {kind: labels[kind].size() for kind in kinds}
+            if want_fields:
+                for label in (self.poster_label, self.thumb_label):
+                    label.setText("加载中...")
+        if not want_fields and not sizes:
+            return
 
-            self.load_nfo_fields()
-            if self.show_images_checkbox.isChecked():
-                self.display_image()
+        self.preview_loader.submit(
+            PreviewRequest(self._preview_generation, self.current_file_path, want_fields, sizes)
+        )
 
-    def load_nfo_fields(self):
+    def _on_preview_fields(self, generation, nfo_path, record, stat, error):
+        if generation != self._preview_generation or nfo_path != self.current_file_path:
+            return
+        self._fields_loading = False
+        if record is None:
+            QMessageBox.critical(self, "错误", f"加载NFO文件失败: {error}")
+        else:
+            self._show_record(record)
+            self._recheck_record(nfo_path, record, stat)
+        self._snapshot_fields(stat)
+
+    def _recheck_record(self, nfo_path, record, stat):
+        """选中时核对 mtime/大小：未被监控到的外部修改在这里补上，更新缓存和快照"""
+        snapshot = self._library_snapshot
+        if stat is None or snapshot is None or nfo_path not in snapshot or snapshot[nfo_path] == stat:
+            return
+        if nfo_path in self._save_baselines:
+            return
+        # 快照可能正被增量更新线程读取，换成新的字典而不是原地修改
+        self._library_snapshot = {**snapshot, nfo_path: stat}
+        self._update_cached_record(nfo_path, record)
+
+    def _on_preview_missing(self, generation, nfo_path):
+        if generation != self._preview_generation:
+            return
+        self._fields_loading = False
+        # 缓存和快照也要去掉，否则搜索、筛选和标签管理仍会返回这个文件
+        self.nfo_cache.remove(nfo_path)
+        if self._library_snapshot is not None and nfo_path in self._library_snapshot:
+            snapshot = dict(self._library_snapshot)
+            del snapshot[nfo_path]
+            self._library_snapshot = snapshot
+        self.file_model.remove_paths([nfo_path])
+
+    def _clear_fields(self):
         for entry in self.fields_entries.values():
             if isinstance(entry, QTextEdit):
                 entry.clear()
             elif isinstance(entry, QLabel):
                 entry.setText("")
 
-        try:
-            tree = ET.parse(self.current_file_path)
-            root = tree.getroot()
-
-            for field in ["title", "plot", "series", "rating", "num"]:
-                elem = root.find(field)
-                if elem is not None and elem.text:
-                    widget = self.fields_entries.get(field)
-                    if widget:
-                        if isinstance(widget, QLabel):
-                            widget.setText(elem.text)
-                        else:
-                            widget.setPlainText(elem.text)
-
-            actors = [
-                actor.find("name").text.strip()
-                for actor in root.findall("actor")
-                if actor.find("name") is not None and actor.find("name").text
-            ]
-            self.fields_entries["actors"].setPlainText(", ".join(actors))
-
-            tags = [
-                tag.text.strip()
-                for tag in root.findall("tag")
-                if tag is not None and tag.text
-            ]
-            self.fields_entries["tags"].setPlainText(", ".join(tags))
-
-            release_elem = root.find("release")
-            if release_elem is not None and release_elem.text:
-                self.release_label.setText(release_elem.text.strip())
+    def load_nfo_fields(self):
+        """同步重新加载当前文件的字段（保存、批量操作之后）"""
+        self._clear_fields()
 
+        try:
+            self._show_record(parse_nfo(self.current_file_path))
         except Exception as e:
             QMessageBox.critical(self, "错误", f"加载NFO文件失败: {str(e)}")
 
+        self._snapshot_fields()
+
+    def _show_record(self, record):
+        for field, value in [
+            ("title", record.title),
+            ("plot", record.plot),
+            ("series", record.series),
+            ("rating", record.rating_text),
+            ("num", record.num),
+        ]:
+            widget = self.fields_entries.get(field)
+            if value and widget:
+                if isinstance(widget, QLabel):
+                    widget.setText(value)
+                else:
+                    widget.setPlainText(value)
+
+        self.fields_entries["actors"].setPlainText(", ".join(record.actors))
+        self.fields_entries["tags"].setPlainText(", ".join(record.tags))
+
+        if record.release:
+            self.release_label.setText(record.release)
+
     # ================================================================
-    #  保存 - 屏蔽监控避免回调干扰
+    #  保存 - 交给后台保存队列
     # ================================================================
 
     def save_changes(self):
-        if not self.current_file_path:
+        if not self.current_file_path or self._fields_loading:
             return
 
-        try:
-            tree = ET.parse(self.current_file_path)
-            root = tree.getroot()
-
-            title = self.fields_entries["title"].toPlainText().strip()
-            plot = self.fields_entries["plot"].toPlainText().strip()
-            actors_text = self.fields_entries["actors"].toPlainText().strip()
-            series = self.fields_entries["series"].toPlainText().strip()
-            tags_text = self.fields_entries["tags"].toPlainText().strip()
-            rating = self.fields_entries["rating"].toPlainText().strip()
-
-            for field, value in {
-                "title": title,
-                "plot": plot,
-                "series": series,
-                "rating": rating,
-            }.items():
-                elem = root.find(field)
-                if elem is None:
-                    elem = ET.SubElement(root, field)
-                elem.text = value
-
-            try:
-                rating_value = float(rating)
-                critic_rating = int(rating_value * 10)
-                critic_elem = root.find("criticrating")
-                if critic_elem is None:
-                    critic_elem = ET.SubElement(root, "criticrating")
-                critic_elem.text = str(critic_rating)
-            except ValueError:
-                pass
-
-            for actor_elem in root.findall("actor"):
-                root.remove(actor_elem)
-            for actor in actors_text.split(","):
-                actor = actor.strip()
-                if actor:
-                    actor_elem = ET.SubElement(root, "actor")
-                    name_elem = ET.SubElement(actor_elem, "name")
-                    name_elem.text = actor
-
-            for tag_elem in root.findall("tag"):
-                root.remove(tag_elem)
-            for genre_elem in root.findall("genre"):
-                root.remove(genre_elem)
-
-            for tag in tags_text.split(","):
-                tag = tag.strip()
-                if tag:
-                    tag_elem = ET.SubElement(root, "tag")
-                    tag_elem.text = tag
-                    genre_elem = ET.SubElement(root, "genre")
-                    genre_elem.text = tag
-
-            xml_str = ET.tostring(root, encoding="utf-8")
-            parsed_str = minidom.parseString(xml_str)
-            pretty_str = parsed_str.toprettyxml(indent="  ", encoding="utf-8")
-            pretty_str = "\n".join(
-                line for line in pretty_str.decode("utf-8").split("\n") if line.strip()
+        # 自己提交的保存还没有收到结果时，磁盘上的变化来自保存队列，不必提示
+        if self.current_file_path not in self._save_baselines and self._changed_on_disk():
+            reply = QMessageBox.question(
+                self,
+                "文件已修改",
+                "当前NFO在加载后已被其他程序修改，保存会覆盖编辑区中的字段，是否继续？",
+                QMessageBox.Yes | QMessageBox.No,
             )
+            if reply != QMessageBox.Yes:
+                return
 
-            # 保存前临时断开文件变化信号，防止 on_file_changed 在保存过程中干扰 UI
-            try:
-                self.file_watcher.fileChanged.disconnect(self.on_file_changed)
-            except Exception:
-                pass
-
-            with open(self.current_file_path, "w", encoding="utf-8") as file:
-                file.write(pretty_str)
-
-            # 保存后立即更新缓存
-            cache_data = parse_single_nfo(self.current_file_path)
-            if cache_data:
-                self.nfo_cache.set(self.current_file_path, cache_data)
-
-            # 恢复文件变化信号
-            self.file_watcher.fileChanged.connect(self.on_file_changed)
+        entries = self.fields_entries
 
-            save_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.save_time_label.setText(f"保存时间: {save_time}")
+        def split(field):
+            return [value.strip() for value in entries[field].toPlainText().split(",") if value.strip()]
 
-            if self.selected_index_cache:
-                for item_id in self.selected_index_cache:
-                    self.file_tree.setCurrentItem(item_id)
+        values = {field: entries[field].toPlainText().strip() for field in ("title", "plot", "series", "rating")}
+        values["actors"] = split("actors")
+        values["tags"] = split("tags")
 
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"保存NFO文件失败: {str(e)}")
+        nfo_path = self.current_file_path
+        self._save_baselines.setdefault(nfo_path, self._loaded_values)
+        self.save_queue.submit(
+            nfo_path,
+            partial(apply_editor_fields, values),
+            minimal=self._minimal_diff,
+            recorder=self._journal_recorder(f"保存 {os.path.basename(nfo_path)}"),
+        )
+        # 编辑区视为已保存；写回失败时在 _on_save_failed 中恢复未保存状态
+        self._loaded_values = self._field_values()
+        self._fields_dirty = False
+        self.status_bar.showMessage(f"正在保存: {os.path.basename(nfo_path)}")
+
+    def _on_save_done(self, nfo_path, record, stat, changed):
+        """保存队列写回完成：用写回的元素树生成的记录更新缓存，不再重新解析文件"""
+        self._save_baselines.pop(nfo_path, None)
+        self._update_cached_record(nfo_path, record)
+        if nfo_path == self.current_file_path and stat is not None:
+            self._loaded_stat = stat
+
+        save_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.save_time_label.setText(f"保存时间: {save_time}")
+        state = "已保存" if changed else "内容未变化"
+        self.status_bar.showMessage(f"{state}: {os.path.basename(nfo_path)}", 5000)
+
+    def _on_save_failed(self, nfo_path, error):
+        baseline = self._save_baselines.pop(nfo_path, None)
+        if nfo_path == self.current_file_path and baseline is not None:
+            # 编辑区的内容还在，恢复为未保存状态，切换文件时会再次提示
+            self._loaded_values = baseline
+            self._fields_dirty = True
+        self.status_bar.showMessage(f"保存失败: {os.path.basename(nfo_path)}", 5000)
+        QMessageBox.critical(self, "错误", f"保存NFO文件失败 {nfo_path}: {error}")
 
     # ================================================================
     #  移动文件 - 修复进度条闪烁
     # ================================================================
 
     def start_move_thread(self):
+        self.save_queue.flush()
         try:
-            selected_items = self.file_tree.selectedItems()
-            if not selected_items:
+            selected_paths = self.selected_nfo_paths()
+            if not selected_paths:
                 QMessageBox.warning(self, "警告", "请先选择要移动的文件夹")
                 return
 
@@ -1292,13 +1780,9 @@ class NFOEditorQt5(NFOEditorQt):
                 return
 
             src_paths = []
-            for item in selected_items:
+            for nfo_path in selected_paths:
                 try:
-                    values = [item.text(i) for i in range(3)]
-                    if values[1]:
-                        src_path = os.path.join(self.folder_path, values[0], values[1])
-                    else:
-                        src_path = os.path.join(self.folder_path, values[0])
+                    src_path = os.path.dirname(nfo_path)
 
                     if not os.path.exists(src_path):
                         raise FileNotFoundError(f"源文件夹不存在: {src_path}")
@@ -1312,9 +1796,8 @@ class NFOEditorQt5(NFOEditorQt):
                 QMessageBox.warning(self, "警告", "没有有效的源文件夹可以移动")
                 return
 
-            # 移动前暂停目录监控，防止移动过程中触发自动重载
-            if self.folder_path and self.folder_path in self.file_watcher.directories():
-                self.file_watcher.removePath(self.folder_path)
+            # 移动前暂停目录监控，防止移动过程中触发自动更新
+            self._pause_watcher()
 
             progress = QProgressDialog("准备移动...", "取消", 0, len(src_paths), self)
             progress.setWindowModality(Qt.WindowModal)
@@ -1343,25 +1826,23 @@ class NFOEditorQt5(NFOEditorQt):
 
         except Exception as e:
             # 异常时恢复监控
-            if self.folder_path:
-                self.file_watcher.addPath(self.folder_path)
+            self._watch_library_dirs()
             QMessageBox.critical(self, "错误", f"启动移动操作时出错: {str(e)}")
 
     def on_move_finished(self):
-        """文件移动完成回调 - 静默重载，不显示进度条"""
-        # 取消可能挂起的延迟重载（防止与主动重载重复）
+        """文件移动完成回调 - 增量更新文件列表，不显示进度条"""
+        # 取消可能挂起的延迟更新（防止与主动更新重复）
         self.reload_timer.stop()
 
-        # 静默重载文件列表
-        self.load_files_in_folder(auto_select=False, show_progress=False)
+        # 只移除已移走的条目，保留选择和滚动位置
+        self.update_library()
 
         # 刷新目标目录
         if self.current_target_path:
             self.load_target_files(self.current_target_path)
 
         # 恢复目录监控
-        if self.folder_path:
-            self.file_watcher.addPath(self.folder_path)
+        self._watch_library_dirs()
 
         # 清理线程
         if self.move_thread:
@@ -1403,54 +1884,63 @@ class NFOEditorQt5(NFOEditorQt):
     #  未保存检测
     # ================================================================
 
-    def has_unsaved_changes(self):
-        if not self.current_file_path or not os.path.exists(self.current_file_path):
-            return False
+    def _field_values(self):
+        """编辑区取值，按保存时的规则规范化（去首尾空白，演员/标签不计顺序）"""
+        entries = self.fields_entries
 
+        def split(field):
+            return frozenset(
+                value.strip() for value in entries[field].toPlainText().split(",") if value.strip()
+            )
+
+        return (
+            tuple(entries[field].toPlainText().strip() for field in ("title", "plot", "series", "rating")),
+            split("actors"),
+            split("tags"),
+        )
+
+    @staticmethod
+    def _file_stat(path):
         try:
-            tree = ET.parse(self.current_file_path)
-            root = tree.getroot()
-
-            for field in ["title", "plot", "series", "rating"]:
-                current_value = self.fields_entries[field].toPlainText().strip()
-                elem = root.find(field)
-                original_value = (
-                    elem.text.strip() if elem is not None and elem.text else ""
-                )
-                if current_value != original_value:
-                    return True
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
 
-            current_actors = set(
-                actor.strip()
-                for actor in self.fields_entries["actors"].toPlainText().strip().split(",")
-                if actor.strip()
-            )
-            original_actors = {
-                actor.find("name").text.strip()
-                for actor in root.findall("actor")
-                if actor.find("name") is not None and actor.find("name").text
-            }
-            if current_actors != original_actors:
-                return True
+    def _snapshot_fields(self, stat=None):
+        """记录当前文件加载/保存后的编辑区取值和文件状态（stat 为解析前取得的 (mtime_ns, size)）"""
+        self._loaded_values = self._field_values()
+        if stat is None and self.current_file_path:
+            stat = self._file_stat(self.current_file_path)
+        self._loaded_stat = stat
+        self._fields_dirty = False
 
-            current_tags = set(
-                tag.strip()
-                for tag in self.fields_entries["tags"].toPlainText().strip().split(",")
-                if tag.strip()
-            )
-            original_tags = {
-                tag.text.strip()
-                for tag in root.findall("tag")
-                if tag is not None and tag.text
-            }
-            if current_tags != original_tags:
-                return True
+    def _on_field_edited(self):
+        self._fields_dirty = True
 
+    def has_unsaved_changes(self):
+        """编辑区是否与加载时不同；只比较内存中的快照，不读取文件"""
+        if (
+            not self.current_file_path
+            or self._fields_loading
+            or not self._fields_dirty
+            or self._loaded_values is None
+        ):
             return False
+        return self._field_values() != self._loaded_values
 
-        except Exception as e:
-            print(f"检查更改状态时出错: {str(e)}")
+    def _changed_on_disk(self):
+        """当前文件在加载后是否被外部修改（比较 mtime 和大小）"""
+        if not self.current_file_path or self._loaded_stat is None:
             return False
+        return self._file_stat(self.current_file_path) != self._loaded_stat
+
+    def _refresh_if_changed_on_disk(self):
+        """离开未编辑的文件时，若已被外部修改则刷新其缓存记录"""
+        if self._changed_on_disk():
+            cache_data = parse_single_nfo(self.current_file_path)
+            if cache_data:
+                self._update_cached_record(self.current_file_path, cache_data)
 
     # ================================================================
     #  图片显示
@@ -1463,6 +1953,7 @@ class NFOEditorQt5(NFOEditorQt):
             self.clear_images()
 
     def clear_images(self):
+        self._preview_sources = {}
         if hasattr(self, "poster_label"):
             self.poster_label.clear()
             self.poster_label.setText("封面图 (poster)")
@@ -1475,67 +1966,60 @@ class NFOEditorQt5(NFOEditorQt):
             self.thumb_resolution_label.setText("分辨率: 未知")
 
     def display_image(self):
-        if not self.current_file_path:
-            return
-
-        folder = os.path.dirname(self.current_file_path)
-
-        poster_files = []
-        thumb_files = []
-        fanart_files = []
-        for entry in os.scandir(folder):
-            name = entry.name.lower()
-            if name.endswith(".jpg"):
-                if "poster" in name:
-                    poster_files.append(entry.name)
-                elif "thumb" in name:
-                    thumb_files.append(entry.name)
-                elif "fanart" in name:
-                    fanart_files.append(entry.name)
-
-        if poster_files:
-            poster_path = os.path.join(folder, poster_files[0])
-            self.load_image(poster_path, self.poster_label, self.poster_resolution_label)
-        else:
-            self.poster_label.setText("文件夹内无poster图片")
-            self.poster_resolution_label.setText("分辨率: 未知")
-
-        if thumb_files:
-            thumb_path = os.path.join(folder, thumb_files[0])
-            self.load_image(thumb_path, self.thumb_label, self.thumb_resolution_label)
-        elif fanart_files:
-            fanart_path = os.path.join(folder, fanart_files[0])
-            self.load_image(fanart_path, self.thumb_label, self.thumb_resolution_label)
-        else:
-            self.thumb_label.setText("文件夹内无thumb或fanart图片")
-            self.thumb_resolution_label.setText("分辨率: 未知")
+        """在后台重新加载当前文件的图片"""
+        self._request_preview(want_fields=False)
 
-    def load_image(self, image_path, label, resolution_label=None):
-        try:
-            with Image.open(image_path) as img:
-                original_width, original_height = img.size
+    def _image_labels(self):
+        return {POSTER: self.poster_label, THUMB: self.thumb_label}
 
-            if resolution_label:
-                resolution_label.setText(f"分辨率: {original_width} × {original_height}")
+    # 停止缩放窗口多久后平滑缩放图片
+    IMAGE_RESIZE_DELAY_MS = 150
 
-            pixmap = QPixmap(image_path)
-            if pixmap.isNull():
-                label.setText("加载图片失败")
-                if resolution_label:
-                    resolution_label.setText("分辨率: 加载失败")
-                return
+    def rescale_images(self):
+        """图片框尺寸变化：先从内存中的解码结果快速缩放，停止变化后再处理"""
+        if not self.show_images_checkbox.isChecked():
+            return
+        labels = self._image_labels()
+        for kind, (image, _) in self._preview_sources.items():
+            label = labels[kind]
+            label.setPixmap(QPixmap.fromImage(fit_image(image, label.size(), Qt.FastTransformation)))
+        self.image_resize_timer.start(self.IMAGE_RESIZE_DELAY_MS)
+
+    def _finish_image_resize(self):
+        """平滑缩放到最终尺寸；图片框超过已解码的分辨率（或还没有图片）时才交给后台重新读取"""
+        if not self.show_images_checkbox.isChecked() or not self.current_file_path:
+            return
+        reload_kinds = []
+        for kind, label in self._image_labels().items():
+            source = self._preview_sources.get(kind)
+            if source is None or needs_decode(source[0], source[1], label.size()):
+                reload_kinds.append(kind)
+            else:
+                label.setPixmap(QPixmap.fromImage(fit_image(source[0], label.size())))
+        if reload_kinds:
+            self._request_preview(want_fields=False, kinds=reload_kinds)
 
-            scaled_pixmap = pixmap.scaled(
-                label.size(),
-                Qt.KeepAspectRatio,
-                Qt.SmoothTransformation
-            )
-            label.setPixmap(scaled_pixmap)
+    def _on_preview_image(self, generation, nfo_path, kind, image, original, message):
+        if generation != self._preview_generation or nfo_path != self.current_file_path:
+            return
+        if not self.show_images_checkbox.isChecked():
+            return
+        if kind == POSTER:
+            label, resolution_label = self.poster_label, self.poster_resolution_label
+            empty_text = "文件夹内无poster图片"
+        else:
+            label, resolution_label = self.thumb_label, self.thumb_resolution_label
+            empty_text = "文件夹内无thumb或fanart图片"
 
-        except Exception as e:
-            label.setText(f"加载图片失败: {str(e)}")
-            if resolution_label:
-                resolution_label.setText("分辨率: 加载失败")
+        if image is None:
+            self._preview_sources.pop(kind, None)
+            label.setText(message or empty_text)
+            resolution_label.setText("分辨率: 加载失败" if message else "分辨率: 未知")
+            return
+        self._preview_sources[kind] = (image, original)
+        resolution_label.setText(f"分辨率: {original[0]} × {original[1]}")
+        # 解码期间图片框可能又变了尺寸
+        label.setPixmap(QPixmap.fromImage(fit_image(image, label.size())))
 
     # ================================================================
     #  排序 & 筛选
@@ -1550,70 +2034,47 @@ class NFOEditorQt5(NFOEditorQt):
 
         sort_by = self.sorting_group.checkedButton().text()
 
-        items_with_data = []
-        for i in range(self.file_tree.topLevelItemCount()):
-            item = self.file_tree.topLevelItem(i)
-            values = [item.text(j) for j in range(3)]
-
-            if values[2]:
-                nfo_path = (
-                    os.path.join(self.folder_path, values[0], values[1], values[2])
-                    if values[1]
-                    else os.path.join(self.folder_path, values[0], values[2])
-                )
-
-                cache_data = self.nfo_cache.get(nfo_path)
-                if cache_data:
-                    items_with_data.append((values, item, cache_data))
-
-        def get_sort_key(item_tuple):
-            values, tree_item, cache_data = item_tuple
+        # 只对当前显示的行排序（保留筛选结果），结果是 _paths 下标的新排列
+        all_paths = self.file_model.all_paths()
+        columns = self.file_model.columns
+        rows = np.asarray(self.file_model.order(), dtype=np.intp)
 
+        try:
             if "演员" in sort_by:
-                return (", ".join(sorted(cache_data.get('actors', []) or [])),)
+                keys = [", ".join(sorted(self.nfo_cache.get(all_paths[src]).actors)) for src in rows]
+                order = argsort_strings(keys, rows)
             elif "系列" in sort_by:
-                series = cache_data.get('series', '') or ''
-                # (-count, series_name) 使作品多的系列排前面，空系列排末尾
-                return (1 if not series else 0,
-                        -series_counts.get(series, 0),
-                        series)
+                # 作品多的系列排前面，空系列排末尾
+                keys = [self.nfo_cache.get(all_paths[src]).series or "" for src in rows]
+                order = argsort_groups(keys, rows)
             elif "评分" in sort_by:
-                try:
-                    rating = cache_data.get('rating', 0.0)
-                    return (-float(rating) if rating else 0.0,)
-                except (ValueError, TypeError):
-                    return (0.0,)
+                order = columns.argsort_desc("rating", rows)
             else:
-                release = cache_data.get('release', '') or '0000-00-00'
-                return (release,)
-
-        # 系列排序需要预先统计每个系列的影片数
-        series_counts: dict = {}
-        if "系列" in sort_by:
-            for _, _, cd in items_with_data:
-                s = cd.get('series', '') or ''
-                series_counts[s] = series_counts.get(s, 0) + 1
-
-        try:
-            # 评分/日期已在 get_sort_key 内取负，统一升序排即可
-            reverse = False
-            if "日期" in sort_by:
-                # 日期需要降序（新日期在前），key 没取负，用 reverse=True
-                reverse = True
-            items_with_data.sort(key=get_sort_key, reverse=reverse)
+                # 新日期在前，无日期的排末尾
+                order = columns.argsort_desc("release", rows)
         except Exception as e:
             print(f"排序出错: {str(e)}")
             QMessageBox.warning(self, "警告", f"排序失败: {str(e)}")
             return
 
-        self.file_tree.clear()
-        for values, item, cache_data in items_with_data:
-            new_item = QTreeWidgetItem(values)
-            self.file_tree.addTopLevelItem(new_item)
+        self.file_model.set_order(order.tolist())
+        self._sort_applied = True
 
         self.status_bar.showMessage(f"已按 {sort_by} 排序", 3000)
 
+    def _schedule_filter(self, *args):
+        if self.folder_path:
+            self.filter_timer.start(self.FILTER_DELAY_MS)
+
+    def _apply_filter_typed(self):
+        self._filter_typed = True
+        try:
+            self.apply_filter()
+        finally:
+            self._filter_typed = False
+
     def apply_filter(self):
+        self.filter_timer.stop()
         if not self.folder_path:
             return
 
@@ -1622,82 +2083,208 @@ class NFOEditorQt5(NFOEditorQt):
         filter_text = self.filter_entry.text().strip()
 
         if not filter_text:
-            self.load_files_in_folder()
+            self._clear_filter()
             return
 
-        self.file_tree.clear()
-        matched_paths = []
-
-        for nfo_path in self.nfo_files:
-            cache_data = self.nfo_cache.get(nfo_path)
-            if not cache_data:
-                continue
+        all_paths = self.file_model.all_paths()
+        if self._unfiltered is None:
+            self._unfiltered = (self.file_model.search.version, self.file_model.order())
 
+        if field == "评分":
+            # 数值列 + 布尔掩码，一次比较整列
             try:
-                value = ""
-                if field == "标题":
-                    value = cache_data.get('title', '')
-                elif field == "标签":
-                    value = ", ".join(cache_data.get('tags', []))
-                elif field == "演员":
-                    value = ", ".join(cache_data.get('actors', []))
-                elif field == "系列":
-                    value = cache_data.get('series', '')
-                elif field == "评分":
-                    rating = cache_data.get('rating', 0.0)
-                    try:
-                        value = str(float(rating) if rating else 0.0)
-                    except (ValueError, TypeError):
-                        value = "0.0"
-
-                match = False
-                if field == "评分":
-                    try:
-                        current_value = float(value)
-                        filter_value = float(filter_text)
-                        if condition == "大于":
-                            match = current_value > filter_value
-                        elif condition == "小于":
-                            match = current_value < filter_value
-                    except ValueError:
-                        continue
+                filter_value = float(filter_text)
+            except ValueError:
+                matched_rows = []
+            else:
+                columns = self.file_model.columns
+                if condition == "大于":
+                    mask = columns.range_mask("rating", low=filter_value)
                 else:
-                    if condition == "包含":
-                        match = filter_text.lower() in value.lower()
-                    elif condition == "不包含":
-                        match = filter_text.lower() not in value.lower()
+                    mask = columns.range_mask("rating", high=filter_value)
+                matched_rows = np.flatnonzero(mask).tolist()
+        elif field == "查询":
+            matched_rows = self._filter_query(filter_text, explain=condition == "解释")
+            if matched_rows is None:
+                return
+        else:
+            matched_rows = self._filter_text_field(field, condition, filter_text)
 
-                if match:
-                    matched_paths.append(nfo_path)
+        self.file_model.set_order(matched_rows)
 
-            except Exception as e:
-                print(f"筛选文件 {nfo_path} 时出错: {str(e)}")
-                continue
+        self.status_bar.showMessage(
+            f"筛选结果: 匹配 {len(matched_rows)} / 总计 {len(all_paths)}"
+        )
 
-        for nfo_path in matched_paths:
-            relative_path = os.path.relpath(nfo_path, self.folder_path)
-            parts = relative_path.split(os.sep)
+    # 筛选框字段 -> 倒排索引字段
+    FILTER_FIELDS = {"标题": "title", "标签": "tags", "演员": "actors", "系列": "series"}
+    FILTER_DELAY_MS = 200
 
-            if len(parts) > 1:
-                first_level = os.sep.join(parts[:-2]) if len(parts) > 2 else ""
-                second_level = parts[-2]
-                nfo_name = parts[-1]
-            else:
-                first_level = ""
-                second_level = ""
-                nfo_name = parts[-1]
+    def _clear_filter(self):
+        """清空筛选：从内存还原筛选前的列表，不重新扫描磁盘"""
+        self._filter_state = None
+        if self._unfiltered is None:
+            return
+        version, order = self._unfiltered
+        self._unfiltered = None
+        if version == self.file_model.search.version:
+            self.file_model.set_order(order)
+        else:
+            # 筛选期间列表内容有变化，按加载顺序显示全部
+            self.file_model.show_all()
+        if self._sort_applied:
+            # 筛选期间可能换了排序方式，按当前选中的排序重新排列全部文件
+            self.sort_files()
+        self.status_bar.showMessage(f"显示全部 {self.file_model.rowCount()} 个文件", 3000)
+
+    def _filter_query(self, query_text, explain=False):
+        """执行组合查询，返回匹配的 _paths 下标；语法错误时返回 None 并保留当前列表"""
+        query = self._compiled_query
+        if query is None or query.text != query_text:
+            try:
+                query = self._compiled_query = CompiledQuery(query_text)
+            except QueryError as e:
+                # 边输入边筛选时查询经常是不完整的，只在状态栏提示
+                self.status_bar.showMessage(f"查询语法错误: {str(e)}")
+                return None
+
+        matched_rows, ctx = query.execute(self.file_model.search, self.file_model.columns)
+        if explain:
+            plan = query.explain(ctx)
+            print(plan)
+            if not self._filter_typed:
+                QMessageBox.information(self, "执行计划", plan)
+        return matched_rows
+
+    def _filter_text_field(self, field, condition, filter_text):
+        """文本字段的包含/不包含筛选（倒排索引），返回匹配的 _paths 下标（升序）
+
+        关键词包含上一次的关键词（同一字段）时，结果必然是上一次包含结果的子集，
+        候选较少时只在其中复查；不包含取包含结果的补集。
+        """
+        search = self.file_model.search
+        name = self.FILTER_FIELDS.get(field)
+        if name is None:
+            return []
+        needle = filter_text.lower()
 
-            item = QTreeWidgetItem([first_level, second_level, nfo_name])
-            self.file_tree.addTopLevelItem(item)
+        state = self._filter_state
+        if (
+            state is not None
+            and state[0] == search.version
+            and state[1] == name
+            and state[2] in needle
+            and len(state[3]) < len(search.fields[name])
+        ):
+            matched = search.contains_within(name, needle, state[3])
+        else:
+            matched = search.contains(name, needle)
+        self._filter_state = (search.version, name, needle, matched)
 
-        self.status_bar.showMessage(
-            f"筛选结果: 匹配 {len(matched_paths)} / 总计 {len(self.nfo_files)}"
-        )
+        if condition == "不包含":
+            return sorted_ids(search.complement(matched))
+        return sorted_ids(matched)
 
     # ================================================================
     #  批量操作 - 操作后同步更新缓存
     # ================================================================
 
+    def _run_batch_edit(
+        self, paths, edit, failure_text, label, log_text, progress_bar, apply_button, cancel_button, on_finished=None
+    ):
+        """在后台执行批量编辑并记入撤销记录（label 为记录中显示的操作名）；返回是否已开始"""
+        if self.edit_job is not None:
+            QMessageBox.warning(self, "警告", "上一个批量操作尚未完成")
+            return False
+        job = BatchEditJob(
+            paths,
+            edit,
+            failure_text,
+            minimal=self._minimal_diff,
+            recorder=self._journal_recorder(label),
+            parent=self,
+        )
+        return self._start_edit_job(job, log_text, progress_bar, apply_button, cancel_button, on_finished)
+
+    def _start_edit_job(self, job, log_text, progress_bar, apply_button, cancel_button, on_finished=None):
+        """启动后台编辑任务，对话框中显示进度和逐文件日志；关闭对话框即取消剩余文件
+
+        已有任务在运行时不启动（不会调用 on_finished），返回 False。
+        """
+        if self.edit_job is not None:
+            QMessageBox.warning(self, "警告", "上一个批量操作尚未完成")
+            return False
+
+        # 批量修改的文件可能还有待写回的保存，先写完再开始
+        self.save_queue.flush()
+        paths = job.paths
+        log_text.clear()
+        progress_bar.setRange(0, len(paths))
+        progress_bar.setValue(0)
+        progress_bar.show()
+        apply_button.setEnabled(False)
+        cancel_button.setEnabled(True)
+
+        def on_progress(finished, total):
+            progress_bar.setValue(finished)
+
+        def on_log(lines):
+            if lines:
+                log_text.append("\n".join(lines))
+
+        def on_done(records, cancelled):
+            detach()
+            apply_button.setEnabled(True)
+            cancel_button.setEnabled(False)
+            if on_finished is not None:
+                on_finished()
+
+        dialog = log_text.window()
+
+        def detach(*_):
+            # 对话框关闭后控件随之销毁，先断开与它们的连接
+            job.progress.disconnect(on_progress)
+            job.log.disconnect(on_log)
+            job.done.disconnect(on_done)
+            cancel_button.clicked.disconnect(job.cancel)
+            dialog.finished.disconnect(on_dialog_finished)
+
+        def on_dialog_finished(_):
+            job.cancel()
+            detach()
+
+        job.progress.connect(on_progress)
+        job.log.connect(on_log)
+        # 先更新缓存和索引，on_finished 中看到的是修改后的数据
+        job.done.connect(self._on_batch_edit_done)
+        job.done.connect(on_done)
+        cancel_button.clicked.connect(job.cancel)
+        dialog.finished.connect(on_dialog_finished)
+
+        self.edit_job = job
+        job.start()
+        return True
+
+    def _on_batch_edit_done(self, records, cancelled):
+        """批量编辑结束：用内存中生成的记录整批更新缓存和文件列表"""
+        job, self.edit_job = self.edit_job, None
+        if job is not None:
+            job.wait()
+            job.deleteLater()
+
+        for nfo_path, record in records.items():
+            self.nfo_cache.set(nfo_path, record)
+        self.file_model.refresh_paths(records)
+
+        current = records.get(self.current_file_path) if self.current_file_path else None
+        if current is not None:
+            self._clear_fields()
+            self._show_record(current)
+            self._snapshot_fields()
+
+        state = "已取消" if cancelled else "完成"
+        self.status_bar.showMessage(f"批量操作{state}: 修改了 {len(records)} 个文件", 5000)
+
     def batch_filling(self):
         dialog = QDialog(self)
         dialog.setAttribute(Qt.WA_DeleteOnClose)
@@ -1788,91 +2375,37 @@ class NFOEditorQt5(NFOEditorQt):
             if not fill_value:
                 return
 
-            selected_items = self.file_tree.selectedItems()
-            if not selected_items:
+            selected_paths = self.selected_nfo_paths()
+            if not selected_paths:
                 QMessageBox.warning(dialog, "警告", "请先选择要填充的文件")
                 return
 
-            operation_log = []
-
-            for item in selected_items:
-                values = [item.text(i) for i in range(3)]
-                nfo_path = (
-                    os.path.join(self.folder_path, values[0], values[1], values[2])
-                    if values[1]
-                    else os.path.join(self.folder_path, values[0], values[2])
-                )
-
-                try:
-                    tree = ET.parse(nfo_path)
-                    root = tree.getroot()
-
-                    if field == "actor":
-                        for actor_elem in root.findall("actor"):
-                            root.remove(actor_elem)
-                        for actor_name in fill_value.split(","):
-                            actor_name = actor_name.strip()
-                            if actor_name:
-                                actor_elem = ET.SubElement(root, "actor")
-                                name_elem = ET.SubElement(actor_elem, "name")
-                                name_elem.text = actor_name
-                        operation_log.append(f"{nfo_path}: actor字段填充成功")
-
-                    elif field == "rating":
-                        rating_elem = root.find("rating")
-                        if rating_elem is None:
-                            rating_elem = ET.SubElement(root, "rating")
-                        rating_elem.text = fill_value
-
-                        try:
-                            rating_value = float(fill_value)
-                            critic_rating = int(rating_value * 10)
-                            critic_elem = root.find("criticrating")
-                            if critic_elem is None:
-                                critic_elem = ET.SubElement(root, "criticrating")
-                            critic_elem.text = str(critic_rating)
-                            operation_log.append(
-                                f"{nfo_path}: rating填充成功 (rating: {fill_value}, criticrating: {critic_rating})"
-                            )
-                        except ValueError:
-                            operation_log.append(f"{nfo_path}: rating填充成功，但criticrating转换失败")
-
-                    else:
-                        elem = root.find(field)
-                        if elem is None:
-                            elem = ET.SubElement(root, field)
-                        elem.text = fill_value
-                        operation_log.append(f"{nfo_path}: {field}字段填充成功")
-
-                    xml_str = ET.tostring(root, encoding="utf-8")
-                    parsed_str = minidom.parseString(xml_str)
-                    pretty_str = parsed_str.toprettyxml(indent="  ", encoding="utf-8")
-                    pretty_str = "\n".join(
-                        line for line in pretty_str.decode("utf-8").split("\n") if line.strip()
-                    )
-
-                    with open(nfo_path, "w", encoding="utf-8") as f:
-                        f.write(pretty_str)
-
-                    # 同步更新缓存
-                    cache_data = parse_single_nfo(nfo_path)
-                    if cache_data:
-                        self.nfo_cache.set(nfo_path, cache_data)
-
-                except Exception as e:
-                    operation_log.append(f"{nfo_path}: {field}字段填充失败 - {str(e)}")
-
-            log_text.setText("\n".join(operation_log))
-
-            if self.current_file_path:
-                self.load_nfo_fields()
+            self._run_batch_edit(
+                selected_paths,
+                partial(fill_field, field, fill_value),
+                f"{field}字段填充失败",
+                f"批量填充 {field} = {fill_value}",
+                log_text,
+                progress_bar,
+                apply_button,
+                cancel_button,
+            )
 
         for rb in field_buttons:
             rb.toggled.connect(on_field_changed)
 
+        progress_bar = QProgressBar()
+        progress_bar.hide()
+        layout.addWidget(progress_bar)
+
+        button_layout = QHBoxLayout()
         apply_button = QPushButton("应用填充")
         apply_button.clicked.connect(apply_fill)
-        layout.addWidget(apply_button)
+        cancel_button = QPushButton("取消")
+        cancel_button.setEnabled(False)
+        button_layout.addWidget(apply_button)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
 
         on_field_changed()
         value_entry.returnPressed.connect(apply_fill)
@@ -1906,99 +2439,312 @@ class NFOEditorQt5(NFOEditorQt):
                 QMessageBox.warning(dialog, "警告", "请输入标签内容")
                 return
 
-            selected_items = self.file_tree.selectedItems()
-            if not selected_items:
+            selected_paths = self.selected_nfo_paths()
+            if not selected_paths:
                 QMessageBox.warning(dialog, "警告", "请先选择要新增的文件")
                 return
 
-            operation_log = []
+            self._run_batch_edit(
+                selected_paths,
+                partial(add_tags, add_value),
+                "标签新增失败",
+                f"批量新增标签 {add_value}",
+                log_text,
+                progress_bar,
+                apply_button,
+                cancel_button,
+            )
 
-            for item in selected_items:
-                values = [item.text(i) for i in range(3)]
-                nfo_path = (
-                    os.path.join(self.folder_path, values[0], values[1], values[2])
-                    if values[1]
-                    else os.path.join(self.folder_path, values[0], values[2])
-                )
+        progress_bar = QProgressBar()
+        progress_bar.hide()
+        layout.addWidget(progress_bar)
 
-                try:
-                    tree = ET.parse(nfo_path)
-                    root = tree.getroot()
-
-                    existing_tags = []
-                    for tag in root.findall("tag"):
-                        if tag is not None and tag.text:
-                            tag_text = tag.text.strip()
-                            if "," in tag_text:
-                                for sub_tag in tag_text.split(","):
-                                    sub_tag = sub_tag.strip()
-                                    if sub_tag:
-                                        existing_tags.append(sub_tag)
-                            else:
-                                existing_tags.append(tag_text)
+        button_layout = QHBoxLayout()
+        apply_button = QPushButton("应用新增")
+        apply_button.clicked.connect(apply_add)
+        cancel_button = QPushButton("取消")
+        cancel_button.setEnabled(False)
+        close_button = QPushButton("关闭")
+        close_button.clicked.connect(dialog.close)
+        button_layout.addWidget(apply_button)
+        button_layout.addWidget(cancel_button)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
 
-                    new_tags = []
-                    for tag in add_value.split(","):
-                        tag = tag.strip()
-                        if tag and tag not in existing_tags:
-                            new_tags.append(tag)
+        value_entry.returnPressed.connect(apply_add)
+        value_entry.setFocus()
 
-                    if not new_tags:
-                        operation_log.append(f"{nfo_path}: 所有标签已存在，跳过")
-                        continue
+        dialog.exec_()
 
-                    all_tags = existing_tags + new_tags
+    def _tag_vocabulary(self):
+        """全部 tag/genre 取值：[(显示文字, 规范化取值, tag 数, genre 数)]，按出现次数降序
 
-                    for tag_elem in root.findall("tag"):
-                        root.remove(tag_elem)
-                    for genre_elem in root.findall("genre"):
-                        root.remove(genre_elem)
+        计数直接取倒排索引，显示文字取第一条含该取值的记录中的原始写法。
+        """
+        search = self.file_model.search
+        paths = self.file_model.all_paths()
+        tag_counts = search.value_counts("tags")
+        genre_counts = search.value_counts("genres")
+        vocabulary = []
+        for key in tag_counts.keys() | genre_counts.keys():
+            label = key
+            for field in ("tags", "genres"):
+                doc = search.first_doc(field, key)
+                record = self.nfo_cache.get(paths[doc]) if doc >= 0 else None
+                if record is None:
+                    continue
+                label = next((value for value in record[field] if value.lower() == key), key)
+                break
+            vocabulary.append((label, key, tag_counts.get(key, 0), genre_counts.get(key, 0)))
+        vocabulary.sort(key=lambda item: (-(item[2] + item[3]), item[1]))
+        return vocabulary
+
+    def manage_tags(self):
+        """标签管理：按索引列出全部标签，重命名/合并/删除只改写含这些标签的文件"""
+        if not self.file_model.all_paths():
+            QMessageBox.warning(self, "警告", "请先选择nfo目录")
+            return
 
-                    for tag in all_tags:
-                        tag_elem = ET.SubElement(root, "tag")
-                        tag_elem.text = tag
+        dialog = QDialog(self)
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.setWindowTitle("标签管理")
+        dialog.resize(600, 700)
 
-                    for tag in all_tags:
-                        genre_elem = ET.SubElement(root, "genre")
-                        genre_elem.text = tag
+        layout = QVBoxLayout()
+        dialog.setLayout(layout)
 
-                    xml_str = ET.tostring(root, encoding="utf-8")
-                    parsed_str = minidom.parseString(xml_str)
-                    pretty_str = parsed_str.toprettyxml(indent="  ", encoding="utf-8")
-                    pretty_str = "\n".join(
-                        line for line in pretty_str.decode("utf-8").split("\n") if line.strip()
-                    )
+        filter_entry = QLineEdit()
+        filter_entry.setPlaceholderText("筛选标签")
+        layout.addWidget(filter_entry)
+
+        tag_list = QTreeWidget()
+        tag_list.setHeaderLabels(["标签", "tag", "genre"])
+        tag_list.setRootIsDecorated(False)
+        tag_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        tag_list.setColumnWidth(0, 360)
+        tag_list.header().setSortIndicator(1, Qt.DescendingOrder)
+        layout.addWidget(tag_list)
+
+        scope_layout = QHBoxLayout()
+        scope_layout.addWidget(QLabel("修改范围:"))
+        tag_cb = QCheckBox("tag")
+        tag_cb.setChecked(True)
+        genre_cb = QCheckBox("genre")
+        genre_cb.setChecked(True)
+        scope_layout.addWidget(tag_cb)
+        scope_layout.addWidget(genre_cb)
+        scope = (("tag", "tags", tag_cb), ("genre", "genres", genre_cb))
+        scope_layout.addStretch()
+        layout.addLayout(scope_layout)
+
+        layout.addWidget(QLabel("新标签名（选中多个标签时合并为此名称）:"))
+        name_entry = QLineEdit()
+        layout.addWidget(name_entry)
 
-                    with open(nfo_path, "w", encoding="utf-8") as f:
-                        f.write(pretty_str)
+        log_text = QTextEdit()
+        log_text.setReadOnly(True)
+        layout.addWidget(log_text)
 
-                    # 同步更新缓存
-                    cache_data = parse_single_nfo(nfo_path)
-                    if cache_data:
-                        self.nfo_cache.set(nfo_path, cache_data)
+        progress_bar = QProgressBar()
+        progress_bar.hide()
+        layout.addWidget(progress_bar)
 
-                    operation_log.append(f"{nfo_path}: 成功新增{len(new_tags)}个标签")
+        button_layout = QHBoxLayout()
+        rename_button = QPushButton("重命名/合并")
+        delete_button = QPushButton("删除")
+        cancel_button = QPushButton("取消")
+        cancel_button.setEnabled(False)
+        close_button = QPushButton("关闭")
+        close_button.clicked.connect(dialog.close)
+        for button in (rename_button, delete_button, cancel_button, close_button):
+            button_layout.addWidget(button)
+        layout.addLayout(button_layout)
 
-                except Exception as e:
-                    operation_log.append(f"{nfo_path}: 标签新增失败 - {str(e)}")
+        def reload_tags():
+            tag_list.setSortingEnabled(False)
+            tag_list.clear()
+            for label, key, tag_count, genre_count in self._tag_vocabulary():
+                item = QTreeWidgetItem([label])
+                item.setData(0, Qt.UserRole, key)
+                item.setData(1, Qt.DisplayRole, tag_count)
+                item.setData(2, Qt.DisplayRole, genre_count)
+                tag_list.addTopLevelItem(item)
+            tag_list.setSortingEnabled(True)
+            filter_tags()
+
+        def filter_tags():
+            text = filter_entry.text().strip().lower()
+            for i in range(tag_list.topLevelItemCount()):
+                item = tag_list.topLevelItem(i)
+                hidden = bool(text) and text not in item.data(0, Qt.UserRole)
+                item.setHidden(hidden)
+                if hidden:
+                    item.setSelected(False)
+
+        def on_current_changed(item, _):
+            if item is not None:
+                name_entry.setText(item.text(0))
+
+        def run(target):
+            items = tag_list.selectedItems()
+            if not items:
+                QMessageBox.warning(dialog, "警告", "请先选择标签")
+                return
+            scopes = [(tag, field) for tag, field, cb in scope if cb.isChecked()]
+            if not scopes:
+                QMessageBox.warning(dialog, "警告", "请至少选择tag或genre中的一个")
+                return
+            if target is not None:
+                target = target.strip()
+                if not target:
+                    QMessageBox.warning(dialog, "警告", "请输入新标签名")
+                    return
+                if "," in target:
+                    QMessageBox.warning(dialog, "警告", "标签名不能包含逗号")
+                    return
 
-            log_text.setText("\n".join(operation_log))
+            sources = frozenset(item.data(0, Qt.UserRole) for item in items)
+            labels = ", ".join(item.text(0) for item in items)
+            search = self.file_model.search
+            docs = set()
+            for _, field in scopes:
+                docs |= search.exact_any(field, sources)
+            paths = self.file_model.paths_of(docs)
+            if not paths:
+                return
 
-            if self.current_file_path:
-                self.load_nfo_fields()
+            if target is None:
+                label = f"删除标签 {labels}"
+            elif len(items) > 1:
+                label = f"合并标签 {labels} -> {target}"
+            else:
+                label = f"重命名标签 {labels} -> {target}"
+            reply = QMessageBox.question(
+                dialog,
+                "确认",
+                f"{label}\n将修改 {len(paths)} 个文件，是否继续？",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No,
+            )
+            if reply != QMessageBox.Yes:
+                return
+
+            started = self._run_batch_edit(
+                paths,
+                partial(replace_tags, sources, target, [tag for tag, _ in scopes]),
+                "标签修改失败",
+                label,
+                log_text,
+                progress_bar,
+                rename_button,
+                cancel_button,
+                on_finished=lambda: (delete_button.setEnabled(True), reload_tags()),
+            )
+            if started:
+                delete_button.setEnabled(False)
+
+        filter_entry.textChanged.connect(filter_tags)
+        tag_list.currentItemChanged.connect(on_current_changed)
+        rename_button.clicked.connect(lambda: run(name_entry.text()))
+        delete_button.clicked.connect(lambda: run(None))
+        name_entry.returnPressed.connect(lambda: run(name_entry.text()))
+
+        reload_tags()
+        dialog.exec_()
+
+    def show_journal(self):
+        """操作历史：整批撤销/重做保存和批量修改"""
+        if self.journal is None and self._journal_max_bytes > 0:
+            self._journal_recorder("")
+        if self.journal is None:
+            QMessageBox.information(self, "提示", "撤销记录已关闭，可在设置中开启")
+            return
+
+        dialog = QDialog(self)
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.setWindowTitle("操作历史")
+        dialog.resize(700, 600)
+
+        layout = QVBoxLayout()
+        dialog.setLayout(layout)
+
+        history = QTreeWidget()
+        history.setHeaderLabels(["时间", "操作", "文件数", "状态"])
+        history.setRootIsDecorated(False)
+        history.setColumnWidth(0, 150)
+        history.setColumnWidth(1, 330)
+        layout.addWidget(history)
+
+        log_text = QTextEdit()
+        log_text.setReadOnly(True)
+        layout.addWidget(log_text)
+
+        progress_bar = QProgressBar()
+        progress_bar.hide()
+        layout.addWidget(progress_bar)
 
         button_layout = QHBoxLayout()
-        apply_button = QPushButton("应用新增")
-        apply_button.clicked.connect(apply_add)
+        undo_button = QPushButton("撤销")
+        redo_button = QPushButton("重做")
+        cancel_button = QPushButton("取消")
+        cancel_button.setEnabled(False)
         close_button = QPushButton("关闭")
         close_button.clicked.connect(dialog.close)
-        button_layout.addWidget(apply_button)
-        button_layout.addWidget(close_button)
+        for button in (undo_button, redo_button, cancel_button, close_button):
+            button_layout.addWidget(button)
         layout.addLayout(button_layout)
 
-        value_entry.returnPressed.connect(apply_add)
-        value_entry.setFocus()
+        def reload_history():
+            history.clear()
+            try:
+                batches = self.journal.batches()
+            except Exception as e:
+                log_text.setText(f"读取撤销记录失败: {str(e)}")
+                return
+            for batch in batches:
+                item = QTreeWidgetItem([
+                    datetime.fromtimestamp(batch.created).strftime("%Y-%m-%d %H:%M:%S"),
+                    batch.label,
+                    str(batch.files),
+                    "已撤销" if batch.state == UNDONE else "已应用",
+                ])
+                item.setData(0, Qt.UserRole, batch.id)
+                history.addTopLevelItem(item)
+            if batches:
+                history.setCurrentItem(history.topLevelItem(0))
+
+        def replay(undo):
+            item = history.currentItem()
+            if item is None:
+                return
+            try:
+                job = JournalReplayJob(
+                    self.journal,
+                    item.data(0, Qt.UserRole),
+                    undo,
+                    minimal=self._minimal_diff,
+                    parent=self,
+                )
+            except Exception as e:
+                QMessageBox.critical(dialog, "错误", f"读取撤销记录失败: {str(e)}")
+                return
+            started = self._start_edit_job(
+                job,
+                log_text,
+                progress_bar,
+                undo_button,
+                cancel_button,
+                on_finished=lambda: (redo_button.setEnabled(True), reload_history()),
+            )
+            if started:
+                redo_button.setEnabled(False)
+            else:
+                job.deleteLater()
 
+        undo_button.clicked.connect(lambda: replay(True))
+        redo_button.clicked.connect(lambda: replay(False))
+
+        reload_history()
         dialog.exec_()
 
     # ================================================================
@@ -2006,65 +2752,43 @@ class NFOEditorQt5(NFOEditorQt):
     # ================================================================
 
     def open_selected_nfo(self):
-        selected_items = self.file_tree.selectedItems()
-        for item in selected_items:
-            values = [item.text(i) for i in range(3)]
-            if values[2]:
-                nfo_path = (
-                    os.path.join(self.folder_path, values[0], values[1], values[2])
-                    if values[1]
-                    else os.path.join(self.folder_path, values[0], values[2])
-                )
-                if os.path.exists(nfo_path):
-                    os.startfile(nfo_path)
-                else:
-                    QMessageBox.critical(self, "错误", f"NFO文件不存在: {nfo_path}")
+        selected_paths = self.selected_nfo_paths()
+        for nfo_path in selected_paths:
+            if os.path.exists(nfo_path):
+                os.startfile(nfo_path)
+            else:
+                QMessageBox.critical(self, "错误", f"NFO文件不存在: {nfo_path}")
 
     def open_selected_folder(self):
-        selected_items = self.file_tree.selectedItems()
-        for item in selected_items:
-            values = [item.text(i) for i in range(3)]
-            if values[2]:
-                nfo_path = (
-                    os.path.join(self.folder_path, values[0], values[1], values[2])
-                    if values[1]
-                    else os.path.join(self.folder_path, values[0], values[2])
-                )
-                if os.path.exists(nfo_path):
-                    os.startfile(os.path.dirname(nfo_path))
-                else:
-                    QMessageBox.critical(self, "错误", f"文件夹不存在: {os.path.dirname(nfo_path)}")
+        selected_paths = self.selected_nfo_paths()
+        for nfo_path in selected_paths:
+            if os.path.exists(nfo_path):
+                os.startfile(os.path.dirname(nfo_path))
+            else:
+                QMessageBox.critical(self, "错误", f"文件夹不存在: {os.path.dirname(nfo_path)}")
 
     def open_selected_video(self):
         video_extensions = [".mp4", ".mkv", ".avi", ".mov", ".rm", ".mpeg", ".ts", ".strm"]
-        selected_items = self.file_tree.selectedItems()
-
-        for item in selected_items:
-            values = [item.text(i) for i in range(3)]
-            if values[2]:
-                nfo_path = (
-                    os.path.join(self.folder_path, values[0], values[1], values[2])
-                    if values[1]
-                    else os.path.join(self.folder_path, values[0], values[2])
-                )
+        selected_paths = self.selected_nfo_paths()
 
-                if os.path.exists(nfo_path):
-                    video_base = os.path.splitext(nfo_path)[0]
-                    for ext in video_extensions:
-                        video_path = video_base + ext
-                        if os.path.exists(video_path):
-                            if ext == ".strm":
-                                self._play_strm(video_path)
-                            else:
-                                try:
-                                    subprocess.Popen(["mpvnet", video_path])
-                                except OSError as e:
-                                    QMessageBox.critical(self, "错误", f"启动 mpvnet 失败: {e}")
-                            return
+        for nfo_path in selected_paths:
+            if os.path.exists(nfo_path):
+                video_base = os.path.splitext(nfo_path)[0]
+                for ext in video_extensions:
+                    video_path = video_base + ext
+                    if os.path.exists(video_path):
+                        if ext == ".strm":
+                            self._play_strm(video_path)
+                        else:
+                            try:
+                                subprocess.Popen(["mpvnet", video_path])
+                            except OSError as e:
+                                QMessageBox.critical(self, "错误", f"启动 mpvnet 失败: {e}")
+                        return
 
-                    QMessageBox.warning(self, "警告", "未找到匹配的视频文件")
-                else:
-                    QMessageBox.critical(self, "错误", f"NFO文件不存在: {nfo_path}")
+                QMessageBox.warning(self, "警告", "未找到匹配的视频文件")
+            else:
+                QMessageBox.critical(self, "错误", f"NFO文件不存在: {nfo_path}")
 
     def play_trailer(self):
         if not self.current_file_path:
@@ -2271,27 +2995,18 @@ class NFOEditorQt5(NFOEditorQt):
         threading.Thread(target=search_javdb, daemon=True).start()
 
     def batch_search_numbers(self):
-        selected_items = self.file_tree.selectedItems()
-        if not selected_items:
+        selected_paths = self.selected_nfo_paths()
+        if not selected_paths:
             QMessageBox.warning(self, "警告", "请先选择要搜索的NFO文件")
             return
 
         numbers = []
-        for item in selected_items:
+        for nfo_path in selected_paths:
             try:
-                values = [item.text(i) for i in range(3)]
-                if values[2]:
-                    nfo_path = (
-                        os.path.join(self.folder_path, values[0], values[1], values[2])
-                        if values[1]
-                        else os.path.join(self.folder_path, values[0], values[2])
-                    )
-                    if os.path.exists(nfo_path):
-                        tree = ET.parse(nfo_path)
-                        root = tree.getroot()
-                        num_elem = root.find("num")
-                        if num_elem is not None and num_elem.text:
-                            numbers.append(num_elem.text.strip())
+                if os.path.exists(nfo_path):
+                    record = parse_nfo(nfo_path)
+                    if record.num:
+                        numbers.append(record.num)
             except Exception as e:
                 print(f"处理NFO文件失败: {str(e)}")
                 continue
@@ -2375,14 +3090,9 @@ class NFOEditorQt5(NFOEditorQt):
     #  双击 & 焦点
     # ================================================================
 
-    def on_file_double_click(self, item, column):
-        values = [item.text(i) for i in range(3)]
-        if values[2]:
-            nfo_path = (
-                os.path.join(self.folder_path, values[0], values[1], values[2])
-                if values[1]
-                else os.path.join(self.folder_path, values[0], values[2])
-            )
+    def on_file_double_click(self, index):
+        nfo_path = self.file_model.path_at(index.row())
+        if nfo_path:
             if os.path.exists(nfo_path):
                 os.startfile(os.path.dirname(nfo_path))
             else:
@@ -2407,9 +3117,9 @@ class NFOEditorQt5(NFOEditorQt):
     def focus_file_list(self):
         if hasattr(self, "file_tree"):
             self.file_tree.setFocus(Qt.OtherFocusReason)
-            if not self.file_tree.selectedItems():
-                if self.file_tree.topLevelItemCount() > 0:
-                    self.file_tree.setCurrentItem(self.file_tree.topLevelItem(0))
+            if not self.file_tree.selectionModel().hasSelection():
+                if self.file_model.rowCount() > 0:
+                    self._select_row(0)
 
     def focus_rating(self):
         if "rating" in self.fields_entries:
@@ -2439,14 +3149,13 @@ class NFOEditorQt5(NFOEditorQt):
             from cg_crop import EmbyPosterCrop
 
             image_path = os.path.join(folder, image_files[0])
-            tree = ET.parse(self.current_file_path)
-            root = tree.getroot()
+            record = parse_nfo(self.current_file_path)
 
             has_subtitle = False
             mark_type = "none"
 
-            for tag in root.findall("tag"):
-                tag_text = tag.text.lower() if tag.text else ""
+            for tag in record.tags:
+                tag_text = tag.lower()
                 if "中文字幕" in tag_text:
                     has_subtitle = True
                 elif "无码破解" in tag_text:
@@ -2473,46 +3182,40 @@ class NFOEditorQt5(NFOEditorQt):
             QMessageBox.critical(self, "错误", f"裁剪工具出错: {str(e)}")
 
     def delete_selected_folders(self):
-        selected_items = self.file_tree.selectedItems()
-        if not selected_items:
+        selected_paths = self.selected_nfo_paths()
+        if not selected_paths:
             return
 
         reply = QMessageBox.question(
             self,
             "确认删除",
-            f"确定要删除选中的 {len(selected_items)} 个文件夹吗？",
+            f"确定要删除选中的 {len(selected_paths)} 个文件夹吗？",
             QMessageBox.Yes | QMessageBox.No,
         )
 
         if reply == QMessageBox.No:
             return
 
+        self.save_queue.flush()
         deleted_count = 0
-        for item in selected_items:
+        removed_paths = []
+        for nfo_path in selected_paths:
             try:
-                values = [item.text(i) for i in range(3)]
-                if values[2]:
-                    nfo_path = (
-                        os.path.join(self.folder_path, values[0], values[1], values[2])
-                        if values[1]
-                        else os.path.join(self.folder_path, values[0], values[2])
-                    )
-                    folder_path = os.path.dirname(nfo_path)
+                folder_path = os.path.dirname(nfo_path)
 
-                    if os.path.exists(folder_path):
-                        winshell.delete_file(folder_path)
-                        deleted_count += 1
+                if os.path.exists(folder_path):
+                    winshell.delete_file(folder_path)
+                    deleted_count += 1
 
-                        self.nfo_cache.remove(nfo_path)
-                        if nfo_path in self.nfo_files:
-                            self.nfo_files.remove(nfo_path)
+                    self.nfo_cache.remove(nfo_path)
 
-                    root_item = self.file_tree.invisibleRootItem()
-                    root_item.takeChild(root_item.indexOfChild(item))
+                removed_paths.append(nfo_path)
 
             except Exception as e:
                 QMessageBox.warning(self, "警告", f"删除文件夹失败: {str(e)}")
 
+        self.file_model.remove_paths(removed_paths)
+
         if deleted_count > 0:
             self.status_bar.showMessage(f"成功删除 {deleted_count} 个文件夹")
             self.on_file_select()
@@ -2563,22 +3266,10 @@ class NFOEditorQt5(NFOEditorQt):
                 self.folder_path = base_path
                 self.load_files_in_folder()
 
-            for i in range(self.file_tree.topLevelItemCount()):
-                item = self.file_tree.topLevelItem(i)
-                first_level = item.text(0)
-                second_level = item.text(1)
-
-                if second_level:
-                    item_path = os.path.join(self.folder_path, first_level, second_level)
-                else:
-                    item_path = os.path.join(self.folder_path, first_level)
-
-                if os.path.normpath(item_path) == os.path.normpath(folder_path):
-                    self.file_tree.setCurrentItem(item)
-                    self.file_tree.scrollToItem(item)
-                    self.file_tree.itemSelectionChanged.emit()
-                    self.on_file_select()
-                    return
+            row = self.file_model.row_of_folder(folder_path)
+            if row >= 0:
+                self._select_row(row)
+                return
 
             QMessageBox.warning(self, "警告", f"未找到文件夹: {folder_path}")
 
@@ -2595,7 +3286,8 @@ class NFOEditorQt5(NFOEditorQt):
         refresh_action = menu.addAction("刷新")
         refresh_action.triggered.connect(self.load_files_in_folder)
 
-        if self.file_tree.selectedItems():
+        selected_count = len(self.file_tree.selectionModel().selectedRows())
+        if selected_count:
             menu.addSeparator()
 
             menu.addAction("打开NFO").triggered.connect(self.open_selected_nfo)
@@ -2603,9 +3295,9 @@ class NFOEditorQt5(NFOEditorQt):
             menu.addAction("播放视频").triggered.connect(self.open_selected_video)
 
             menu.addSeparator()
-            if len(self.file_tree.selectedItems()) > 1:
+            if selected_count > 1:
                 batch_search_action = menu.addAction(
-                    f"批量搜索番号 ({len(self.file_tree.selectedItems())}个)"
+                    f"批量搜索番号 ({selected_count}个)"
                 )
                 batch_search_action.triggered.connect(self.batch_search_numbers)
             else:
@@ -2641,10 +3333,28 @@ class NFOEditorQt5(NFOEditorQt):
 
     def closeEvent(self, event):
         try:
+            if hasattr(self, 'save_queue'):
+                # 待写回的保存全部写完再退出
+                self.save_queue.stop()
+                self.save_queue.wait()
+
+            if hasattr(self, 'preview_loader') and self.preview_loader.isRunning():
+                self.preview_loader.stop()
+                self.preview_loader.wait(2000)
+
+            if hasattr(self, 'edit_job') and self.edit_job and self.edit_job.isRunning():
+                # 已开始的文件写完并提交后再退出
+                self.edit_job.cancel()
+                self.edit_job.wait()
+
             if hasattr(self, 'load_thread') and self.load_thread and self.load_thread.isRunning():
                 self.load_thread.stop()
                 self.load_thread.wait(2000)
 
+            if hasattr(self, 'update_thread') and self.update_thread and self.update_thread.isRunning():
+                self.update_thread.stop()
+                self.update_thread.wait(2000)
+
             if hasattr(self, 'file_watcher'):
                 directories = self.file_watcher.directories()
                 files = self.file_watcher.files()
@@ -2697,4 +3407,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包后的 exe 中，解析进程池的子进程需要从这里分流
+    multiprocessing.freeze_support()
     main()
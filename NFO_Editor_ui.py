@@ -9,6 +9,7 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QLabel,
     QFrame,
+    QTreeView,
     QTreeWidget,
     QRadioButton,
     QButtonGroup,
@@ -22,6 +23,8 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt, QSettings
 from PyQt5.QtGui import QIcon, QCursor, QPixmap, QFont
 
+from nfo_model import NFOFileModel
+
 
 def get_resource_path(relative_path):
     if getattr(sys, "frozen", False):
@@ -85,7 +88,7 @@ class NFOEditorQt(QMainWindow):
                 font-size: {int(10 * self.scale_factor)}pt;
                 padding: {int(2 * self.scale_factor)}px;
             }}
-            QTreeWidget {{
+            QTreeView {{
                 font-size: {int(10 * self.scale_factor)}pt;
             }}
             QComboBox {{
@@ -202,6 +205,7 @@ class NFOEditorQt(QMainWindow):
             ("🔁",           "刷新文件列表,快捷键F5",              int(40  * self.scale_factor)),
             ("🖼",           "打开海报照片墙",                     int(40  * self.scale_factor)),
             ("🔜",           "移动nfo所在文件夹到目标目录,快捷键方向键→", int(40 * self.scale_factor)),
+            ("↩",           "操作历史：撤销/重做保存和批量修改",   int(40  * self.scale_factor)),
             ("⚙️",           "打开设置",                          int(40  * self.scale_factor)),
         ]
 
@@ -251,7 +255,7 @@ class NFOEditorQt(QMainWindow):
 
         self.field_combo = QComboBox()
         self.field_combo.setFixedWidth(int(65 * self.scale_factor))
-        self.field_combo.addItems(["标题", "标签", "演员", "系列", "评分"])
+        self.field_combo.addItems(["标题", "标签", "演员", "系列", "评分", "查询"])
         grid.addWidget(self.field_combo, 0, len(sort_options) + 1)
 
         self.condition_combo = QComboBox()
@@ -265,8 +269,13 @@ class NFOEditorQt(QMainWindow):
         def on_field_changed(index):
             self.condition_combo.clear()
             self.filter_entry.clear()
+            self.filter_entry.setPlaceholderText("")
             if self.field_combo.currentText() == "评分":
                 self.condition_combo.addItems(["大于", "小于"])
+            elif self.field_combo.currentText() == "查询":
+                # 组合查询语法见 nfo_query.py
+                self.condition_combo.addItems(["执行", "解释"])
+                self.filter_entry.setPlaceholderText('actor:"X" AND rating>8')
             else:
                 self.condition_combo.addItems(["包含", "不包含"])
 
@@ -297,9 +306,15 @@ class NFOEditorQt(QMainWindow):
         )
         grid.setSpacing(0)
 
-        self.file_tree = QTreeWidget()
-        self.file_tree.setHeaderLabels(["一级目录", "二级目录", "NFO文件"])
-        self.file_tree.setSelectionMode(QTreeWidget.ExtendedSelection)
+        # 文件列表为 model/view：模型只保存路径，行数再多也不创建条目控件
+        self.file_model = NFOFileModel(self)
+        self.file_tree = QTreeView()
+        self.file_tree.setModel(self.file_model)
+        self.file_tree.setRootIsDecorated(False)
+        self.file_tree.setUniformRowHeights(True)
+        self.file_tree.setAllColumnsShowFocus(True)
+        self.file_tree.setSelectionMode(QTreeView.ExtendedSelection)
+        self.file_tree.setSelectionBehavior(QTreeView.SelectRows)
         self.file_tree.setColumnWidth(0, int(160 * self.scale_factor))
         self.file_tree.setColumnWidth(1, int(160 * self.scale_factor))
         self.file_tree.setColumnHidden(2, True)
@@ -527,6 +542,7 @@ class NFOEditorQt(QMainWindow):
             ("保存更改 (Save Changes)", int(205 * self.scale_factor)),
             ("批量填充 (Batch Filling)", int(205 * self.scale_factor)),
             ("批量新增 (Batch Add)",    int(205 * self.scale_factor)),
+            ("标签管理 (Tags)",         int(150 * self.scale_factor)),
         ]
 
         button_frame = QFrame()
@@ -602,7 +618,11 @@ class NFOEditorQt(QMainWindow):
                 widget.setMaximumWidth(int(sizes['text_max_width'] * 0.6))
 
         if self.show_images_checkbox.isChecked() and self.current_file_path:
-            self.display_image()
+            self.rescale_images()
+
+    def rescale_images(self):
+        """图片框尺寸变化后调整预览图，由子类实现"""
+        pass
 
 
 if __name__ == "__main__":
@@ -0,0 +1,889 @@
+"""NFO 工具链性能基准
+
+用法:
+    python benchmarks/bench_nfo.py parse [--count N] [--folder DIR]
+    python benchmarks/bench_nfo.py index [--count N] [--folder DIR]
+    python benchmarks/bench_nfo.py pool [--count N] [--workers N]
+    python benchmarks/bench_nfo.py cache [--count N] [--scale K]
+    python benchmarks/bench_nfo.py scan [--count N] [--folder DIR]
+    python benchmarks/bench_nfo.py columns [--count N]
+    python benchmarks/bench_nfo.py search [--count N]
+    python benchmarks/bench_nfo.py write [--count N]
+    python benchmarks/bench_nfo.py patch [--count N]
+    python benchmarks/bench_nfo.py atomic [--count N]
+    python benchmarks/bench_nfo.py journal [--count N]
+    python benchmarks/bench_nfo.py tags [--count N]
+
+不指定 --folder 时在临时目录生成 N 个模拟 NFO（columns 只在内存中构造记录）。
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from nfo_cache import NFOCache  # noqa: E402
+from nfo_columns import RecordColumns  # noqa: E402
+from nfo_search import FIELDS, SearchIndex, sorted_ids  # noqa: E402
+from nfo_atomic import WriteBatch  # noqa: E402
+from nfo_patch import NFODocument, set_text  # noqa: E402
+from nfo_journal import Journal, JournalRecorder  # noqa: E402
+from nfo_jobs import EDIT_WORKERS, BatchEditJob, JournalReplayJob, SkipEdit, replace_tags  # noqa: E402
+from nfo_writer import legacy_pretty_xml, pretty_xml, write_nfo  # noqa: E402
+from nfo_index import NFOIndex, path_key  # noqa: E402
+from nfo_parser import TEXT_FIELDS, NFORecord, parse_nfo, parse_nfo_chunk  # noqa: E402
+from nfo_scanner import MTIME_SETTLE_SECONDS, scan_library  # noqa: E402
+
+
+SAMPLE_NFO = """<?xml version="1.0" encoding="utf-8"?>
+<movie>
+  <plot><![CDATA[{plot}]]></plot>
+  <outline/>
+  <originalplot/>
+  <tagline>发行日期 {release}</tagline>
+  <premiered>{release}</premiered>
+  <releasedate>{release}</releasedate>
+  <release>{release}</release>
+  <num>ABC-{index:05d}</num>
+  <title>ABC-{index:05d} 测试标题 {index}</title>
+  <originaltitle>ABC-{index:05d} Original Title</originaltitle>
+  <sorttitle>ABC-{index:05d}</sorttitle>
+  <customrating>JP-18+</customrating>
+  <mpaa>JP-18+</mpaa>
+  <rating>{rating}</rating>
+  <criticrating>{critic}</criticrating>
+  <year>{year}</year>
+  <runtime>120</runtime>
+  <series>系列{series}</series>
+  <set>
+    <name>系列{series}</name>
+  </set>
+  <studio>片商{series}</studio>
+  <maker>片商{series}</maker>
+  <publisher>发行{series}</publisher>
+  <label>标签{series}</label>
+  <director>导演{series}</director>
+  <tag>中文字幕</tag>
+  <tag>标签{tag_a}</tag>
+  <tag>标签{tag_b}</tag>
+  <genre>中文字幕</genre>
+  <genre>标签{tag_a}</genre>
+  <genre>标签{tag_b}</genre>
+  <actor>
+    <name>演员{actor_a}</name>
+    <type>Actor</type>
+    <thumb>https://example.com/{actor_a}.jpg</thumb>
+  </actor>
+  <actor>
+    <name>演员{actor_b}</name>
+    <type>Actor</type>
+    <thumb>https://example.com/{actor_b}.jpg</thumb>
+  </actor>
+  <poster>ABC-{index:05d}-poster.jpg</poster>
+  <thumb>ABC-{index:05d}-thumb.jpg</thumb>
+  <fanart>ABC-{index:05d}-fanart.jpg</fanart>
+  <cover>https://example.com/cover.jpg</cover>
+  <website>https://example.com/ABC-{index:05d}</website>
+</movie>
+"""
+
+
+def make_library(folder, count):
+    """在 folder 下生成 count 个 一级/二级/xxx.nfo 结构的模拟 NFO，返回路径列表"""
+    paths = []
+    for i in range(count):
+        sub = os.path.join(folder, f"演员{i % 97}", f"ABC-{i:05d}")
+        os.makedirs(sub, exist_ok=True)
+        path = os.path.join(sub, f"ABC-{i:05d}.nfo")
+        year = 2000 + i % 25
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                SAMPLE_NFO.format(
+                    index=i,
+                    plot="剧情简介 " * (20 + i % 30),
+                    release=f"{year}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                    year=year,
+                    rating=f"{(i % 100) / 10:.1f}",
+                    critic=i % 100,
+                    series=i % 211,
+                    tag_a=i % 53,
+                    tag_b=i % 389,
+                    actor_a=i % 997,
+                    actor_b=(i * 7) % 997,
+                )
+            )
+        paths.append(path)
+    return paths
+
+
+def collect_nfo_files(folder):
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.lower().endswith(".nfo"):
+                paths.append(os.path.join(root, name))
+    return paths
+
+
+def legacy_parse(nfo_path):
+    """旧版 LoadFilesThread._parse_nfo：ET.parse + 多次 root.find"""
+    tree = ET.parse(nfo_path)
+    root = tree.getroot()
+
+    data = {
+        "path": nfo_path,
+        "num": "",
+        "title": "",
+        "plot": "",
+        "series": "",
+        "rating": 0.0,
+        "release": "",
+        "actors": [],
+        "tags": [],
+    }
+
+    for field in ["num", "title", "plot", "series"]:
+        elem = root.find(field)
+        if elem is not None and elem.text:
+            data[field] = elem.text.strip()
+
+    rating_elem = root.find("rating")
+    if rating_elem is not None and rating_elem.text:
+        try:
+            data["rating"] = float(rating_elem.text.strip())
+        except ValueError:
+            data["rating"] = 0.0
+
+    release_elem = root.find("release")
+    if release_elem is not None and release_elem.text:
+        data["release"] = release_elem.text.strip()
+
+    actors = []
+    for actor in root.findall("actor"):
+        name_elem = actor.find("name")
+        if name_elem is not None and name_elem.text:
+            actors.append(name_elem.text.strip())
+    data["actors"] = actors
+
+    tags = []
+    for tag in root.findall("tag"):
+        if tag is not None and tag.text:
+            tags.append(tag.text.strip())
+    data["tags"] = tags
+
+    return data
+
+
+def legacy_parse_full(nfo_path):
+    """同样的 ET.parse + root.find 写法，但提取与 NFORecord 相同的字段集"""
+    tree = ET.parse(nfo_path)
+    root = tree.getroot()
+
+    data = {"path": nfo_path}
+    for field in TEXT_FIELDS + ("rating",):
+        elem = root.find(field)
+        data[field] = elem.text.strip() if elem is not None and elem.text else ""
+
+    if not data["set"]:
+        name_elem = root.find("set/name")
+        if name_elem is not None and name_elem.text:
+            data["set"] = name_elem.text.strip()
+
+    try:
+        data["rating"] = float(data["rating"]) if data["rating"] else None
+    except ValueError:
+        data["rating"] = None
+
+    if not data["year"] and data["release"]:
+        data["year"] = data["release"].split("-")[0]
+
+    data["actors"] = [
+        elem.text.strip() for elem in root.findall("actor/name") if elem.text and elem.text.strip()
+    ]
+    data["tags"] = [elem.text.strip() for elem in root.findall("tag") if elem.text and elem.text.strip()]
+    data["genres"] = [
+        elem.text.strip() for elem in root.findall("genre") if elem.text and elem.text.strip()
+    ]
+    return data
+
+
+def best_of(func, paths, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            func(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(label, seconds, count):
+    print(f"{label:<28} {seconds * 1000:9.1f} ms  {seconds / count * 1e6:8.1f} us/file")
+
+
+def bench_parse(args, paths):
+    # 预热一次，排除首次读盘的影响
+    for path in paths:
+        legacy_parse(path)
+
+    legacy = best_of(legacy_parse, paths, args.repeat)
+    legacy_full = best_of(legacy_parse_full, paths, args.repeat)
+    unified = best_of(parse_nfo, paths, args.repeat)
+
+    report("ET.parse + root.find (9字段)", legacy, len(paths))
+    report("ET.parse + root.find (全字段)", legacy_full, len(paths))
+    report("nfo_parser.parse_nfo (全字段)", unified, len(paths))
+    print(f"同字段集加速比: {legacy_full / unified:.2f}x")
+    print(f"对比旧编辑器 9 字段: {legacy / unified:.2f}x")
+
+
+def indexed_scan(index, folder, paths):
+    """与 LoadFilesThread 相同的索引流程：stat 比对，未变化的直接还原"""
+    cached = index.load_folder(folder)
+    updates = []
+    records = []
+    for path in paths:
+        stat = os.stat(path)
+        entry = cached.pop(path_key(path), None)
+        if entry is not None and entry.matches(stat):
+            if not entry.failed:
+                records.append(entry.record(path))
+            continue
+        try:
+            record = parse_nfo(path)
+            records.append(record)
+        except Exception:
+            record = None
+        updates.append((path, stat, record))
+    index.remove_keys(cached.keys())
+    index.store(updates)
+    return records, len(updates)
+
+
+def bench_index(args, paths):
+    folder = os.path.commonpath(paths)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = NFOIndex(os.path.join(tmp, "bench.db"))
+        try:
+            start = time.perf_counter()
+            _, parsed = indexed_scan(index, folder, paths)
+            cold = time.perf_counter() - start
+
+            warm = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                _, reparsed = indexed_scan(index, folder, paths)
+                elapsed = time.perf_counter() - start
+                warm = elapsed if warm is None else min(warm, elapsed)
+        finally:
+            index.close()
+
+    report(f"首次扫描 (解析 {parsed})", cold, len(paths))
+    report(f"再次扫描 (解析 {reparsed})", warm, len(paths))
+    print(f"加速比: {cold / warm:.2f}x")
+
+
+def pooled_parse(paths, workers, chunk_size=64):
+    """与 LoadFilesThread._parse_pending 相同：分块提交，按顺序合并"""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [
+            executor.submit(parse_nfo_chunk, paths[i:i + chunk_size])
+            for i in range(0, len(paths), chunk_size)
+        ]
+        records = []
+        for future in futures:
+            for values, _ in future.result():
+                records.append(NFORecord.from_tuple(values) if values is not None else None)
+    return records
+
+
+def bench_pool(args, paths):
+    workers = args.workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    serial = [parse_nfo(path) for path in paths]
+    serial_time = time.perf_counter() - start
+
+    # 包含进程启动开销，与一次真实扫描一致
+    start = time.perf_counter()
+    pooled = pooled_parse(paths, workers)
+    pool_time = time.perf_counter() - start
+
+    assert [r.to_tuple() for r in serial] == [r.to_tuple() for r in pooled]
+    report("单线程 parse_nfo", serial_time, len(paths))
+    report(f"进程池 ({workers} 进程)", pool_time, len(paths))
+    print(f"加速比: {serial_time / pool_time:.2f}x（CPU 核心数: {os.cpu_count()}）")
+
+
+class LegacyNFOCache:
+    """旧版 NFOCache：dict + list，set 时线性查重"""
+
+    def __init__(self):
+        self.cache = {}
+        self.file_paths = []
+
+    def set(self, path, data):
+        self.cache[path] = data
+        if path not in self.file_paths:
+            self.file_paths.append(path)
+
+
+def time_cache_set(cache, records):
+    start = time.perf_counter()
+    for path, record in records:
+        cache.set(path, record)
+    return time.perf_counter() - start
+
+
+def cache_memory(cache, parse, paths, scale):
+    """边解析边写入缓存（与真实加载一致），返回缓存常驻的字节数"""
+    tracemalloc.start()
+    for k in range(scale):
+        for path in paths:
+            cache.set(f"{path}.{k}", parse(path))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+def bench_cache(args, paths):
+    total = len(paths) * args.scale
+    legacy_records = [(f"{p}.{k}", legacy_parse(p)) for k in range(args.scale) for p in paths]
+    records = [(f"{p}.{k}", parse_nfo(p)) for k in range(args.scale) for p in paths]
+
+    legacy_time = time_cache_set(LegacyNFOCache(), legacy_records)
+    new_time = time_cache_set(NFOCache(), records)
+    del legacy_records, records
+
+    legacy_mem = cache_memory(LegacyNFOCache(), legacy_parse, paths, args.scale)
+    cache = NFOCache()
+    new_mem = cache_memory(cache, parse_nfo, paths, args.scale)
+
+    report("旧 NFOCache.set", legacy_time, total)
+    report("nfo_cache.NFOCache.set", new_time, total)
+    print(f"写入加速比: {legacy_time / new_time:.1f}x（{total} 条）")
+    print(f"常驻内存: 旧 {legacy_mem / total:.0f} 字节/条（dict，9 个字段），"
+          f"新 {new_mem / total:.0f} 字节/条（__slots__，25+ 个字段）；"
+          f"memory_usage() 估算 {cache.memory_usage()[1]} 字节/条")
+
+
+def walk_and_stat(folder):
+    """旧版四个工具的写法：os.walk 找 NFO，再逐个 os.stat"""
+    count = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.lower().endswith(".nfo"):
+                os.stat(os.path.join(root, name))
+                count += 1
+    return count
+
+
+def scanner_pass(folder, index, use_index):
+    count = 0
+    reused = 0
+    for manifest in scan_library(folder, index=index, use_index=use_index, stat_files=True):
+        count += len(manifest.nfo_stats)
+        reused += manifest.reused
+    return count, reused
+
+
+def age_library(folder, paths):
+    """补上海报/视频占位文件，并把目录 mtime 调到足够早，使目录清单可被持久化"""
+    old = time.time() - MTIME_SETTLE_SECONDS - 3600
+    for path in paths:
+        base = os.path.splitext(path)[0]
+        for suffix in ("-poster.jpg", "-fanart.jpg", ".mp4"):
+            open(base + suffix, "wb").close()
+    for root, _, _ in os.walk(folder):
+        os.utime(root, (old, old))
+
+
+def bench_scan(args, paths):
+    folder = os.path.commonpath(paths)
+    if not args.folder:
+        age_library(folder, paths)
+
+    def best(func):
+        result = None
+        elapsed = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = func()
+            seconds = time.perf_counter() - start
+            elapsed = seconds if elapsed is None else min(elapsed, seconds)
+        return result, elapsed
+
+    _, walk = best(lambda: walk_and_stat(folder))
+    _, plain = best(lambda: scanner_pass(folder, None, False))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = NFOIndex(os.path.join(tmp, "bench.db"))
+        try:
+            start = time.perf_counter()
+            scanner_pass(folder, index, True)
+            cold = time.perf_counter() - start
+            (_, reused), warm = best(lambda: scanner_pass(folder, index, True))
+        finally:
+            index.close()
+
+    report("os.walk + stat", walk, len(paths))
+    report("scandir 扫描器 (无清单)", plain, len(paths))
+    report("scandir 扫描器 (首次)", cold, len(paths))
+    report(f"scandir 扫描器 (复用 {reused} 个目录)", warm, len(paths))
+    print(f"加速比: 无清单 {walk / plain:.2f}x, 复用清单 {walk / warm:.2f}x")
+
+
+def make_records(count, seed=0):
+    """内存中构造 count 条记录，评分/日期/系列分布与模拟库相近"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        record = NFORecord(f"/lib/{i}.nfo")
+        if rng.random() > 0.05:
+            record.rating = round(rng.uniform(0, 10), 1)
+        if rng.random() > 0.02:
+            record.release = f"{rng.randint(2000, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        record.runtime = str(rng.randint(60, 180))
+        record.series = f"系列{rng.randint(0, 2000)}" if rng.random() > 0.2 else ""
+        record.actors = (f"演员{rng.randint(0, 5000)}",)
+        record.tags = tuple(f"标签{rng.randint(0, 400)}" for _ in range(rng.randint(1, 6)))
+        record.title = f"ABC-{i:05d} 测试标题 {rng.randint(0, 10 ** 6)} Title{rng.randint(0, 999)}"
+        records.append(record)
+    return records
+
+
+def legacy_sort_key(sort_by):
+    """旧版 sort_files 的排序键"""
+    def key(record):
+        if sort_by == "rating":
+            try:
+                rating = record.get("rating", 0.0)
+                return (-float(rating) if rating else 0.0,)
+            except (ValueError, TypeError):
+                return (0.0,)
+        return (record.get("release", "") or "0000-00-00",)
+    return key
+
+
+def legacy_rating_filter(records, threshold):
+    """旧版 apply_filter：每条记录 float() 后比较"""
+    matched = []
+    for src, record in enumerate(records):
+        rating = record.get("rating", 0.0)
+        try:
+            value = str(float(rating) if rating else 0.0)
+        except (ValueError, TypeError):
+            value = "0.0"
+        if float(value) > threshold:
+            matched.append(src)
+    return matched
+
+
+def bench_columns(args, paths):
+    records = make_records(args.count)
+    start = time.perf_counter()
+    columns = RecordColumns()
+    columns.append(records)
+    build = time.perf_counter() - start
+    rows = np.arange(len(records), dtype=np.intp)
+
+    def best(func):
+        elapsed = None
+        result = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = func()
+            seconds = time.perf_counter() - start
+            elapsed = seconds if elapsed is None else min(elapsed, seconds)
+        return result, elapsed
+
+    for name in ("rating", "release"):
+        items = list(enumerate(records))
+        legacy, legacy_time = best(
+            lambda: [src for src, _ in sorted(
+                items, key=lambda item: legacy_sort_key(name)(item[1]), reverse=name == "release"
+            )]
+        )
+        fast, fast_time = best(lambda: columns.argsort_desc(name, rows).tolist())
+        same = legacy == fast
+        report(f"{name} 排序 (旧)", legacy_time, len(records))
+        report(f"{name} 排序 (argsort)", fast_time, len(records))
+        print(f"  结果一致: {same}, 加速比 {legacy_time / fast_time:.1f}x")
+
+    legacy, legacy_time = best(lambda: legacy_rating_filter(records, 8.0))
+    fast, fast_time = best(lambda: np.flatnonzero(columns.range_mask("rating", low=8.0)).tolist())
+    report("评分>8 筛选 (旧)", legacy_time, len(records))
+    report("评分>8 筛选 (掩码)", fast_time, len(records))
+    print(f"  结果一致: {legacy == fast}, 加速比 {legacy_time / fast_time:.1f}x")
+    report("建列", build, len(records))
+
+
+def legacy_contains_filter(records, field, text):
+    """旧版 apply_filter 的包含筛选：每条记录拼接、转小写后做子串判断"""
+    matched = []
+    for src, record in enumerate(records):
+        value = record.get(field, "")
+        if isinstance(value, tuple):
+            value = ", ".join(value)
+        if text.lower() in value.lower():
+            matched.append(src)
+    return matched
+
+
+def bench_search(args, paths):
+    records = make_records(args.count)
+    start = time.perf_counter()
+    search = SearchIndex()
+    search.append(records)
+    report("建立倒排索引", time.perf_counter() - start, len(records))
+    start = time.perf_counter()
+    for field in FIELDS:
+        search.contains(field, "---")  # 第一次包含查找时建立三字母索引
+    report("建立三字母索引", time.perf_counter() - start, len(records))
+
+    def best(func):
+        elapsed = None
+        result = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = func()
+            seconds = time.perf_counter() - start
+            elapsed = seconds if elapsed is None else min(elapsed, seconds)
+        return result, elapsed
+
+    for field, text in (("title", "title12"), ("title", "标题"), ("actors", "演员12"), ("tags", "标签3")):
+        legacy, legacy_time = best(lambda: legacy_contains_filter(records, field, text))
+        fast, fast_time = best(lambda: sorted_ids(search.contains(field, text)))
+        report(f"{field} 包含 {text} (旧)", legacy_time, len(records))
+        report(f"{field} 包含 {text} (索引)", fast_time, len(records))
+        print(f"  匹配 {len(fast)}, 结果一致: {legacy == fast}, 加速比 {legacy_time / fast_time:.1f}x")
+
+    _, exact_time = best(lambda: search.exact("actors", "演员42"))
+    report("actors 精确查找", exact_time, len(records))
+    mask = [i % 100 != 0 for i in range(len(records))]
+    start = time.perf_counter()
+    search.keep(mask)
+    report("删除 1% 后重建下标", time.perf_counter() - start, len(records))
+
+
+def legacy_write(path, root):
+    """旧版保存：minidom 往返后整体写入"""
+    pretty_str = legacy_pretty_xml(root)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(pretty_str)
+
+
+def edit_and_write(paths, writer, measure_peak=False):
+    """与批量填充 rating 相同的编辑，返回 (总耗时, 单个文件写出的最大峰值内存)"""
+    elapsed = 0.0
+    peak = 0
+    for i, path in enumerate(paths):
+        root = ET.parse(path).getroot()
+        rating = root.find("rating")
+        rating.text = f"{(i % 100) / 10:.1f}"
+        if measure_peak:
+            tracemalloc.start()
+            writer(path, root)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        else:
+            start = time.perf_counter()
+            writer(path, root)
+            elapsed += time.perf_counter() - start
+    return elapsed, peak
+
+
+def bench_write(args, paths):
+    if args.folder:
+        print("write 会改写文件，只能在生成的模拟库上运行")
+        return
+    # 两种写法的输出必须逐字节一致
+    legacy_write(paths[0], ET.parse(paths[0]).getroot())
+    with open(paths[0], "rb") as f:
+        expected = f.read()
+    write_nfo(paths[0], ET.parse(paths[0]).getroot())
+    with open(paths[0], "rb") as f:
+        print(f"输出一致: {f.read() == expected}")
+
+    results = {}
+    for label, writer in (("minidom 往返", legacy_write), ("单遍写出", write_nfo)):
+        best = None
+        for _ in range(args.repeat):
+            elapsed, _ = edit_and_write(paths, writer)
+            best = elapsed if best is None else min(best, elapsed)
+        _, peak = edit_and_write(paths, writer, measure_peak=True)
+        results[label] = (best, peak)
+        report(label, best, len(paths))
+        print(f"  单文件峰值内存 {peak / 1024:.1f} KB")
+    (old, old_peak), (new, new_peak) = results.values()
+    print(f"加速比: {old / new:.2f}x，峰值内存 {old_peak / new_peak:.1f}x")
+
+
+def changed_bytes(before, after):
+    """两份内容去掉公共前缀和后缀后，改写区间的字节数"""
+    limit = min(len(before), len(after))
+    prefix = 0
+    while prefix < limit and before[prefix] == after[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and before[-1 - suffix] == after[-1 - suffix]:
+        suffix += 1
+    return max(len(before), len(after)) - prefix - suffix
+
+
+def edit_rating(root, i):
+    rating = f"{(i % 100) / 10 + 0.05:.2f}"
+    set_text(root, "rating", rating)
+    set_text(root, "criticrating", str(int(float(rating) * 10)))
+
+
+def bench_patch(args, paths):
+    if args.folder:
+        print("patch 会改写文件，只能在生成的模拟库上运行")
+        return
+    originals = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            originals[path] = f.read()
+
+    def restore():
+        for path, data in originals.items():
+            with open(path, "wb") as f:
+                f.write(data)
+
+    for label, minimal in (("整份重新格式化", False), ("最小改动写回", True)):
+        best = None
+        for _ in range(args.repeat):
+            restore()
+            start = time.perf_counter()
+            for i, path in enumerate(paths):
+                document = NFODocument.load(path)
+                edit_rating(document.root, i)
+                document.save(minimal=minimal)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        changed = 0
+        for path in paths:
+            with open(path, "rb") as f:
+                changed += changed_bytes(originals[path], f.read())
+        total = sum(len(data) for data in originals.values())
+        report(label, best, len(paths))
+        print(f"  改动字节 {changed / len(paths):.0f} B/文件（原文件平均 {total / len(paths):.0f} B）")
+    restore()
+
+
+def inplace_write(path, root):
+    """原子写入之前的写法：直接以 "w" 打开目标覆盖写入"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(pretty_xml(root))
+
+
+def bench_atomic(args, paths):
+    if args.folder:
+        print("atomic 会改写文件，只能在生成的模拟库上运行")
+        return
+
+    def run(save):
+        start = time.perf_counter()
+        for i, path in enumerate(paths):
+            root = ET.parse(path).getroot()
+            edit_rating(root, i)
+            save(path, root)
+        return time.perf_counter() - start
+
+    def batched():
+        with WriteBatch() as batch:
+            elapsed = run(lambda path, root: write_nfo(path, root, batch))
+            start = time.perf_counter()
+        return elapsed + time.perf_counter() - start
+
+    def batched_parallel():
+        """与 BatchEditJob 相同：多个线程各自原子写入，WriteBatch 在结束时统一 fsync 目录"""
+        def one(item):
+            i, path = item
+            root = ET.parse(path).getroot()
+            edit_rating(root, i)
+            write_nfo(path, root, batch)
+
+        start = time.perf_counter()
+        with WriteBatch() as batch:
+            with ThreadPoolExecutor(max_workers=EDIT_WORKERS) as pool:
+                list(pool.map(one, enumerate(paths)))
+        return time.perf_counter() - start
+
+    results = {}
+    for label, func in (
+        ("原地覆盖（无 fsync）", lambda: run(inplace_write)),
+        ("原子写入，逐个 fsync", lambda: run(write_nfo)),
+        ("原子写入，目录批量落盘", batched),
+        ("原子写入，目录批量落盘 + 线程池", batched_parallel),
+    ):
+        results[label] = min(func() for _ in range(args.repeat))
+        report(label, results[label], len(paths))
+    leftovers = sum(
+        1 for path in paths for name in os.listdir(os.path.dirname(path)) if name.endswith(".tmp")
+    )
+    print(f"残留临时文件: {leftovers}")
+    inplace, single, batch, parallel = results.values()
+    print(f"目录批量落盘相对逐个 fsync: {single / batch:.2f}x，加线程池: {single / parallel:.2f}x，"
+          f"相对原地覆盖: {inplace / parallel:.2f}x")
+
+
+def snapshot_files(paths):
+    """读取 paths 的内容和 mtime，返回 (快照, 还原函数)"""
+    originals = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            originals[path] = (f.read(), os.stat(path).st_mtime_ns)
+
+    def restore():
+        for path, (data, mtime_ns) in originals.items():
+            with open(path, "wb") as f:
+                f.write(data)
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    return originals, restore
+
+
+def bench_journal(args, paths):
+    if args.folder:
+        print("journal 会改写文件，只能在生成的模拟库上运行")
+        return
+    originals, restore = snapshot_files(paths)
+
+    journal = Journal(os.path.join(tempfile.mkdtemp(), "journal.db"))
+    for label, keep_originals in (("不记录", None), ("记录字段", False), ("记录字段和原始文件", True)):
+        best = None
+        for _ in range(args.repeat):
+            restore()
+            recorder = None
+            if keep_originals is not None:
+                recorder = JournalRecorder(journal, label, keep_originals)
+            start = time.perf_counter()
+            with WriteBatch() as batch:
+                for i, path in enumerate(paths):
+                    document = NFODocument.load(path)
+                    edit_rating(document.root, i)
+                    document.save(batch=batch)
+                    if recorder is not None:
+                        recorder.add(document)
+            if recorder is not None:
+                recorder.commit()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        report(label, best, len(paths))
+        if keep_originals is not None:
+            latest = journal.batches(limit=1)[0]
+            print(f"  撤销记录 {latest.bytes / latest.files:.0f} B/文件")
+
+    # 撤销最后一个批次（字段和原始文件都有记录）
+    latest = journal.batches(limit=1)[0]
+    job = JournalReplayJob(journal, latest.id, undo=True)
+    start = time.perf_counter()
+    job.run()
+    report("整批撤销", time.perf_counter() - start, len(paths))
+    exact = 0
+    for path, (data, mtime_ns) in originals.items():
+        with open(path, "rb") as f:
+            exact += f.read() == data and os.stat(path).st_mtime_ns == mtime_ns
+    print(f"  内容和修改时间完全还原: {exact}/{len(paths)}")
+
+
+def bench_tags(args, paths):
+    if args.folder:
+        print("tags 会改写文件，只能在生成的模拟库上运行")
+        return
+    _, restore = snapshot_files(paths)
+    search = SearchIndex()
+    search.append([parse_nfo(path) for path in paths])
+    edit = partial(replace_tags, frozenset({"标签5", "标签7"}), "标签X", ("tag", "genre"))
+
+    def full_scan():
+        """旧做法：全选后逐个文件执行，不含该标签的文件也要读取解析"""
+        written = 0
+        with WriteBatch() as batch:
+            for path in paths:
+                document = NFODocument.load(path)
+                try:
+                    edit(document.root)
+                except SkipEdit:
+                    continue
+                document.save(batch=batch)
+                written += 1
+        return written
+
+    def indexed():
+        docs = search.exact_any("tags", edit.args[0]) | search.exact_any("genres", edit.args[0])
+        job = BatchEditJob([paths[doc] for doc in sorted_ids(docs)], edit, "失败")
+        job.run()
+        return len(job.paths)
+
+    for label, func in (("全部扫描", full_scan), ("索引查找+并行写回", indexed)):
+        best = None
+        for _ in range(args.repeat):
+            restore()
+            start = time.perf_counter()
+            written = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(elapsed, best)
+        report(label, best, len(paths))
+        print(f"  改写 {written} 个文件")
+    restore()
+
+
+# 只在内存中构造数据，不需要生成 NFO 文件
+IN_MEMORY_COMMANDS = {"columns", "search"}
+
+COMMANDS = {
+    "parse": bench_parse,
+    "index": bench_index,
+    "pool": bench_pool,
+    "cache": bench_cache,
+    "scan": bench_scan,
+    "columns": bench_columns,
+    "search": bench_search,
+    "write": bench_write,
+    "patch": bench_patch,
+    "atomic": bench_atomic,
+    "journal": bench_journal,
+    "tags": bench_tags,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NFO 工具链性能基准")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--count", type=int, default=2000, help="生成的模拟 NFO 数量")
+    parser.add_argument("--folder", help="使用已有的 NFO 目录（只读）")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最好成绩")
+    parser.add_argument("--scale", type=int, default=10, help="cache 中每个 NFO 重复写入的次数")
+    parser.add_argument("--workers", type=int, default=0, help="pool 使用的进程数，默认为 CPU 核心数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.command in IN_MEMORY_COMMANDS:
+            paths = []
+            print(f"{args.command}: {args.count} 条记录")
+        elif args.folder:
+            paths = collect_nfo_files(args.folder)
+            print(f"{args.command}: {len(paths)} 个 NFO")
+        else:
+            paths = make_library(tmp, args.count)
+            print(f"{args.command}: {len(paths)} 个 NFO")
+        COMMANDS[args.command](args, paths)
+
+
+if __name__ == "__main__":
+    main()
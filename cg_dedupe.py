@@ -11,6 +11,8 @@ from multiprocessing import cpu_count, freeze_support
 import signal
 from threading import Lock
 from difflib import SequenceMatcher
+from nfo_parser import parse_nfo
+from nfo_scanner import scan_library
 
 
 # 应用常量
@@ -465,10 +467,8 @@ class NfoDuplicateLogic:
             if not os.path.exists(directory):
                 continue
             try:
-                for root, _, files in os.walk(directory):
-                    for file in files:
-                        if file.lower().endswith(".nfo"):
-                            yield os.path.join(root, file)
+                for manifest in scan_library(directory):
+                    yield from manifest.nfos
             except PermissionError:
                 print(f"无权限访问目录: {directory}")
                 continue
@@ -492,15 +492,10 @@ class NfoDuplicateLogic:
         if not os.path.exists(nfo_file):
             return None, nfo_file
 
-        # 读取文件内容
-        content, encoding = NfoFile.safe_read_file(nfo_file)
-        if content is None:
-            return None, nfo_file
-
-        # 解析XML
+        # 解析NFO（统一解析器，自带多编码回退）
         try:
-            tree = ET.fromstring(content)
-            result = self._extract_field_value(tree, field, nfo_file)
+            record = parse_nfo(nfo_file)
+            result = self._extract_field_value(record, field, nfo_file)
             return result, nfo_file
 
         except ET.ParseError as e:
@@ -510,26 +505,24 @@ class NfoDuplicateLogic:
 
         return None, nfo_file
 
-    def _extract_field_value(self, tree, field, nfo_file):
-        """从XML树中提取字段值"""
+    def _extract_field_value(self, record, field, nfo_file):
+        """从NFO记录中提取字段值"""
         if field == self.FIELD_NUM:
-            return self._extract_num_field(tree, nfo_file)
+            return self._extract_num_field(record, nfo_file)
         elif field == self.FIELD_SERIES:
-            return self._extract_series_field(tree)
+            return self._extract_series_field(record)
         return None
 
-    def _extract_num_field(self, tree, nfo_file):
+    def _extract_num_field(self, record, nfo_file):
         """提取番号字段"""
         # 优先级1: <num>标签
-        num_elem = tree.find("num")
-        if num_elem is not None and num_elem.text:
-            return num_elem.text.strip()
+        if record.num:
+            return record.num
 
         # 优先级2: 标题字段
-        for tag_name in ["title", "originaltitle", "sorttitle"]:
-            elem = tree.find(tag_name)
-            if elem is not None and elem.text:
-                code = NfoFile.extract_code(elem.text)
+        for text in (record.title, record.originaltitle, record.sorttitle):
+            if text:
+                code = NfoFile.extract_code(text)
                 if code:
                     return code
 
@@ -538,12 +531,9 @@ class NfoDuplicateLogic:
         code = NfoFile.extract_code(filename)
         return code
 
-    def _extract_series_field(self, tree):
+    def _extract_series_field(self, record):
         """提取系列字段"""
-        series_elem = tree.find("series")
-        if series_elem is not None and series_elem.text:
-            return series_elem.text.strip()
-        return None
+        return record.series or None
 
     def find_duplicates_with_similarity(self, field_value_map, is_exact_match, threshold):
         """根据匹配模式查找重复项，重构减少重复代码"""
@@ -1,7 +1,6 @@
 import os
 import sys
 import subprocess
-import xml.etree.ElementTree as ET
 from functools import lru_cache
 from queue import Queue
 from threading import Thread
@@ -37,6 +36,8 @@ from PyQt5.QtGui import (
 )
 import concurrent.futures
 from enum import Enum
+from nfo_parser import parse_single_nfo
+from nfo_scanner import scan_library
 
 
 class LoadStage(Enum):
@@ -555,23 +556,14 @@ class PhotoWallDialog(QDialog):
             self.progress_bar.setFormat("扫描文件中...")
             self.update_status(0, None, LoadStage.SCANNING)
 
-            for root, dirs, files in os.walk(folder_path):
+            for manifest in scan_library(folder_path):
                 if not self.is_loading:
                     return
 
-                poster_file = None
-                nfo_file = None
-                for file in files:
-                    if (
-                        file.lower().endswith((".jpg", ".jpeg"))
-                        and "poster" in file.lower()
-                    ):
-                        poster_file = os.path.join(root, file)
-                    elif file.lower().endswith(".nfo"):
-                        nfo_file = os.path.join(root, file)
-
-                if poster_file and nfo_file:
-                    poster_nfo_pairs.append((poster_file, nfo_file, root))
+                # 同一目录有多个时取最后一个
+                posters = manifest.posters
+                if posters and manifest.nfos:
+                    poster_nfo_pairs.append((posters[-1], manifest.nfos[-1], manifest.path))
 
             total_items = len(poster_nfo_pairs)
             if total_items == 0:
@@ -1424,51 +1416,22 @@ class PhotoWallDialog(QDialog):
 
     @lru_cache(maxsize=1000)
     def parse_nfo(self, nfo_path):
-        """解析NFO文件（带缓存）"""
-        try:
-            tree = ET.parse(nfo_path)
-            root = tree.getroot()
+        """解析NFO文件（带缓存），失败时返回空字典
 
-            title = root.find("title")
-            title = title.text if title is not None else ""
-
-            year = ""
-            release = root.find("release")
-            if release is not None and release.text:
-                try:
-                    year = release.text.split("-")[0]
-                except:
-                    year = ""
-
-            series = root.find("series")
-            series = series.text if series is not None else ""
-
-            rating = root.find("rating")
-            rating = rating.text if rating is not None else "0"
-
-            actors = []
-            for actor in root.findall("actor"):
-                name = actor.find("name")
-                if name is not None and name.text:
-                    actors.append(name.text.strip())
-
-            tags = []
-            for tag in root.findall("tag"):
-                if tag is not None and tag.text:
-                    tags.append(tag.text.strip())
-
-            return {
-                "title": title,
-                "year": year,
-                "series": series,
-                "rating": rating,
-                "actors": actors,
-                "tags": tags,
-                "release": release.text if release is not None else "",
-            }
-        except Exception as e:
-            print(f"解析NFO文件失败 {nfo_path}: {str(e)}")
+        评分保留原始文本、年份只取自发行日期，与照片墙原有的显示和筛选一致。
+        """
+        record = parse_single_nfo(nfo_path)
+        if record is None:
             return {}
+        return {
+            "title": record.title,
+            "year": record.release.split("-")[0] if record.release else "",
+            "series": record.series,
+            "rating": record.rating_text or "0",
+            "actors": list(record.actors),
+            "tags": list(record.tags),
+            "release": record.release,
+        }
 
     def cancel_loading(self):
         """取消加载"""
@@ -14,6 +14,9 @@ from PyQt5.QtGui import QIcon
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 from dataclasses import dataclass, field
+from nfo_parser import load_nfo_root
+from nfo_atomic import WriteBatch, atomic_open
+from nfo_scanner import scan_library
 
 # 配置常量
 class Config:
@@ -364,8 +367,7 @@ class NFOParser:
     def parse_nfo_file(self, nfo_path: str) -> NFOFields:
         """解析NFO文件并返回字段对象"""
         try:
-            tree = ET.parse(nfo_path)
-            root = tree.getroot()
+            root = load_nfo_root(nfo_path)
             fields = NFOFields()
             
             # 设置文件名
@@ -449,8 +451,8 @@ class NFOModifier:
             'genre': ['poster', 'cover', 'trailer']                               # genre在poster前
         }
     
-    def modify_nfo_file(self, nfo_path: str) -> Tuple[bool, List[str], Dict[str, int], Dict[str, any]]:
-        """修改NFO文件中的演员名称和系列信息"""
+    def modify_nfo_file(self, nfo_path: str, batch: Optional[WriteBatch] = None) -> Tuple[bool, List[str], Dict[str, int], Dict[str, any]]:
+        """修改NFO文件中的演员名称和系列信息；batch 不为空时目录落盘推迟到批次结束"""
         try:
             tree = ET.parse(nfo_path)
             root = tree.getroot()
@@ -491,7 +493,8 @@ class NFOModifier:
                 detailed_logs['structure_changes'] = structure_logs
             
             if modified:
-                tree.write(nfo_path, encoding="utf-8", xml_declaration=True)
+                with atomic_open(nfo_path, "wb", batch=batch) as f:
+                    tree.write(f, encoding="utf-8", xml_declaration=True)
             
             return modified, all_actors, stats, detailed_logs
             
@@ -881,6 +884,9 @@ class RenameWorker(QThread):
         # 初始化日志管理器
         self.log_manager = LogManager()
 
+        # 处理目录期间的批量写入，NFO 修改攒批落盘
+        self.write_batch: Optional[WriteBatch] = None
+
     def run(self):
         try:
             self.log_manager.log_info(f"开始处理目录: {self.directory}")
@@ -911,24 +917,32 @@ class RenameWorker(QThread):
             self.log_manager.log_info(no_folder_msg)
             return
         
-        for i, (folder_path, nfo_path) in enumerate(folders_to_process, 1):
+        with WriteBatch() as batch:
+            self.write_batch = batch
             try:
-                self._process_single_folder(folder_path, nfo_path, i, total_folders)
-            except Exception as e:
-                error_msg = f"处理文件夹 {folder_path} 时出错: {e}"
-                self.log_manager.log_error(error_msg)
+                for i, (folder_path, nfo_path) in enumerate(folders_to_process, 1):
+                    try:
+                        self._process_single_folder(folder_path, nfo_path, i, total_folders)
+                    except Exception as e:
+                        error_msg = f"处理文件夹 {folder_path} 时出错: {e}"
+                        self.log_manager.log_error(error_msg)
+            finally:
+                self.write_batch = None
 
     def _collect_folders_with_nfo(self) -> List[Tuple[str, str]]:
         """收集包含NFO文件的文件夹"""
         folders_with_nfo = []
         
-        for root, dirs, _ in os.walk(self.directory):
-            for folder in dirs:
-                folder_path = os.path.join(root, folder)
-                nfo_path = self._find_nfo_file(folder_path)
-                
-                if nfo_path:
-                    folders_with_nfo.append((folder_path, nfo_path))
+        for manifest in scan_library(self.directory):
+            # 只处理子文件夹，不处理所选目录本身
+            if manifest.path == self.directory:
+                continue
+            nfo_paths = [
+                path for path in manifest.nfos
+                if Path(path).suffix.lower() in Config.SUPPORTED_NFO_EXTENSIONS
+            ]
+            if nfo_paths:
+                folders_with_nfo.append((manifest.path, nfo_paths[0]))
         
         return folders_with_nfo
     
@@ -976,7 +990,7 @@ class RenameWorker(QThread):
     def _modify_nfo_info_optimized(self, nfo_path: str, nfo_name: str) -> Tuple[bool, List[str]]:
         """修改NFO文件信息"""
         try:
-            modified, new_actors, stats, detailed_logs = self.nfo_modifier.modify_nfo_file(nfo_path)
+            modified, new_actors, stats, detailed_logs = self.nfo_modifier.modify_nfo_file(nfo_path, self.write_batch)
             
             # 详细日志：记录所有信息
             if 'structure_changes' in detailed_logs:
@@ -1032,6 +1046,9 @@ class RenameWorker(QThread):
             expected_name = self.folder_renamer.generate_folder_name(nfo_fields)
             
             if folder_name != expected_name:
+                # 改名前先让已替换的 NFO 所在目录落盘，改名后旧路径已不存在
+                if self.write_batch is not None:
+                    self.write_batch.flush()
                 self.folder_renamer.rename_folder(folder_path, expected_name)
                 self.log_manager.log_success(f"文件夹重命名: {folder_name} → {expected_name}")
                 return True
@@ -1044,13 +1061,6 @@ class RenameWorker(QThread):
             self.log_manager.log_error(error_msg)
             return False
     
-    def _find_nfo_file(self, folder_path: str) -> Optional[str]:
-        """在文件夹中查找NFO文件"""
-        for file_path in Path(folder_path).iterdir():
-            if file_path.is_file() and file_path.suffix.lower() in Config.SUPPORTED_NFO_EXTENSIONS:
-                return str(file_path)
-        return None
-
 class RenameToolGUI(QMainWindow):
     def __init__(self, parent=None):
         super().__init__(parent)
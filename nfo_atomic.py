@@ -0,0 +1,157 @@
+import os
+import re
+import shutil
+import time
+import threading
+from contextlib import contextmanager
+
+
+# ================ 原子写入 ================
+#
+# 先写同目录下的临时文件，再用 os.replace 覆盖目标：中途崩溃时目标文件要么是旧内容，
+# 要么是完整的新内容，不会留下截断的 NFO。
+#
+# 单个文件：写完 fsync 临时文件 -> os.replace -> fsync 所在目录（POSIX）。
+# 批量写入（WriteBatch）：每个文件同样 fsync 后立即 replace，目标马上就是新内容；
+# 只把目录 fsync 推迟到批次结束，同一目录只做一次（Windows 无法 fsync 目录，
+# NTFS 的改名本身有日志保护）。
+# 崩溃时残留的隐藏临时文件（.<文件名>.<8位十六进制>.tmp）由扫描器发现后清理，见 remove_stale_temp。
+
+TEMP_SUFFIX = ".tmp"
+# 超过该秒数未完成的临时文件视为崩溃残留（正常写入从创建到替换只有几毫秒）
+STALE_TEMP_SECONDS = 3600
+
+_TEMP_NAME_RE = re.compile(r"^\..+\.[0-9a-f]{8}" + re.escape(TEMP_SUFFIX) + "$")
+
+
+def _temp_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{os.urandom(4).hex()}{TEMP_SUFFIX}")
+
+
+def _create_temp(path):
+    """在目标同目录创建临时文件，返回 (fd, 临时路径)；权限沿用原文件"""
+    while True:
+        temp_path = _temp_path(path)
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        shutil.copymode(path, temp_path)
+    except OSError:
+        pass
+    return fd, temp_path
+
+
+def fsync_directory(directory):
+    """让目录中的改名落盘；Windows 不支持打开目录，直接跳过"""
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+@contextmanager
+def atomic_open(path, mode="w", encoding=None, batch=None):
+    """以原子方式写入 path：with 块内写临时文件，正常结束后替换目标
+
+    mode 为 "w" 或 "wb"；文本模式的换行处理与 open() 相同。
+    batch 为 WriteBatch 时替换后的目录落盘推迟到批次结束，由 batch 统一完成。
+    with 块内出错时删除临时文件，目标保持不变。
+    """
+    # 符号链接替换其指向的文件，而不是把链接本身换成普通文件
+    if os.path.islink(path):
+        path = os.path.realpath(path)
+    fd, temp_path = _create_temp(path)
+    try:
+        with open(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        _remove_quietly(temp_path)
+        raise
+
+    try:
+        os.replace(temp_path, path)
+    except BaseException:
+        _remove_quietly(temp_path)
+        raise
+    if batch is not None:
+        batch.add(path)
+    else:
+        fsync_directory(os.path.dirname(path))
+
+
+def atomic_write(path, data, batch=None):
+    """原子写入 bytes"""
+    with atomic_open(path, "wb", batch=batch) as f:
+        f.write(data)
+
+
+def is_temp_name(name):
+    """文件名是否为 atomic_open 创建的临时文件"""
+    return name.endswith(TEMP_SUFFIX) and _TEMP_NAME_RE.match(name) is not None
+
+
+def remove_stale_temp(path, stat=None):
+    """删除崩溃残留的临时文件（修改时间超过 STALE_TEMP_SECONDS），返回是否已删除"""
+    try:
+        if stat is None:
+            stat = os.stat(path)
+        if time.time() - stat.st_mtime < STALE_TEMP_SECONDS:
+            return False
+        os.remove(path)
+    except OSError:
+        return False
+    return True
+
+
+class WriteBatch:
+    """批量原子写入：文件各自 fsync 并立即替换，目录 fsync 推迟到 flush()（或退出 with 块），每个目录一次
+
+    已替换的目标路径按顺序记录在 replaced 中；替换失败由 atomic_open 直接抛出。
+    可以在多个线程中同时 add()。
+    """
+
+    def __init__(self):
+        self._directories = set()
+        self._lock = threading.Lock()
+        self.replaced = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+    def add(self, path):
+        """记录已替换的目标，其目录在 flush() 时落盘"""
+        with self._lock:
+            self.replaced.append(path)
+            self._directories.add(os.path.dirname(path))
+
+    def flush(self):
+        """每个待落盘目录 fsync 一次（例如改名目录之前）"""
+        with self._lock:
+            directories, self._directories = self._directories, set()
+        for directory in directories:
+            fsync_directory(directory)
@@ -0,0 +1,113 @@
+import sys
+
+from nfo_parser import LIST_FIELDS, NFORecord
+
+
+# ================ NFO 内存缓存 ================
+
+# 缓存中不常驻的大字段：写入缓存时置为 None。
+# 编辑区显示的简介来自完整记录（选中文件时预读线程解析，或保存、批量编辑后新生成），从不读缓存
+LAZY_FIELDS = ("plot",)
+
+# 取值高度重复的字段（演员、标签、片商等），写入缓存时驻留为同一个字符串对象
+INTERNED_FIELDS = (
+    "series",
+    "set",
+    "studio",
+    "maker",
+    "publisher",
+    "label",
+    "director",
+    "year",
+    "runtime",
+    "mosaic",
+    "definition",
+    "resolution",
+)
+
+
+class NFOCache:
+    """NFO文件缓存管理器
+
+    dict 保持插入顺序，get/set/remove 均为 O(1)。记录为 NFORecord（__slots__），
+    LAZY_FIELDS 中的大字段不常驻内存，缓存记录中恒为 None。
+    """
+
+    def __init__(self):
+        self.cache = {}
+
+    def get(self, path):
+        return self.cache.get(path)
+
+    def set(self, path, data):
+        self.cache[path] = self._compact(data)
+
+    def remove(self, path):
+        self.cache.pop(path, None)
+
+    def clear(self):
+        self.cache.clear()
+
+    def get_all_paths(self):
+        return list(self.cache)
+
+    def size(self):
+        return len(self.cache)
+
+    def __contains__(self, path):
+        return path in self.cache
+
+    def __len__(self):
+        return len(self.cache)
+
+    @staticmethod
+    def _compact(record):
+        """返回压缩后的副本；传入的记录可能仍被其他线程使用（如加载线程写入索引），不能原地修改"""
+        record = NFORecord.from_tuple(record.to_tuple())
+        intern = sys.intern
+        for name in LAZY_FIELDS:
+            setattr(record, name, None)
+        for name in INTERNED_FIELDS:
+            value = getattr(record, name)
+            if value:
+                setattr(record, name, intern(value))
+        for name in LIST_FIELDS:
+            values = getattr(record, name)
+            if values:
+                setattr(record, name, tuple(map(intern, values)))
+        return record
+
+    def memory_usage(self, sample=1000):
+        """估算缓存占用，返回 (总字节数, 每条字节数)
+
+        按前 sample 条记录统计（记录对象 + 各字段对象，驻留字符串只计一次），
+        再按条数外推；路径字符串和 dict 本身的开销也计算在内。
+        """
+        count = len(self.cache)
+        if count == 0:
+            return 0, 0
+
+        seen = set()
+
+        def sizeof(obj):
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            return sys.getsizeof(obj)
+
+        sampled = 0
+        total = 0
+        for path, record in self.cache.items():
+            if sampled >= sample:
+                break
+            sampled += 1
+            total += sizeof(path) + sizeof(record)
+            for name in record.__slots__:
+                value = getattr(record, name)
+                total += sizeof(value)
+                if isinstance(value, tuple):
+                    for item in value:
+                        total += sizeof(item)
+
+        per_entry = total / sampled + sys.getsizeof(self.cache) / count
+        return int(per_entry * count), int(per_entry)
@@ -0,0 +1,160 @@
+import re
+
+import numpy as np
+
+
+# ================ 数值列存储 ================
+#
+# 评分、发行日期、时长按列保存在连续的 NumPy 数组中，下标与文件列表模型的
+# _paths 下标一一对应。排序用 argsort，数值范围筛选用布尔掩码，
+# 不再在每次点击时逐条构造元组、调用 float()。
+
+_DATE_RE = re.compile(r"(\d{4})(?:\D(\d{1,2}))?(?:\D(\d{1,2}))?")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def release_key(text):
+    """发行日期 -> 可比较的整数 YYYYMMDD，缺月/日记为 0，无法识别返回 0
+
+    与按字符串比较 YYYY-MM-DD 的顺序一致，且支持 2023-01 这样的前缀比较。
+    """
+    if not text:
+        return 0
+    match = _DATE_RE.match(text.strip())
+    if not match:
+        return 0
+    year, month, day = match.groups()
+    return int(year) * 10000 + int(month or 0) * 100 + int(day or 0)
+
+
+def runtime_minutes(text):
+    """时长文本（如 "120"、"120分钟"）-> 分钟数，无法识别返回 0"""
+    if not text:
+        return 0
+    match = _NUMBER_RE.search(text)
+    return int(match.group()) if match else 0
+
+
+class RecordColumns:
+    """与记录列表平行的数值列
+
+    rating：float64，缺失为 NaN；release：int32 的 YYYYMMDD，缺失为 0；
+    runtime：int32 分钟数，缺失为 0。数组按倍增预留容量，追加为均摊 O(1)。
+    """
+
+    def __init__(self):
+        self._size = 0
+        self._rating = np.empty(0, dtype=np.float64)
+        self._release = np.empty(0, dtype=np.int32)
+        self._runtime = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def rating(self):
+        return self._rating[: self._size]
+
+    @property
+    def release(self):
+        return self._release[: self._size]
+
+    @property
+    def runtime(self):
+        return self._runtime[: self._size]
+
+    def clear(self):
+        self._size = 0
+
+    def _reserve(self, size):
+        capacity = len(self._rating)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 1024)
+        for name in ("_rating", "_release", "_runtime"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[: self._size] = old[: self._size]
+            setattr(self, name, new)
+
+    def append(self, records):
+        """追加一批记录（None 视为全部缺失）"""
+        start = self._size
+        end = start + len(records)
+        self._reserve(end)
+        self._rating[start:end] = [
+            record.rating if record is not None and record.rating is not None else np.nan
+            for record in records
+        ]
+        self._release[start:end] = [
+            release_key(record.release) if record is not None else 0 for record in records
+        ]
+        self._runtime[start:end] = [
+            runtime_minutes(record.runtime) if record is not None else 0 for record in records
+        ]
+        self._size = end
+
+    def update(self, index, record):
+        if not 0 <= index < self._size:
+            return
+        if record is None:
+            self._rating[index] = np.nan
+            self._release[index] = 0
+            self._runtime[index] = 0
+            return
+        self._rating[index] = record.rating if record.rating is not None else np.nan
+        self._release[index] = release_key(record.release)
+        self._runtime[index] = runtime_minutes(record.runtime)
+
+    def keep(self, mask):
+        """按布尔掩码压缩（删除记录后与 _paths 同步）"""
+        mask = np.asarray(mask, dtype=bool)
+        count = int(mask.sum())
+        for name in ("_rating", "_release", "_runtime"):
+            column = getattr(self, name)
+            column[:count] = column[: self._size][mask]
+        self._size = count
+
+    # ---------- 排序与筛选 ----------
+
+    def rating_or_zero(self, rows=None):
+        """评分列，缺失记为 0（与旧的筛选/排序语义一致）"""
+        values = self.rating if rows is None else self.rating[rows]
+        return np.nan_to_num(values, nan=0.0)
+
+    def argsort_desc(self, name, rows):
+        """rows（记录下标数组）按某列降序排列后的下标，相同值保持原有顺序"""
+        if name == "rating":
+            keys = self.rating_or_zero(rows)
+        else:
+            keys = getattr(self, name)[rows].astype(np.int64)
+        return rows[np.argsort(-keys, kind="stable")]
+
+    def range_mask(self, name, low=None, high=None, low_inclusive=False, high_inclusive=False):
+        """整列的数值范围掩码；评分缺失按 0 处理"""
+        values = self.rating_or_zero() if name == "rating" else getattr(self, name)
+        mask = np.ones(self._size, dtype=bool)
+        if low is not None:
+            mask &= values >= low if low_inclusive else values > low
+        if high is not None:
+            mask &= values <= high if high_inclusive else values < high
+        return mask
+
+
+def argsort_strings(keys, rows):
+    """按字符串键升序排列 rows，相同值保持原有顺序"""
+    if len(rows) == 0:
+        return rows
+    _, codes = np.unique(np.asarray(keys, dtype=object), return_inverse=True)
+    return rows[np.argsort(codes, kind="stable")]
+
+
+def argsort_groups(keys, rows):
+    """按分组大小降序、组名升序排列 rows，空值排在最后（系列排序）"""
+    if len(rows) == 0:
+        return rows
+    names, codes, counts = np.unique(
+        np.asarray(keys, dtype=object), return_inverse=True, return_counts=True
+    )
+    empty = (names == "")[codes]
+    return rows[np.lexsort((codes, -counts[codes], empty))]
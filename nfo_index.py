@@ -0,0 +1,188 @@
+import json
+import os
+import sqlite3
+
+from nfo_parser import NFORecord
+
+
+# ================ 持久化 NFO 索引 ================
+#
+# 以 (mtime_ns, size) 判定文件是否变化：未变化的 NFO 直接从索引还原记录，
+# 只有新增/修改的文件才重新解析；解析失败的文件同样记录，避免每次扫描重试。
+# dirs 表保存 nfo_scanner 的目录清单，目录 mtime 未变化时无需重新读取目录。
+
+# 表结构或记录结构（NFORecord.__slots__）变化时递增，旧索引会被整体丢弃重建
+SCHEMA_VERSION = 2
+
+INDEX_FILENAME = "library.db"
+
+
+def default_index_dir():
+    """索引所在的应用数据目录"""
+    base = os.environ.get("LOCALAPPDATA")
+    if not base:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "NFOEditor")
+
+
+def path_key(path):
+    """索引主键：绝对路径，Windows 下统一大小写和分隔符"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _prefix_range(folder):
+    """folder 下所有路径键的 [low, high) 区间，可走主键索引"""
+    prefix = path_key(folder).rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+class IndexEntry:
+    """索引中的一条记录；data 为 None 表示上次解析失败"""
+
+    __slots__ = ("mtime_ns", "size", "data")
+
+    def __init__(self, mtime_ns, size, data):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.data = data
+
+    def matches(self, stat):
+        return self.mtime_ns == stat.st_mtime_ns and self.size == stat.st_size
+
+    @property
+    def failed(self):
+        return self.data is None
+
+    def record(self, path):
+        """还原 NFORecord，path 使用调用方当前的路径写法"""
+        record = NFORecord.from_tuple(json.loads(self.data))
+        record.path = path
+        return record
+
+
+class NFOIndex:
+    """SQLite 持久化索引，键为绝对路径，值为 (mtime_ns, size, 记录)
+
+    sqlite3 连接只能在创建它的线程中使用，应在加载线程内创建和关闭。
+    """
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.join(default_index_dir(), INDEX_FILENAME)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        with self.conn:
+            if version != SCHEMA_VERSION:
+                self.conn.execute("DROP TABLE IF EXISTS nfo")
+                self.conn.execute("DROP TABLE IF EXISTS dirs")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS nfo ("
+                " path TEXT PRIMARY KEY,"
+                " mtime_ns INTEGER NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " data TEXT"
+                ")"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS dirs ("
+                " path TEXT PRIMARY KEY,"
+                " mtime_ns INTEGER NOT NULL,"
+                " listing TEXT NOT NULL"
+                ")"
+            )
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def load_folder(self, folder):
+        """读取 folder 下的全部索引记录，返回 {路径键: IndexEntry}"""
+        low, high = _prefix_range(folder)
+        rows = self.conn.execute(
+            "SELECT path, mtime_ns, size, data FROM nfo WHERE path >= ? AND path < ?",
+            (low, high),
+        )
+        return {path: IndexEntry(mtime_ns, size, data) for path, mtime_ns, size, data in rows}
+
+    def lookup(self, paths):
+        """只读取给定路径的索引记录，返回 {路径键: IndexEntry}（增量更新用）"""
+        keys = [path_key(path) for path in paths]
+        result = {}
+        # 分批绑定参数，旧版 SQLite 单条语句最多 999 个参数
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT path, mtime_ns, size, data FROM nfo WHERE path IN ({placeholders})",
+                chunk,
+            )
+            for path, mtime_ns, size, data in rows:
+                result[path] = IndexEntry(mtime_ns, size, data)
+        return result
+
+    def store(self, entries):
+        """写入 [(路径, stat, NFORecord 或 None)]，None 记为解析失败"""
+        rows = []
+        for path, stat, record in entries:
+            data = None
+            if record is not None:
+                data = json.dumps(record.to_tuple(), ensure_ascii=False)
+            rows.append((path_key(path), stat.st_mtime_ns, stat.st_size, data))
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO nfo (path, mtime_ns, size, data) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def remove_keys(self, keys):
+        """按路径键删除（已从磁盘消失的文件）"""
+        keys = [(key,) for key in keys]
+        if not keys:
+            return
+        with self.conn:
+            self.conn.executemany("DELETE FROM nfo WHERE path = ?", keys)
+
+    # ---------- 目录清单 ----------
+
+    def load_dirs(self, folder):
+        """读取 folder 自身及其下全部目录清单，返回 {路径键: (mtime_ns, 清单JSON)}"""
+        low, high = _prefix_range(folder)
+        rows = self.conn.execute(
+            "SELECT path, mtime_ns, listing FROM dirs WHERE path = ? OR (path >= ? AND path < ?)",
+            (path_key(folder), low, high),
+        )
+        return {path: (mtime_ns, listing) for path, mtime_ns, listing in rows}
+
+    def store_dirs(self, rows):
+        """写入 [(路径键, mtime_ns, 清单JSON)]"""
+        if not rows:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO dirs (path, mtime_ns, listing) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def remove_dirs(self, keys):
+        keys = [(key,) for key in keys]
+        if not keys:
+            return
+        with self.conn:
+            self.conn.executemany("DELETE FROM dirs WHERE path = ?", keys)
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM nfo")
+            self.conn.execute("DELETE FROM dirs")
+
+    def close(self):
+        try:
+            self.conn.close()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,404 @@
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from nfo_atomic import WriteBatch, atomic_write
+from nfo_journal import APPLIED, UNDONE, JournalConflict, content_hash
+from nfo_parser import record_from_root
+from nfo_patch import UNCHANGED, NFODocument, set_actor_names, set_text
+from nfo_search import normalize
+
+
+# ================ 后台批量编辑 ================
+#
+# 批量填充、批量新增标签等操作交给 BatchEditJob 线程执行，GUI 保持响应：
+#   每个文件 读取 -> 修改元素树 -> 原子写入 由有界线程池并发完成（在途文件数有上限，
+#   选中上万个文件也不会一次性提交），写完即替换，目录由 WriteBatch 在结束时统一落盘；
+#   进度和逐文件日志按时间节流后发给 GUI；取消后已开始的文件照常完成并提交，其余跳过；
+#   修改后的记录直接由内存中的元素树生成，结束时整批交给 GUI 更新缓存，不再重新解析写好的文件。
+#
+# 编辑函数 edit(root) 在工作线程中调用，只能修改传入的元素树：返回成功日志，
+# 抛出 SkipEdit 表示无需修改（不写文件），抛出其他异常记为失败。
+# 传入 nfo_journal.JournalRecorder 时，写回的文件在全部提交后作为一个批次记入撤销记录；
+# JournalReplayJob 在同样的流程中整批撤销/重做其中的一个批次。
+
+# 文件读写线程数（NAS 上并发请求能掩盖网络延迟；解析本身受 GIL 限制，再多没有意义）
+EDIT_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+# 进度和日志的发送间隔（秒）
+PROGRESS_INTERVAL = 0.1
+
+
+class SkipEdit(Exception):
+    """文件无需修改，异常信息作为日志"""
+
+
+class BatchEditJob(QThread):
+    """对 paths 逐个执行 edit 并原子写回"""
+
+    # (已完成数, 总数)
+    progress = pyqtSignal(int, int)
+    # 新增的日志行 [str]
+    log = pyqtSignal(list)
+    # ({nfo_path: NFORecord}（已写回的文件）, 是否被取消)
+    done = pyqtSignal(object, bool)
+
+    def __init__(
+        self, paths, edit, failure_text, minimal=True, recorder=None, workers=EDIT_WORKERS, parent=None
+    ):
+        super().__init__(parent)
+        self.paths = list(paths)
+        self.edit = edit
+        self.failure_text = failure_text
+        self.minimal = minimal
+        self.recorder = recorder
+        self.workers = max(1, workers)
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def _edit_file(self, nfo_path, batch):
+        """返回 (日志, NFORecord 或 None)；只有写了文件才返回记录"""
+        try:
+            return self._edit_document(NFODocument.load(nfo_path), batch)
+        except SkipEdit as e:
+            return str(e), None
+        except Exception as e:
+            return f"{self.failure_text} - {str(e)}", None
+
+    def _edit_document(self, document, batch):
+        message = self.edit(document.root)
+        if document.save(minimal=self.minimal, batch=batch) == UNCHANGED:
+            return message, None
+        if self.recorder is not None:
+            self.recorder.add(document)
+        return message, record_from_root(document.root, document.path)
+
+    def _committed(self, records, cancelled):
+        """全部文件提交之后（仍在本线程中）"""
+        if self.recorder is not None:
+            self.recorder.commit()
+
+    def run(self):
+        total = len(self.paths)
+        finished = 0
+        records = {}
+        lines = []
+        last_emit = time.monotonic()
+
+        with WriteBatch() as batch:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                remaining = iter(self.paths)
+                in_flight = {}
+                while True:
+                    while len(in_flight) < self.workers * 2 and not self._cancel.is_set():
+                        nfo_path = next(remaining, None)
+                        if nfo_path is None:
+                            break
+                        in_flight[pool.submit(self._edit_file, nfo_path, batch)] = nfo_path
+                    if not in_flight:
+                        break
+                    completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        nfo_path = in_flight.pop(future)
+                        message, record = future.result()
+                        lines.append(f"{nfo_path}: {message}")
+                        if record is not None:
+                            records[nfo_path] = record
+                        finished += 1
+                    now = time.monotonic()
+                    if now - last_emit >= PROGRESS_INTERVAL:
+                        last_emit = now
+                        self.log.emit(lines)
+                        lines = []
+                        self.progress.emit(finished, total)
+
+        cancelled = self._cancel.is_set() and finished < total
+        if cancelled:
+            lines.append(f"已取消，{total - finished} 个文件未处理")
+        self._committed(records, cancelled)
+        self.log.emit(lines)
+        self.progress.emit(finished, total)
+        self.done.emit(records, cancelled)
+
+
+class JournalReplayJob(BatchEditJob):
+    """整批撤销（undo=True）或重做撤销记录中的一个批次"""
+
+    def __init__(self, journal, batch_id, undo, minimal=True, workers=EDIT_WORKERS, parent=None):
+        self.journal = journal
+        self.batch_id = batch_id
+        self.undo = undo
+        self.entries = {entry.path: entry for entry in journal.entries(batch_id)}
+        failure_text = "撤销失败" if undo else "重做失败"
+        super().__init__(list(self.entries), None, failure_text, minimal, workers=workers, parent=parent)
+        self._mtimes = {}  # 原样还原的文件 -> 原来的 mtime_ns
+        self._lock = threading.Lock()
+
+    def _edit_document(self, document, batch):
+        entry = self.entries[document.path]
+        # 文件仍是写回时的内容：直接写回原始字节，提交后恢复原来的 mtime
+        if self.undo and entry.original is not None and content_hash(document.root) == entry.after_hash:
+            data = entry.original_bytes()
+            record = record_from_root(ET.fromstring(data), document.path)
+            atomic_write(document.path, data, batch)
+            if entry.mtime_ns is not None:
+                with self._lock:
+                    self._mtimes[document.path] = entry.mtime_ns
+            return "已还原为原始文件", record
+
+        try:
+            changed = entry.apply(document.root, self.undo)
+        except JournalConflict as e:
+            raise SkipEdit(f"之后又被修改过（{str(e)}），跳过") from None
+        if not changed:
+            raise SkipEdit("已是目标状态，跳过")
+        document.save(minimal=self.minimal, batch=batch)
+        return ("已撤销" if self.undo else "已重做"), record_from_root(document.root, document.path)
+
+    def _committed(self, records, cancelled):
+        for nfo_path, mtime_ns in self._mtimes.items():
+            if nfo_path not in records:
+                continue
+            try:
+                os.utime(nfo_path, ns=(time.time_ns(), mtime_ns))
+            except OSError as e:
+                print(f"恢复修改时间失败 {nfo_path}: {str(e)}")
+        # 中途取消时保持原状态，可以再次执行（已处理的文件会被跳过）
+        if not cancelled:
+            try:
+                self.journal.set_state(self.batch_id, UNDONE if self.undo else APPLIED)
+            except Exception as e:
+                print(f"更新撤销记录失败: {str(e)}")
+
+
+# ================ 延迟写回（保存队列） ================
+#
+# 编辑区的保存交给 SaveQueue 线程：GUI 只提交编辑函数，读取、修改、写回和撤销记录都在线程中完成。
+# 同一文件在 SAVE_DELAY 内再次保存时只替换待写的编辑函数（编辑区的取值是完整状态，最后一次为准），
+# 到期后只写一次。移动、删除、批量修改和退出之前调用 flush() 等待队列写完。
+
+# 保存提交后等待合并的时间（秒）
+SAVE_DELAY = 0.5
+
+
+class SaveQueue(QThread):
+    """后台保存队列：按文件合并短时间内的重复保存，逐个写回"""
+
+    # (nfo_path, NFORecord, (mtime_ns, size) 或 None, 是否写了文件)
+    saved = pyqtSignal(str, object, object, bool)
+    # (nfo_path, 错误信息)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, delay=SAVE_DELAY, parent=None):
+        super().__init__(parent)
+        self.delay = delay
+        self._condition = threading.Condition()
+        self._pending = {}  # nfo_path -> [到期时间, edit, minimal, recorder]
+        self._active = None  # 正在写回的文件
+        self.is_running = True
+
+    def submit(self, nfo_path, edit, minimal=True, recorder=None):
+        """提交保存；同一文件尚未写回时替换编辑函数，到期时间不变"""
+        with self._condition:
+            pending = self._pending.get(nfo_path)
+            if pending is not None:
+                pending[1:] = [edit, minimal, recorder]
+            else:
+                self._pending[nfo_path] = [time.monotonic() + self.delay, edit, minimal, recorder]
+            self._condition.notify()
+
+    def flush(self, paths=None):
+        """立即写回 paths（默认全部）的待保存文件并等待完成"""
+        with self._condition:
+            targets = set(self._pending if paths is None else paths)
+            for nfo_path in targets & self._pending.keys():
+                self._pending[nfo_path][0] = 0
+            self._condition.notify_all()
+            while self.isRunning() and (targets & self._pending.keys() or self._active in targets):
+                self._condition.wait()
+
+    def stop(self):
+        """写完全部待保存文件后退出"""
+        with self._condition:
+            self.is_running = False
+            self._condition.notify_all()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._pending:
+                        if not self.is_running:
+                            return
+                        self._condition.wait()
+                        continue
+                    nfo_path = min(self._pending, key=lambda path: self._pending[path][0])
+                    remaining = self._pending[nfo_path][0] - time.monotonic()
+                    # 退出时不再等待合并
+                    if remaining <= 0 or not self.is_running:
+                        break
+                    self._condition.wait(remaining)
+                _, edit, minimal, recorder = self._pending.pop(nfo_path)
+                self._active = nfo_path
+            try:
+                self._save(nfo_path, edit, minimal, recorder)
+            finally:
+                with self._condition:
+                    self._active = None
+                    self._condition.notify_all()
+
+    def _save(self, nfo_path, edit, minimal, recorder):
+        try:
+            document = NFODocument.load(nfo_path)
+            edit(document.root)
+            changed = document.save(minimal=minimal) != UNCHANGED
+            if changed and recorder is not None:
+                recorder.add(document)
+                recorder.commit()
+            record = record_from_root(document.root, nfo_path)
+        except Exception as e:
+            self.failed.emit(nfo_path, str(e))
+            return
+        try:
+            stat = os.stat(nfo_path)
+            stat = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stat = None
+        self.saved.emit(nfo_path, record, stat, changed)
+
+
+def apply_editor_fields(values, root):
+    """把编辑区的取值写入元素树：values 为 {字段: 文本}，actors/tags 为列表
+
+    rating 同时写 criticrating；tag 和 genre 整体替换为相同的列表。
+    """
+    for field in ("title", "plot", "series", "rating"):
+        set_text(root, field, values[field])
+
+    try:
+        set_text(root, "criticrating", str(int(float(values["rating"]) * 10)))
+    except ValueError:
+        pass
+
+    set_actor_names(root, values["actors"])
+
+    for tag_elem in root.findall("tag"):
+        root.remove(tag_elem)
+    for genre_elem in root.findall("genre"):
+        root.remove(genre_elem)
+
+    for tag in values["tags"]:
+        tag_elem = ET.SubElement(root, "tag")
+        tag_elem.text = tag
+        genre_elem = ET.SubElement(root, "genre")
+        genre_elem.text = tag
+
+
+# ================ 批量编辑操作 ================
+
+
+def fill_field(field, value, root):
+    """批量填充：actor 按逗号分隔替换全部演员，rating 同时写 criticrating，其余字段直接替换文本"""
+    if field == "actor":
+        set_actor_names(root, [name.strip() for name in value.split(",") if name.strip()])
+        return "actor字段填充成功"
+
+    if field == "rating":
+        rating_elem = root.find("rating")
+        if rating_elem is None:
+            rating_elem = ET.SubElement(root, "rating")
+        rating_elem.text = value
+        try:
+            critic_rating = int(float(value) * 10)
+        except ValueError:
+            return "rating填充成功，但criticrating转换失败"
+        critic_elem = root.find("criticrating")
+        if critic_elem is None:
+            critic_elem = ET.SubElement(root, "criticrating")
+        critic_elem.text = str(critic_rating)
+        return f"rating填充成功 (rating: {value}, criticrating: {critic_rating})"
+
+    elem = root.find(field)
+    if elem is None:
+        elem = ET.SubElement(root, field)
+    elem.text = value
+    return f"{field}字段填充成功"
+
+
+def add_tags(value, root):
+    """批量新增标签：逗号分隔的新标签追加到已有标签之后，tag 和 genre 写入相同的列表"""
+    existing_tags = []
+    for tag in root.findall("tag"):
+        if tag is not None and tag.text:
+            tag_text = tag.text.strip()
+            if "," in tag_text:
+                for sub_tag in tag_text.split(","):
+                    sub_tag = sub_tag.strip()
+                    if sub_tag:
+                        existing_tags.append(sub_tag)
+            else:
+                existing_tags.append(tag_text)
+
+    new_tags = []
+    for tag in value.split(","):
+        tag = tag.strip()
+        if tag and tag not in existing_tags:
+            new_tags.append(tag)
+
+    if not new_tags:
+        raise SkipEdit("所有标签已存在，跳过")
+
+    all_tags = existing_tags + new_tags
+
+    for tag_elem in root.findall("tag"):
+        root.remove(tag_elem)
+    for genre_elem in root.findall("genre"):
+        root.remove(genre_elem)
+
+    for tag in all_tags:
+        tag_elem = ET.SubElement(root, "tag")
+        tag_elem.text = tag
+
+    for tag in all_tags:
+        genre_elem = ET.SubElement(root, "genre")
+        genre_elem.text = tag
+
+    return f"成功新增{len(new_tags)}个标签"
+
+
+def replace_tags(sources, target, tags, root):
+    """标签整理：tags（"tag"、"genre"）中取值属于 sources（规范化取值）的元素改为 target
+
+    target 为 None 时删除这些元素；改名后与已有取值重复的元素直接删除（即合并），
+    其余元素的位置和顺序不变。
+    """
+    renamed = removed = 0
+    target_key = normalize(target) if target is not None else None
+    for tag in tags:
+        elems = root.findall(tag)
+        present = {normalize(elem.text) for elem in elems if normalize(elem.text) not in sources}
+        for elem in elems:
+            if normalize(elem.text) not in sources:
+                continue
+            if target is None or target_key in present:
+                root.remove(elem)
+                removed += 1
+                continue
+            present.add(target_key)
+            if elem.text != target:
+                elem.text = target
+                renamed += 1
+
+    if not renamed and not removed:
+        raise SkipEdit("不含要修改的标签，跳过")
+    if target is None:
+        return f"删除{removed}个标签"
+    return f"修改{renamed}个标签，合并{removed}个重复标签"
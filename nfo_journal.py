@@ -0,0 +1,373 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+import zlib
+
+from nfo_index import default_index_dir
+from nfo_patch import _signature
+
+
+# ================ 撤销记录 ================
+#
+# 每写回一个 NFO 记一条紧凑的记录：发生变化的顶层字段（按标签分组的修改前/后 XML 片段和位置）、
+# 修改前文件的 (mtime_ns, size)，可选保存 zlib 压缩的原始字节。一次操作（一次保存、一次批量
+# 填充/新增）的记录归为一个批次，整批撤销或重做。
+#
+# 撤销按字段还原：文件中这些字段仍是修改后的值才还原，之后又被改过的文件跳过，其他字段的
+# 修改不受影响。保存了原始字节且文件内容与写回时一致时，直接写回原始字节并恢复原来的 mtime，
+# 格式也完全还原。重做同理，字段仍是修改前的值时才写入修改后的值。
+#
+# 记录保存在应用数据目录的 SQLite 数据库中，总大小超过上限时从最旧的批次开始删除。
+# sqlite3 连接不能跨线程使用，每次操作单独打开连接。
+
+JOURNAL_FILENAME = "journal.db"
+JOURNAL_MAX_BYTES = 64 * 1024 * 1024
+
+# 表结构变化时递增，旧记录整体丢弃
+SCHEMA_VERSION = 1
+
+# 批次状态
+APPLIED = "applied"
+UNDONE = "undone"
+
+
+class JournalConflict(Exception):
+    """文件的字段已不是撤销/重做前应有的值"""
+
+
+def _fragment(elem):
+    """元素的 XML 片段（不含尾随文本）"""
+    tail, elem.tail = elem.tail, None
+    try:
+        return ET.tostring(elem, encoding="unicode")
+    finally:
+        elem.tail = tail
+
+
+def _groups(root, signatures=None):
+    """{标签: (第一个元素的位置, [元素], [签名])}；signatures 为已算好的 {标签: [签名]}"""
+    groups = {}
+    for position, child in enumerate(root):
+        group = groups.get(child.tag)
+        if group is None:
+            groups[child.tag] = (position, [child], [])
+        else:
+            group[1].append(child)
+    for tag, (_, elements, sigs) in groups.items():
+        if signatures is not None:
+            sigs.extend(signatures[tag])
+        else:
+            sigs.extend(_signature(elem) for elem in elements)
+    return groups
+
+
+def _hash_groups(groups):
+    digest = hashlib.sha1()
+    for tag in sorted(groups):
+        digest.update(repr((tag, groups[tag][2])).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def content_hash(root):
+    """元素树内容摘要，判断文件是否仍是写回时的内容
+
+    与最小改动写回的核对方式一致：忽略格式化空白，按标签分组比较（不同标签之间的先后顺序不计）。
+    """
+    return _hash_groups(_groups(root))
+
+
+def diff_fields(before_groups, after_groups):
+    """比较两棵元素树的顶层字段（_groups 的结果），返回
+    {标签: [修改前位置, [修改前片段], 修改后位置, [修改后片段]]}"""
+    fields = {}
+    for tag in list(before_groups) + [tag for tag in after_groups if tag not in before_groups]:
+        old_position, old, old_sigs = before_groups.get(tag, (None, [], []))
+        new_position, new, new_sigs = after_groups.get(tag, (None, [], []))
+        if old_sigs == new_sigs:
+            continue
+        fields[tag] = [
+            old_position,
+            [_fragment(elem) for elem in old],
+            new_position,
+            [_fragment(elem) for elem in new],
+        ]
+    return fields
+
+
+def _replace_group(root, tag, position, elements):
+    """用 elements 替换 root 中全部 tag 元素；原来没有该标签时插入到 position"""
+    children = list(root)
+    at = None
+    for index, child in enumerate(children):
+        if child.tag == tag:
+            if at is None:
+                at = index
+            root.remove(child)
+    if at is None:
+        at = len(root) if position is None else min(position, len(root))
+    for offset, elem in enumerate(elements):
+        root.insert(at + offset, elem)
+
+
+class JournalEntry:
+    """单个文件的一条撤销记录"""
+
+    __slots__ = ("path", "mtime_ns", "size", "after_hash", "fields", "original")
+
+    def __init__(self, path, mtime_ns, size, after_hash, fields, original=None):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.after_hash = after_hash
+        self.fields = fields
+        self.original = original  # zlib 压缩的原始字节，未保存为 None
+
+    @classmethod
+    def from_document(cls, document, keep_original=True):
+        """由写回后的 NFODocument 生成记录；没有字段变化返回 None"""
+        # document.root 中的元素可能已被原地修改，修改前的片段取自重新解析的原始字节
+        before = ET.fromstring(document.original)
+        before_signatures = {}
+        for child, signature in zip(before, document.original_signatures):
+            before_signatures.setdefault(child.tag, []).append(signature)
+        after_groups = _groups(document.root, document.saved_signatures())
+        fields = diff_fields(_groups(before, before_signatures), after_groups)
+        if not fields:
+            return None
+        stat = document.stat
+        return cls(
+            document.path,
+            stat.st_mtime_ns if stat is not None else None,
+            stat.st_size if stat is not None else None,
+            _hash_groups(after_groups),
+            fields,
+            zlib.compress(document.original) if keep_original else None,
+        )
+
+    def original_bytes(self):
+        return zlib.decompress(self.original) if self.original is not None else None
+
+    def apply(self, root, undo):
+        """把 root 的变化字段改为修改前（undo）或修改后的值；已经是目标值返回 False
+
+        字段既不是目标值也不是应有的起始值时抛出 JournalConflict。
+        """
+        source, target = (2, 0) if undo else (0, 2)
+        groups = _groups(root)
+        done = True
+        for tag, state in self.fields.items():
+            current = groups[tag][2] if tag in groups else []
+            if current == [_signature(ET.fromstring(text)) for text in state[target + 1]]:
+                continue
+            done = False
+            if current != [_signature(ET.fromstring(text)) for text in state[source + 1]]:
+                raise JournalConflict(f"{tag} 已被修改")
+        if done:
+            return False
+        for tag, state in self.fields.items():
+            _replace_group(root, tag, state[target], [ET.fromstring(text) for text in state[target + 1]])
+        return True
+
+    def _packed_fields(self):
+        return zlib.compress(json.dumps(self.fields, ensure_ascii=False).encode("utf-8"))
+
+
+class JournalBatch:
+    """批次概要"""
+
+    __slots__ = ("id", "label", "created", "state", "files", "bytes")
+
+    def __init__(self, id, label, created, state, files, bytes):
+        self.id = id
+        self.label = label
+        self.created = created
+        self.state = state
+        self.files = files
+        self.bytes = bytes
+
+
+class Journal:
+    """撤销记录数据库"""
+
+    def __init__(self, db_path=None, max_bytes=JOURNAL_MAX_BYTES):
+        if db_path is None:
+            db_path = os.path.join(default_index_dir(), JOURNAL_FILENAME)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        conn = self._connect()
+        try:
+            self._ensure_schema(conn)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _ensure_schema(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with conn:
+                conn.execute("DROP TABLE IF EXISTS entries")
+                conn.execute("DROP TABLE IF EXISTS batches")
+            # 删除批次后释放文件空间（需在建表前设置）
+            conn.execute("PRAGMA auto_vacuum=FULL")
+            conn.execute("VACUUM")
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS batches ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " label TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " state TEXT NOT NULL,"
+                " files INTEGER NOT NULL,"
+                " bytes INTEGER NOT NULL"
+                ")"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " batch_id INTEGER NOT NULL,"
+                " path TEXT NOT NULL,"
+                " mtime_ns INTEGER,"
+                " size INTEGER,"
+                " after_hash TEXT NOT NULL,"
+                " fields BLOB NOT NULL,"
+                " original BLOB"
+                ")"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_batch ON entries (batch_id)")
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def add_batch(self, label, entries):
+        """写入一个批次，超出容量时删除最旧的批次；返回批次 id，没有记录返回 None"""
+        if not entries:
+            return None
+        rows = []
+        total = 0
+        for entry in entries:
+            packed = entry._packed_fields()
+            rows.append((entry.path, entry.mtime_ns, entry.size, entry.after_hash, packed, entry.original))
+            total += len(entry.path.encode("utf-8")) + len(packed) + len(entry.original or b"")
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO batches (label, created, state, files, bytes) VALUES (?, ?, ?, ?, ?)",
+                    (label, time.time(), APPLIED, len(rows), total),
+                )
+                batch_id = cursor.lastrowid
+                conn.executemany(
+                    "INSERT INTO entries (batch_id, path, mtime_ns, size, after_hash, fields, original)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(batch_id,) + row for row in rows],
+                )
+                self._evict(conn, keep=batch_id)
+            return batch_id
+        finally:
+            conn.close()
+
+    def _evict(self, conn, keep=None):
+        """总大小超过 max_bytes 时从最旧的批次开始删除（keep 指定的批次保留）"""
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM batches").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for batch_id, size in conn.execute("SELECT id, bytes FROM batches ORDER BY id").fetchall():
+            if total <= self.max_bytes or batch_id == keep:
+                break
+            conn.execute("DELETE FROM entries WHERE batch_id = ?", (batch_id,))
+            conn.execute("DELETE FROM batches WHERE id = ?", (batch_id,))
+            total -= size
+
+    def trim(self):
+        """按当前 max_bytes 删除超出的旧批次"""
+        conn = self._connect()
+        try:
+            with conn:
+                self._evict(conn)
+        finally:
+            conn.close()
+
+    def batches(self, limit=500):
+        """最近的批次概要，新的在前"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, label, created, state, files, bytes FROM batches ORDER BY id DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [JournalBatch(*row) for row in rows]
+
+    def entries(self, batch_id):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT path, mtime_ns, size, after_hash, fields, original FROM entries"
+                " WHERE batch_id = ? ORDER BY rowid",
+                (batch_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            JournalEntry(path, mtime_ns, size, after_hash, json.loads(zlib.decompress(fields)), original)
+            for path, mtime_ns, size, after_hash, fields, original in rows
+        ]
+
+    def set_state(self, batch_id, state):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE batches SET state = ? WHERE id = ?", (state, batch_id))
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM entries")
+                conn.execute("DELETE FROM batches")
+        finally:
+            conn.close()
+
+
+class JournalRecorder:
+    """收集一次操作中写回的文件（可在多个线程中 add），commit() 时整批写入 Journal"""
+
+    def __init__(self, journal, label, keep_originals=True):
+        self.journal = journal
+        self.label = label
+        self.keep_originals = keep_originals
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, document):
+        try:
+            entry = JournalEntry.from_document(document, self.keep_originals)
+        except Exception as e:
+            print(f"生成撤销记录失败 {document.path}: {str(e)}")
+            return
+        if entry is not None:
+            with self._lock:
+                self._entries[document.path] = entry
+
+    def commit(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries = {}
+        try:
+            return self.journal.add_batch(self.label, entries)
+        except Exception as e:
+            print(f"写入撤销记录失败: {str(e)}")
+            return None
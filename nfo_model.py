@@ -0,0 +1,264 @@
+import os
+
+from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt
+
+from nfo_columns import RecordColumns
+from nfo_search import SearchIndex, sorted_ids
+
+
+# ================ 主文件列表模型 ================
+
+
+def normalize_path(path):
+    """路径比较用的键：规范分隔符，Windows 下不区分大小写"""
+    return os.path.normcase(os.path.normpath(path))
+
+
+def split_levels(root, nfo_path):
+    """按加载线程的规则把 NFO 路径拆成 (一级目录, 二级目录, NFO文件)"""
+    parts = os.path.relpath(nfo_path, root).split(os.sep)
+    if len(parts) > 1:
+        first_level = os.sep.join(parts[:-2]) if len(parts) > 2 else ""
+        return first_level, parts[-2], parts[-1]
+    return "", "", parts[-1]
+
+
+class NFOFileModel(QAbstractItemModel):
+    """扁平的 NFO 文件列表模型
+
+    只保存路径列表 _paths（加载顺序）和显示顺序 _order（_paths 的下标），
+    各列文字在绘制时由路径现算，排序/筛选只替换 _order，不创建任何控件。
+
+    另维护三张索引，使路径/目录 -> 行号的查找为 O(1)：
+    _src_of（规范化路径 -> _paths 下标）、_folder_src（规范化目录 -> 下标，
+    同目录多个 NFO 时为列表）、_row_of_src（下标 -> 显示行号，未显示为 -1）。
+
+    columns（数值列，RecordColumns）和 search（倒排索引，SearchIndex）的下标与 _paths 对齐，
+    追加/删除/刷新时从 cache 同步。
+    """
+
+    HEADERS = ("一级目录", "二级目录", "NFO文件")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = ""
+        self.cache = None  # NFOCache，用于提示信息
+        self._paths = []
+        self._order = []
+        self._src_of = {}
+        self._folder_src = {}
+        self._row_of_src = []
+        self.columns = RecordColumns()
+        self.search = SearchIndex()
+
+    # ---------- QAbstractItemModel 接口 ----------
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self._order)) or not (0 <= column < 3):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 3
+
+    def hasChildren(self, parent=QModelIndex()):
+        return not parent.isValid()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path = self._paths[self._order[index.row()]]
+        if role == Qt.DisplayRole:
+            return split_levels(self.root, path)[index.column()]
+        if role == Qt.ToolTipRole and self.cache is not None:
+            record = self.cache.get(path)
+            if record:
+                return record.get("title") or None
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and 0 <= section < 3:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    # ---------- 数据维护 ----------
+
+    def reset(self, root=""):
+        self.beginResetModel()
+        self.root = root
+        self._paths = []
+        self._order = []
+        self._src_of = {}
+        self._folder_src = {}
+        self._row_of_src = []
+        self.columns.clear()
+        self.search.clear()
+        self.endResetModel()
+
+    def append_paths(self, paths):
+        """追加一批路径到末尾（加载线程的批量结果）"""
+        if not paths:
+            return
+        start = len(self._paths)
+        row = len(self._order)
+        self.beginInsertRows(QModelIndex(), row, row + len(paths) - 1)
+        self._paths.extend(paths)
+        self._order.extend(range(start, start + len(paths)))
+        self._row_of_src.extend(range(row, row + len(paths)))
+        self._index_paths(start)
+        records = [self._record(path) for path in paths]
+        self.columns.append(records)
+        self.search.append(records)
+        self.endInsertRows()
+
+    def remove_paths(self, paths):
+        """移除路径，其余行的选择状态保持不变"""
+        drop = set(paths)
+        if not drop:
+            return
+        for row in range(len(self._order) - 1, -1, -1):
+            if self._paths[self._order[row]] in drop:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._order[row]
+                self.endRemoveRows()
+
+        # 压缩 _paths 并重映射 _order，行号不变，无需通知视图
+        remap = {}
+        kept = []
+        keep_mask = []
+        for src, path in enumerate(self._paths):
+            keep = path not in drop
+            keep_mask.append(keep)
+            if keep:
+                remap[src] = len(kept)
+                kept.append(path)
+        self._paths = kept
+        self.columns.keep(keep_mask)
+        self.search.keep(keep_mask)
+        self._order = [remap[src] for src in self._order]
+        self._src_of = {}
+        self._folder_src = {}
+        self._index_paths(0)
+        self._index_rows()
+
+    def refresh_path(self, path):
+        """记录内容变化后同步数值列并通知视图重绘该行"""
+        src = self.src_of(path)
+        if src >= 0:
+            record = self._record(self._paths[src])
+            self.columns.update(src, record)
+            self.search.update(src, record)
+        row = self.row_of(path)
+        if row >= 0:
+            self.dataChanged.emit(self.index(row, 0), self.index(row, 2))
+
+    def refresh_paths(self, paths):
+        """批量版 refresh_path：逐个同步数值列和索引，视图只通知一次"""
+        rows = []
+        for path in paths:
+            src = self.src_of(path)
+            if src < 0:
+                continue
+            record = self._record(self._paths[src])
+            self.columns.update(src, record)
+            self.search.update(src, record)
+            row = self._row_of_src[src]
+            if row >= 0:
+                rows.append(row)
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), 2))
+
+    def set_order(self, order):
+        """以 _paths 下标列表替换显示顺序（排序结果或筛选子集）"""
+        self.beginResetModel()
+        self._order = list(order)
+        self._index_rows()
+        self.endResetModel()
+
+    def show_all(self):
+        self.set_order(range(len(self._paths)))
+
+    def _index_paths(self, start):
+        """为 _paths[start:] 建立路径和目录索引"""
+        src_of = self._src_of
+        folder_src = self._folder_src
+        for src in range(start, len(self._paths)):
+            key = normalize_path(self._paths[src])
+            src_of[key] = src
+            folder = os.path.dirname(key)
+            existing = folder_src.get(folder)
+            if existing is None:
+                folder_src[folder] = src
+            elif isinstance(existing, list):
+                existing.append(src)
+            else:
+                folder_src[folder] = [existing, src]
+
+    def _record(self, path):
+        return self.cache.get(path) if self.cache is not None else None
+
+    def _index_rows(self):
+        row_of_src = [-1] * len(self._paths)
+        for row, src in enumerate(self._order):
+            row_of_src[src] = row
+        self._row_of_src = row_of_src
+
+    # ---------- 查询 ----------
+
+    def all_paths(self):
+        """全部已加载路径（加载顺序，不受筛选影响）；只读"""
+        return self._paths
+
+    def order(self):
+        """当前显示顺序（_paths 下标）"""
+        return list(self._order)
+
+    def path_at(self, row):
+        if 0 <= row < len(self._order):
+            return self._paths[self._order[row]]
+        return None
+
+    def visible_paths(self):
+        return [self._paths[src] for src in self._order]
+
+    def paths_of(self, docs):
+        """索引查询结果（_paths 下标集合）-> 路径列表（加载顺序）"""
+        return [self._paths[src] for src in sorted_ids(docs)]
+
+    def record_at(self, row):
+        """显示行对应的缓存记录"""
+        path = self.path_at(row)
+        if path is None or self.cache is None:
+            return None
+        return self.cache.get(path)
+
+    def src_of(self, path):
+        """路径在 _paths 中的下标（与 columns 对齐），不在列表中返回 -1"""
+        src = self._src_of.get(normalize_path(path))
+        return -1 if src is None else src
+
+    def row_of(self, path):
+        """路径所在的显示行号，不在列表中或被筛掉返回 -1"""
+        src = self._src_of.get(normalize_path(path))
+        return -1 if src is None else self._row_of_src[src]
+
+    def row_of_folder(self, folder_path):
+        """NFO 所在目录为 folder_path 的显示行（多个时取最靠前的一行），没有返回 -1"""
+        srcs = self._folder_src.get(normalize_path(folder_path))
+        if srcs is None:
+            return -1
+        if not isinstance(srcs, list):
+            return self._row_of_src[srcs]
+        rows = [self._row_of_src[src] for src in srcs if self._row_of_src[src] >= 0]
+        return min(rows) if rows else -1
@@ -0,0 +1,203 @@
+import xml.etree.ElementTree as ET
+
+
+# ================ 统一 NFO 解析 ================
+
+# 直接取文本的标量字段（标签名即属性名），同名标签只取第一个，与 root.find 语义一致
+TEXT_FIELDS = (
+    "num",
+    "id",
+    "number",
+    "title",
+    "originaltitle",
+    "sorttitle",
+    "plot",
+    "series",
+    "set",
+    "studio",
+    "maker",
+    "publisher",
+    "label",
+    "director",
+    "release",
+    "premiered",
+    "year",
+    "runtime",
+    "mosaic",
+    "definition",
+    "resolution",
+    "criticrating",
+)
+
+LIST_FIELDS = ("actors", "tags", "genres")
+
+# 非 UTF-8 / 声明了多字节编码的 NFO 回退解码顺序
+FALLBACK_ENCODINGS = ("utf-8", "gbk", "cp936", "latin1")
+
+_SCALAR_TAGS = frozenset(TEXT_FIELDS + ("rating",))
+
+
+class NFORecord:
+    """单个 NFO 的紧凑记录（__slots__，无 __dict__）
+
+    兼容旧的 dict 缓存用法：record.get("actors", [])、record["title"]。
+    rating 为 float，缺失或无法解析时为 None；rating_text 保留原始文本供编辑框显示。
+    """
+
+    __slots__ = ("path", "rating", "rating_text") + TEXT_FIELDS + LIST_FIELDS
+
+    def __init__(self, path=""):
+        self.path = path
+        self.rating = None
+        self.rating_text = ""
+        for name in TEXT_FIELDS:
+            setattr(self, name, "")
+        self.actors = ()
+        self.tags = ()
+        self.genres = ()
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_tuple(self):
+        """转为纯数据元组（用于跨进程传递和持久化）"""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_tuple(cls, values):
+        record = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, values):
+            if name in LIST_FIELDS:
+                value = tuple(value)
+            setattr(record, name, value)
+        return record
+
+    def __repr__(self):
+        return f"NFORecord({self.path!r}, num={self.num!r}, title={self.title!r})"
+
+
+def _parse_rating(text):
+    if not text:
+        return None
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def _clean_list(texts):
+    return tuple([text for text in [t.strip() for t in texts if t] if text])
+
+
+def record_from_root(root, path=""):
+    """单遍遍历根节点的直接子元素，填充 NFORecord"""
+    texts = {}
+    actors = []
+    tags = []
+    genres = []
+    set_elem = None
+
+    for child in root:
+        tag = child.tag
+        if tag in _SCALAR_TAGS:
+            if tag not in texts:
+                texts[tag] = child.text
+                if tag == "set":
+                    set_elem = child
+        elif tag == "tag":
+            tags.append(child.text)
+        elif tag == "genre":
+            genres.append(child.text)
+        elif tag == "actor":
+            actors.append(child.findtext("name"))
+
+    record = NFORecord.__new__(NFORecord)
+    record.path = path
+    get = texts.get
+    for name in TEXT_FIELDS:
+        text = get(name)
+        setattr(record, name, text.strip() if text else "")
+
+    if not record.set and set_elem is not None:
+        # Kodi 格式：<set><name>系列名</name></set>
+        record.set = (set_elem.findtext("name") or "").strip()
+
+    rating_text = get("rating")
+    rating_text = rating_text.strip() if rating_text else ""
+    record.rating_text = rating_text
+    record.rating = _parse_rating(rating_text)
+
+    if not record.year and record.release:
+        record.year = record.release.split("-")[0]
+
+    record.actors = _clean_list(actors)
+    record.tags = _clean_list(tags)
+    record.genres = _clean_list(genres)
+    return record
+
+
+def root_from_bytes(data):
+    """原始字节 -> 根元素；声明了多字节编码或编码不符时按 FALLBACK_ENCODINGS 解码重试"""
+    try:
+        return ET.fromstring(data)
+    except (ET.ParseError, ValueError):
+        for encoding in FALLBACK_ENCODINGS:
+            try:
+                return ET.fromstring(data.decode(encoding))
+            except (UnicodeDecodeError, ET.ParseError, ValueError):
+                continue
+        raise
+
+
+def load_nfo_root(nfo_path):
+    """读取 NFO 文件的根元素（需要自行查找字段的调用方使用），失败时抛出异常"""
+    with open(nfo_path, "rb") as f:
+        data = f.read()
+    return root_from_bytes(data)
+
+
+def parse_nfo_bytes(data, path=""):
+    """从原始字节解析为 NFORecord"""
+    return record_from_root(root_from_bytes(data), path)
+
+
+def parse_nfo(nfo_path):
+    """解析 NFO 文件，失败时抛出异常"""
+    with open(nfo_path, "rb") as f:
+        data = f.read()
+    return parse_nfo_bytes(data, nfo_path)
+
+
+def parse_single_nfo(nfo_path):
+    """解析 NFO 文件，失败时打印日志并返回 None"""
+    try:
+        return parse_nfo(nfo_path)
+    except Exception as e:
+        print(f"解析NFO文件失败 {nfo_path}: {str(e)}")
+        return None
+
+
+def parse_nfo_chunk(paths):
+    """进程池工作函数：解析一组 NFO，返回 [(记录元组或 None, 错误信息)]
+
+    结果只含纯数据，跨进程 pickle 开销小；主进程用 NFORecord.from_tuple 还原。
+    """
+    results = []
+    for path in paths:
+        try:
+            results.append((parse_nfo(path).to_tuple(), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
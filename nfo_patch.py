@@ -0,0 +1,391 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from nfo_atomic import atomic_write
+from nfo_writer import INDENT, _needs_fallback, _text, format_element, write_nfo
+
+
+# ================ 最小改动写回 ================
+#
+# 读取 NFO 时记下根元素每个直接子元素在原文中的位置和内容签名；保存时按标签分组比较
+# 编辑前后的子元素，只替换发生变化的区间（单个元素的文本、一组 actor/tag/genre 中
+# 增删的部分），其余字节（声明、注释、原有缩进和换行）原样保留。
+#
+# 以下情况回退为整份重新格式化（write_nfo）：
+#   非 UTF-8 编码、DOCTYPE、命名空间等无法安全定位的文档；根元素本身被修改；
+#   写回后重新解析的结果与编辑后的元素树不一致。
+
+# 分组依次为：DOCTYPE、结束标签名、开始标签名、自闭合的 "/"；注释、CDATA、处理指令不捕获分组
+_TOKEN_RE = re.compile(
+    r"<!--.*?-->"
+    r"|<!\[CDATA\[.*?\]\]>"
+    r"|<\?.*?\?>"
+    r"|<!(DOCTYPE)"
+    r"|</([^\s>]+)\s*>"
+    r"|<([^\s/>!?]+)(?:[^>\"'/]+|/(?!>)|\"[^\"]*\"|'[^']*')*(/?)>",
+    re.S,
+)
+_ENCODING_RE = re.compile("^\ufeff?" + r"""<\?xml[^>]*?encoding\s*=\s*["']([^"']+)["']""")
+_WHITESPACE = " \t\r\n"
+
+# save() 的结果
+UNCHANGED = "unchanged"
+PATCHED = "patched"
+REWRITTEN = "rewritten"
+
+
+def _normalize(text):
+    if text and "\r" in text:
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+    return text or ""
+
+
+def _signature(elem):
+    """元素内容签名：忽略有子元素时的纯空白文本和尾随文本（格式化产生的缩进）"""
+    attrib = tuple(elem.attrib.items()) if elem.attrib else ()
+    text = _normalize(elem.text)
+    if not len(elem):
+        return (elem.tag, attrib, text, ())
+    if not text.strip():
+        text = ""
+    return (elem.tag, attrib, text, tuple(_signature(child) for child in elem))
+
+
+class _Unpatchable(Exception):
+    """不能安全地局部改写，回退为整份重新格式化"""
+
+
+class _Span:
+    """顶层子元素在原文中的位置"""
+
+    __slots__ = ("tag", "lead", "start", "end", "content")
+
+    def __init__(self, tag, lead, start, end, content):
+        self.tag = tag
+        self.lead = lead  # 元素前空白的起点，删除元素时一并删除
+        self.start = start
+        self.end = end
+        self.content = content  # 无子元素时为 (文本起点, 文本终点)，自闭合为 None
+
+
+def _scan(text):
+    """定位根元素的直接子元素，返回 (spans, 插入新元素的位置)；无法定位返回 None"""
+    spans = []
+    depth = 0
+    root_seen = False
+    prev_end = 0  # 顶层上一个记号的结束位置
+    child_tag = None
+    child_start = None
+    child_content = None
+    nested = False
+    insert_at = None
+    for match in _TOKEN_RE.finditer(text):
+        doctype, end_tag, start_tag, empty = match.groups()
+        if start_tag is not None:
+            if ":" in start_tag:
+                return None
+            if depth == 0:
+                if root_seen or empty:
+                    return None
+                root_seen = True
+                depth = 1
+                prev_end = match.end()
+            elif depth == 1:
+                token_start, token_end = match.span()
+                if empty:
+                    spans.append(
+                        _Span(start_tag, _lead(text, prev_end, token_start), token_start, token_end, None)
+                    )
+                    prev_end = token_end
+                else:
+                    child_tag = start_tag
+                    child_start = token_start
+                    child_content = token_end
+                    nested = False
+                    depth = 2
+            else:
+                nested = True
+                if not empty:
+                    depth += 1
+        elif end_tag is not None:
+            if depth == 2:
+                token_start, token_end = match.span()
+                content = None if nested else (child_content, token_start)
+                spans.append(
+                    _Span(child_tag, _lead(text, prev_end, child_start), child_start, token_end, content)
+                )
+                prev_end = token_end
+                depth = 1
+            elif depth == 1:
+                insert_at = _lead(text, prev_end, match.start())
+                depth = 0
+            else:
+                depth -= 1
+        elif doctype:
+            return None
+        elif depth == 1:
+            # 顶层的注释、处理指令：原样保留，且不属于其后元素的前导空白
+            prev_end = match.end()
+    if not root_seen or depth != 0 or insert_at is None:
+        return None
+    return spans, insert_at
+
+
+def _lead(text, floor, pos):
+    while pos > floor and text[pos - 1] in _WHITESPACE:
+        pos -= 1
+    return pos
+
+
+def _layout(text, spans):
+    """从第一个有前导空白的顶层元素推断换行符和缩进"""
+    for span in spans:
+        lead = text[span.lead:span.start]
+        if "\n" in lead:
+            newline = "\r\n" if "\r\n" in lead else "\n"
+            return newline, lead[lead.rfind("\n") + 1:]
+    return "\n", INDENT
+
+
+class NFODocument:
+    """可编辑的 NFO 文档：修改 root 后调用 save()，只改写变化的部分"""
+
+    def __init__(self, path, data, stat=None):
+        self.path = path
+        self._data = data
+        self.stat = stat  # 读取时的 os.stat_result（load 时记录）
+        self.root = ET.fromstring(data)
+        self._children = list(self.root)
+        self._signatures = [_signature(child) for child in self._children]
+        self._root_state = (self.root.tag, dict(self.root.attrib))
+        self._saved_groups = None  # 最近一次生成补丁时编辑后各标签组的签名
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        return cls(path, data, stat)
+
+    @property
+    def original(self):
+        """读取时的原始字节"""
+        return self._data
+
+    @property
+    def original_signatures(self):
+        """读取时各顶层子元素的内容签名，与 ET.fromstring(original) 的子元素一一对应"""
+        return self._signatures
+
+    def saved_signatures(self):
+        """保存后（当前 root）按标签分组的签名 {标签: [签名]}；最小改动写回时直接沿用比较结果"""
+        if self._saved_groups is None:
+            return _grouped(self.root)
+        return self._saved_groups
+
+    def save(self, minimal=True, batch=None):
+        """原子写回文件，返回 UNCHANGED / PATCHED / REWRITTEN
+
+        batch 为 nfo_atomic.WriteBatch 时目录落盘推迟到批次结束。
+        """
+        self._saved_groups = None
+        if minimal:
+            patched = self._patch()
+            if patched is not None:
+                if patched == self._data:
+                    return UNCHANGED
+                atomic_write(self.path, patched, batch)
+                return PATCHED
+        write_nfo(self.path, self.root, batch)
+        return REWRITTEN
+
+    # ---------- 生成补丁 ----------
+
+    def _patch(self):
+        """返回改写后的字节；不能安全地局部改写时返回 None"""
+        root = self.root
+        if (root.tag, dict(root.attrib)) != self._root_state:
+            return None
+        try:
+            text = self._data.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+        match = _ENCODING_RE.match(text)
+        if match and match.group(1).lower().replace("_", "-") not in ("utf-8", "utf8"):
+            return None
+        scanned = _scan(text)
+        if scanned is None:
+            return None
+        spans, insert_at = scanned
+        if len(spans) != len(self._children) or any(
+            span.tag != child.tag for span, child in zip(spans, self._children)
+        ):
+            return None
+
+        newline, indent = _layout(text, spans)
+        old_groups = {}
+        for position, child in enumerate(self._children):
+            old_groups.setdefault(child.tag, []).append(position)
+        new_groups = {}
+        for child in root:
+            new_groups.setdefault(child.tag, []).append(child)
+        new_signatures = {tag: [_signature(elem) for elem in elements] for tag, elements in new_groups.items()}
+
+        edits = []
+        structural = False
+        try:
+            for tag, positions in old_groups.items():
+                if self._diff_group(
+                    text, spans, positions, new_groups.pop(tag, []), new_signatures.get(tag, []),
+                    newline, indent, edits,
+                ):
+                    structural = True
+            # 新出现的标签组追加在根元素末尾
+            for elements in new_groups.values():
+                edits.append((insert_at, insert_at, self._format(elements, newline, indent)))
+                structural = True
+        except _Unpatchable:
+            return None
+        self._saved_groups = new_signatures
+
+        if not edits:
+            return self._data
+        edits.sort(key=lambda edit: (edit[0], edit[1]))
+        parts = []
+        cursor = 0
+        for start, end, replacement in edits:
+            if start < cursor:
+                return None
+            parts.append(text[cursor:start])
+            parts.append(replacement)
+            cursor = end
+        parts.append(text[cursor:])
+        data = "".join(parts).encode("utf-8")
+        # 只替换文本时位置已由扫描结果确定；增删元素后重新解析核对一遍
+        if structural and not self._verify(data):
+            return None
+        return data
+
+    def _diff_group(self, text, spans, positions, new_elements, new_sigs, newline, indent, edits):
+        """同一标签的旧元素与新元素比较：保留公共前缀/后缀，只改写中间不同的部分
+
+        返回是否增删了元素（只替换文本时为 False）。
+        """
+        old_sigs = [self._signatures[position] for position in positions]
+        if old_sigs == new_sigs:
+            return False
+        prefix = 0
+        limit = min(len(old_sigs), len(new_sigs))
+        while prefix < limit and old_sigs[prefix] == new_sigs[prefix]:
+            prefix += 1
+        suffix = 0
+        while (
+            suffix < limit - prefix
+            and old_sigs[len(old_sigs) - 1 - suffix] == new_sigs[len(new_sigs) - 1 - suffix]
+        ):
+            suffix += 1
+        old_middle = positions[prefix:len(positions) - suffix]
+        new_middle = new_elements[prefix:len(new_elements) - suffix]
+
+        # 一一对应且都没有子元素、属性相同：只替换元素文本
+        if len(old_middle) == len(new_middle):
+            replacements = []
+            if all(
+                self._replace_text(text, spans[position], self._signatures[position], elem, replacements)
+                for position, elem in zip(old_middle, new_middle)
+            ):
+                edits.extend(replacements)
+                return False
+
+        # 否则删除旧的中间部分，在原位置（或公共前缀之后）写入新元素
+        for position in old_middle:
+            edits.append((spans[position].lead, spans[position].end, ""))
+        if new_middle:
+            if prefix:
+                at = spans[positions[prefix - 1]].end
+            else:
+                at = spans[positions[0]].lead
+            edits.append((at, at, self._format(new_middle, newline, indent)))
+        return True
+
+    @staticmethod
+    def _replace_text(text, span, old_sig, elem, edits):
+        tag, attrib, _, old_children = old_sig
+        if old_children or len(elem) or elem.tag != tag or tuple(elem.attrib.items()) != attrib:
+            return False
+        if _needs_fallback(elem):
+            raise _Unpatchable()
+        value = _text(elem.text) if elem.text else ""
+        if span.content is None:
+            if not value:
+                return True
+            start_tag = text[span.start:span.end].rstrip(">").rstrip().rstrip("/").rstrip()
+            edits.append((span.start, span.end, f"{start_tag}>{value}</{tag}>"))
+        elif value:
+            edits.append((span.content[0], span.content[1], value))
+        else:
+            start_tag = text[span.start:span.content[0] - 1].rstrip()
+            edits.append((span.start, span.end, f"{start_tag}/>"))
+        return True
+
+    @staticmethod
+    def _format(elements, newline, indent):
+        chunks = []
+        for elem in elements:
+            if _needs_fallback(elem):
+                raise _Unpatchable()
+            chunk = format_element(elem, indent, indent or INDENT)
+            if newline != "\n":
+                chunk = chunk.replace("\n", newline)
+            chunks.append(newline + chunk)
+        return "".join(chunks)
+
+    def _verify(self, data):
+        """重新解析改写结果，按标签分组与编辑后的元素树比较"""
+        try:
+            parsed = ET.fromstring(data)
+        except ET.ParseError:
+            return False
+        return _grouped(parsed) == _grouped(self.root)
+
+
+def _grouped(root):
+    groups = {}
+    for child in root:
+        groups.setdefault(child.tag, []).append(_signature(child))
+    return groups
+
+
+# ================ 编辑辅助 ================
+#
+# 编辑界面的取值都经过 strip()，演员只编辑名字。按下面的方式修改元素树，
+# 未变化的元素保持原样，最小改动写回时不会产生多余的差异。
+
+
+def set_text(root, tag, value):
+    """设置第一个 tag 元素的文本（不存在则追加）；去掉首尾空白后相同则不修改"""
+    elem = root.find(tag)
+    if elem is None:
+        elem = ET.SubElement(root, tag)
+    elif (elem.text or "").strip() == value:
+        return elem
+    elem.text = value
+    return elem
+
+
+def set_actor_names(root, names):
+    """按 names 重建 actor 元素；同名演员沿用原有元素（保留 role、thumb 等子元素）"""
+    existing = {}
+    for actor_elem in root.findall("actor"):
+        name = (actor_elem.findtext("name") or "").strip()
+        existing.setdefault(name, []).append(actor_elem)
+        root.remove(actor_elem)
+    for name in names:
+        reused = existing.get(name)
+        if reused:
+            root.append(reused.pop(0))
+        else:
+            actor_elem = ET.SubElement(root, "actor")
+            name_elem = ET.SubElement(actor_elem, "name")
+            name_elem.text = name
@@ -0,0 +1,382 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PyQt5.QtCore import QSize, Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QImageReader
+
+from nfo_parser import parse_nfo
+
+
+# ================ 详情区异步加载 ================
+#
+# 选中文件后，NFO 解析和图片解码都在 PreviewLoader 线程中完成，GUI 线程只负责填充控件。
+# 每次选择带一个递增的代号（generation）：线程只保留最新的请求，处理过程中发现有更新的
+# 请求就放弃当前的工作；GUI 收到结果时再比对一次代号，丢弃快速切换留下的过期结果。
+# 字段先于图片发出，文字不必等待图片解码。
+#
+# 线程中只使用 QImage（可跨线程），转换为 QPixmap 由 GUI 线程完成。
+#
+# 图片按显示尺寸解码（QImageReader.setScaledSize，JPEG 由 libjpeg 直接按比例缩小解码），
+# 原始分辨率取自文件头；解码结果放入按字节数限制的 LRU 缓存，键为 (路径, mtime, 目标尺寸)，
+# 回到看过的条目时不再解码；缓存中有同一文件更大的解码结果时直接在内存中缩小。
+#
+# 相邻预读：选择停稳后 GUI 把当前排序下前后 N 行的路径交给 prefetch()，线程空闲时以低优先级
+# 逐个解析记录、按显示尺寸解码图片，放入上面的缓存；新的请求随时打断预读（最多等待一张图片）。
+# 解析结果按 (mtime_ns, size) 缓存，图片目录的列举按目录 mtime 缓存，命中时不再访问文件内容。
+
+# 图片种类：封面（poster）和缩略图（thumb，没有时用 fanart）
+POSTER = "poster"
+THUMB = "thumb"
+
+
+def find_artwork(folder):
+    """目录中的封面和缩略图路径，返回 {POSTER: 路径或 None, THUMB: 路径或 None}"""
+    posters = []
+    thumbs = []
+    fanarts = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            name = entry.name.lower()
+            if name.endswith(".jpg"):
+                if "poster" in name:
+                    posters.append(entry.path)
+                elif "thumb" in name:
+                    thumbs.append(entry.path)
+                elif "fanart" in name:
+                    fanarts.append(entry.path)
+    return {
+        POSTER: posters[0] if posters else None,
+        THUMB: (thumbs or fanarts or [None])[0],
+    }
+
+
+# 预览缓存容量（字节）：显示尺寸的封面+缩略图每条约 1 MB
+PREVIEW_CACHE_BYTES = 64 * 1024 * 1024
+# 已解析记录、图片目录列举的缓存条数
+RECORD_CACHE_SIZE = 256
+ARTWORK_CACHE_SIZE = 256
+# 目录 mtime 距今不足此时间（纳秒）时不缓存列举结果：时间戳精度有限（FAT 为 2 秒），
+# 同一时间片内新增的图片不会改变 mtime
+ARTWORK_SETTLE_NS = 2 * 1000 * 1000 * 1000
+# 预读时前后各取的行数上限，保证预读的图片远小于缓存容量，不会挤掉当前条目
+MAX_PREFETCH_NEIGHBORS = 10
+
+
+class PreviewCache:
+    """显示尺寸图片的 LRU 缓存，键为 (路径, mtime_ns, 宽, 高)，按图片字节数限制容量（线程安全）"""
+
+    def __init__(self, max_bytes=PREVIEW_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # 键 -> (QImage, (原始宽, 原始高))
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, image, original):
+        cost = image.sizeInBytes()
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[0].sizeInBytes()
+            self._items[key] = (image, original)
+            self._bytes += cost
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._items.popitem(last=False)
+                self._bytes -= evicted.sizeInBytes()
+
+    def find_source(self, path, mtime_ns, size):
+        """同一文件已缓存、足以缩放到 size 的解码结果（取最小的一张），返回 (QImage, 原始尺寸) 或 None"""
+        best = None
+        with self._lock:
+            for key, (image, original) in self._items.items():
+                if key[0] != path or key[1] != mtime_ns or needs_decode(image, original, size):
+                    continue
+                if best is None or image.width() < best[0].width():
+                    best = (image, original)
+        return best
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+def fit_image(image, size, mode=Qt.SmoothTransformation):
+    """按比例缩放到 size 以内；尺寸已经合适时原样返回"""
+    if not size.isValid() or size.isEmpty():
+        return image
+    target = image.size().scaled(size, Qt.KeepAspectRatio)
+    if target == image.size():
+        return image
+    return image.scaled(target, Qt.IgnoreAspectRatio, mode)
+
+
+def needs_decode(image, original, size):
+    """已解码的 image 缩放到 size 会损失清晰度（比原图小且比目标小），需要重新从文件解码"""
+    if image.width() >= original[0]:
+        return False
+    target = QSize(*original).scaled(size, Qt.KeepAspectRatio)
+    return target.width() > image.width()
+
+
+def decode_image(path, size, cache=None):
+    """按 size（QSize）以内的显示尺寸解码图片，返回 (QImage, (原始宽, 原始高))
+
+    cache 为 PreviewCache 时先按 (路径, mtime, 尺寸) 查找，未命中再解码并放入缓存。
+    """
+    key = None
+    if cache is not None:
+        key = (path, os.stat(path).st_mtime_ns, size.width(), size.height())
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+        # 缓存中有同一文件足够大的解码结果（例如窗口缩小后）时直接在内存中缩放
+        if size.isValid():
+            source = cache.find_source(path, key[1], size)
+            if source is not None:
+                image, original = source
+                image = fit_image(image, size)
+                cache.put(key, image, original)
+                return image, original
+
+    reader = QImageReader(path)
+    # 读取缩小的 JPEG 时使用平滑插值
+    reader.setQuality(100)
+    header = reader.size()
+    if header.isValid() and size.isValid():
+        target = header.scaled(size, Qt.KeepAspectRatio)
+        if target.width() < header.width() and not target.isEmpty():
+            reader.setScaledSize(target)
+    image = reader.read()
+    if image.isNull():
+        raise IOError(reader.errorString())
+    if header.isValid():
+        original = (header.width(), header.height())
+    else:
+        original = (image.width(), image.height())
+    # 读不到文件头尺寸或原图小于显示区域时，与原来一样缩放到显示区域
+    if size.isValid():
+        image = fit_image(image, size)
+
+    if cache is not None:
+        cache.put(key, image, original)
+    return image, original
+
+
+class PreviewRequest:
+    """一次详情区加载请求；sizes 为 {POSTER: QSize, THUMB: QSize}，为空表示不加载图片"""
+
+    __slots__ = ("generation", "nfo_path", "want_fields", "sizes")
+
+    def __init__(self, generation, nfo_path, want_fields=True, sizes=None):
+        self.generation = generation
+        self.nfo_path = nfo_path
+        self.want_fields = want_fields
+        self.sizes = sizes or {}
+
+    def merge(self, older):
+        """同一文件尚未处理的旧请求并入新请求，避免丢掉字段加载"""
+        if older.nfo_path != self.nfo_path:
+            return
+        self.want_fields = self.want_fields or older.want_fields
+        sizes = dict(older.sizes)
+        sizes.update(self.sizes)
+        self.sizes = sizes
+
+
+class PreviewLoader(QThread):
+    """详情区加载线程：只处理最新的请求"""
+
+    # (generation, nfo_path, NFORecord 或 None, (mtime_ns, size) 或 None, 错误信息)
+    fields_ready = pyqtSignal(int, str, object, object, str)
+    # (generation, nfo_path)：文件已不存在
+    missing = pyqtSignal(int, str)
+    # (generation, nfo_path, 种类, QImage 或 None, (原始宽, 原始高) 或 None, 提示信息)
+    image_ready = pyqtSignal(int, str, str, object, object, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._condition = threading.Condition()
+        self._request = None
+        self._latest = 0
+        self.is_running = True
+        self.cache = PreviewCache()
+        self._prefetch = []  # 待预读的 NFO 路径，按优先顺序
+        self._prefetch_sizes = {}
+        # 以下两个缓存只在本线程中访问
+        self._records = OrderedDict()  # nfo_path -> ((mtime_ns, size), NFORecord)
+        self._artwork = OrderedDict()  # 目录 -> (目录 mtime_ns, find_artwork 结果)
+
+    def submit(self, request):
+        with self._condition:
+            if self._request is not None:
+                request.merge(self._request)
+            self._request = request
+            self._latest = request.generation
+            # 选择变了，旧的预读列表作废，等 GUI 在新位置停稳后重新给出
+            self._prefetch = []
+            self._condition.notify()
+
+    def prefetch(self, paths, sizes=None):
+        """空闲时预读 paths 的记录和图片（sizes 同 PreviewRequest），替换尚未完成的预读"""
+        with self._condition:
+            self._prefetch = list(paths)
+            self._prefetch_sizes = sizes or {}
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self.is_running = False
+            self._request = None
+            self._prefetch = []
+            self._condition.notify()
+
+    def _stale(self, request):
+        return not self.is_running or request.generation != self._latest
+
+    def _interrupted(self):
+        return not self.is_running or self._request is not None
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._prefetch and self.is_running:
+                    self._condition.wait()
+                if not self.is_running:
+                    return
+                request, self._request = self._request, None
+                if request is None:
+                    path = self._prefetch.pop(0)
+                    sizes = self._prefetch_sizes
+            if request is not None:
+                self.setPriority(QThread.NormalPriority)
+                try:
+                    self._process(request)
+                except Exception as e:
+                    print(f"加载详情失败 {request.nfo_path}: {str(e)}")
+            else:
+                self.setPriority(QThread.LowPriority)
+                try:
+                    self._prefetch_one(path, sizes)
+                except Exception as e:
+                    print(f"预读失败 {path}: {str(e)}")
+
+    # ---------- 记录和图片目录缓存 ----------
+
+    def _load_record(self, path, stat):
+        """解析 NFO；文件的 (mtime_ns, size) 未变时直接返回上次的结果"""
+        signature = (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+        hit = self._records.get(path)
+        if hit is not None and signature is not None and hit[0] == signature:
+            self._records.move_to_end(path)
+            return hit[1]
+        record = parse_nfo(path)
+        if signature is not None:
+            self._records[path] = (signature, record)
+            self._records.move_to_end(path)
+            while len(self._records) > RECORD_CACHE_SIZE:
+                self._records.popitem(last=False)
+        return record
+
+    def _find_artwork(self, folder):
+        """find_artwork；目录 mtime 未变（没有增删改名文件）时直接返回上次的结果"""
+        mtime = os.stat(folder).st_mtime_ns
+        hit = self._artwork.get(folder)
+        if hit is not None and hit[0] == mtime:
+            self._artwork.move_to_end(folder)
+            return hit[1]
+        artwork = find_artwork(folder)
+        if time.time_ns() - mtime >= ARTWORK_SETTLE_NS:
+            self._artwork[folder] = (mtime, artwork)
+            while len(self._artwork) > ARTWORK_CACHE_SIZE:
+                self._artwork.popitem(last=False)
+        else:
+            self._artwork.pop(folder, None)
+        return artwork
+
+    def _prefetch_one(self, path, sizes):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        try:
+            self._load_record(path, stat)
+        except Exception:
+            # 解析失败留给正式加载时报告
+            pass
+        if not sizes or self._interrupted():
+            return
+        artwork = self._find_artwork(os.path.dirname(path))
+        for kind in (POSTER, THUMB):
+            if self._interrupted():
+                return
+            size = sizes.get(kind)
+            image_path = artwork[kind]
+            if size is None or image_path is None:
+                continue
+            try:
+                decode_image(image_path, size, self.cache)
+            except Exception:
+                pass
+
+    def _process(self, request):
+        path = request.nfo_path
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.missing.emit(request.generation, path)
+            return
+        except OSError:
+            stat = None
+
+        if request.want_fields:
+            signature = (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+            try:
+                record = self._load_record(path, stat)
+                error = ""
+            except Exception as e:
+                record = None
+                error = str(e)
+            self.fields_ready.emit(request.generation, path, record, signature, error)
+
+        if not request.sizes or self._stale(request):
+            return
+        try:
+            artwork = self._find_artwork(os.path.dirname(path))
+        except OSError as e:
+            print(f"读取图片目录失败 {path}: {str(e)}")
+            artwork = {POSTER: None, THUMB: None}
+
+        for kind in (POSTER, THUMB):
+            if self._stale(request):
+                return
+            size = request.sizes.get(kind)
+            if size is None:
+                continue
+            image_path = artwork[kind]
+            if image_path is None:
+                self.image_ready.emit(request.generation, path, kind, None, None, "")
+                continue
+            try:
+                image, original = decode_image(image_path, size, self.cache)
+                self.image_ready.emit(request.generation, path, kind, image, original, "")
+            except Exception as e:
+                self.image_ready.emit(request.generation, path, kind, None, None, f"加载图片失败: {str(e)}")
+
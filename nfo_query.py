@@ -0,0 +1,430 @@
+import re
+import time
+
+import numpy as np
+
+from nfo_columns import release_key
+
+
+# ================ 组合查询 ================
+#
+# 语法示例：actor:"某演员" AND rating>8 AND release>=2023-01 AND NOT tag:VR
+#
+#   字段:值      包含（不区分大小写），列表字段任一取值包含即可
+#   字段=值      取值完全相等（不区分大小写）
+#   字段>值 等   数值/日期比较：rating、release、runtime，支持 > >= < <= =
+#   AND / OR / NOT / 括号，相邻条件之间省略 AND；不带字段的词按标题包含处理
+#
+# 查询先解析为语法树，AND 节点执行时按估计的结果数从小到大排序：
+# 倒排表精确查找和数值掩码的结果数可以直接得到，先执行最小的一个作为候选集，
+# 其余条件在候选集较小时只在候选集内复查，否则整列计算后求交；NOT 条件从候选集中排除。
+
+
+# 候选集内逐条复查相对扫描一个去重取值的开销倍数（用于选择复查还是整列查找）
+WITHIN_COST = 4
+
+
+class QueryError(ValueError):
+    """查询语法错误"""
+
+
+# 字段别名 -> 索引字段
+TEXT_FIELD_ALIASES = {
+    "title": "title",
+    "标题": "title",
+    "series": "series",
+    "系列": "series",
+    "actor": "actors",
+    "actors": "actors",
+    "演员": "actors",
+    "tag": "tags",
+    "tags": "tags",
+    "标签": "tags",
+    "genre": "genres",
+    "genres": "genres",
+    "类型": "genres",
+}
+
+NUMERIC_FIELD_ALIASES = {
+    "rating": "rating",
+    "评分": "rating",
+    "release": "release",
+    "date": "release",
+    "日期": "release",
+    "runtime": "runtime",
+    "时长": "runtime",
+}
+
+_TOKEN_RE = re.compile(
+    r'\s*(?:(?P<paren>[()])|"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<op>>=|<=|[:=<>])|(?P<word>[^\s()"=<>:]+))'
+)
+
+_KEYWORDS = {"and": "AND", "or": "OR", "not": "NOT"}
+
+
+def tokenize(text):
+    """返回 [(类型, 值)]，类型为 paren / op / word / quoted / AND / OR / NOT"""
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise QueryError(f"无法识别的字符: {text[pos:pos + 10]}")
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "quoted":
+            value = re.sub(r"\\(.)", r"\1", value)
+        elif kind == "word" and value.lower() in _KEYWORDS:
+            kind = _KEYWORDS[value.lower()]
+        tokens.append((kind, value))
+    return tokens
+
+
+# ---------- 语法树 ----------
+
+
+class Node:
+    """语法树节点
+
+    estimate(ctx)：结果数的估计，无法廉价估计时返回记录总数
+    evaluate(ctx)：整列计算，返回升序的记录下标数组
+    filter(ctx, ids)：只在 ids 中保留满足条件的下标
+    """
+
+    def estimate(self, ctx):
+        return ctx.size
+
+    def filter(self, ctx, ids):
+        return np.intersect1d(ids, self.evaluate(ctx), assume_unique=True)
+
+
+def _id_array(docs):
+    if not docs:
+        return np.empty(0, dtype=np.intp)
+    return np.sort(np.fromiter(docs, dtype=np.intp, count=len(docs)))
+
+
+class TextTerm(Node):
+    def __init__(self, field, value, exact=False):
+        self.field = field
+        self.value = value.lower()
+        self.exact = exact
+
+    def __str__(self):
+        return f'{self.field}{"=" if self.exact else ":"}"{self.value}"'
+
+    def estimate(self, ctx):
+        if self.exact:
+            return len(ctx.search.exact(self.field, self.value))
+        return ctx.size
+
+    def evaluate(self, ctx):
+        if self.exact:
+            return _id_array(ctx.search.exact(self.field, self.value))
+        return _id_array(ctx.search.contains(self.field, self.value))
+
+    def filter(self, ctx, ids):
+        if self.exact:
+            return ids[np.isin(ids, self.evaluate(ctx), assume_unique=True)]
+        # 逐条复查的单位开销约为扫描一个取值的数倍，候选集足够小时才逐条复查
+        if len(ids) * WITHIN_COST < len(ctx.search.fields[self.field]):
+            return _id_array(ctx.search.contains_within(self.field, self.value, ids.tolist()))
+        return np.intersect1d(ids, self.evaluate(ctx), assume_unique=True)
+
+
+class Compare(Node):
+    def __init__(self, field, op, text):
+        self.field = field
+        self.op = op
+        self.text = text
+        if field == "release":
+            key = release_key(text)
+            if not key:
+                raise QueryError(f"无法识别的日期: {text}")
+            # 只写到年/月时，比较对象是整个时间段
+            if key % 100:
+                low = high = key
+            elif key % 10000:
+                low, high = key, key + 99
+            else:
+                low, high = key, key + 9999
+        else:
+            try:
+                low = high = float(text)
+            except ValueError:
+                raise QueryError(f"无法识别的数值: {text}") from None
+        self.low = low
+        self.high = high
+
+    def __str__(self):
+        return f"{self.field}{self.op}{self.text}"
+
+    def _values(self, ctx, ids=None):
+        columns = ctx.columns
+        if self.field == "rating":
+            return columns.rating_or_zero(ids)
+        values = getattr(columns, self.field)
+        return values if ids is None else values[ids]
+
+    def _compare(self, values):
+        op = self.op
+        if op == ">":
+            mask = values > self.high
+        elif op == ">=":
+            mask = values >= self.low
+        elif op == "<":
+            mask = values < self.low
+        elif op == "<=":
+            mask = values <= self.high
+        else:
+            mask = (values >= self.low) & (values <= self.high)
+        if self.field != "rating":
+            # 日期/时长为 0 表示缺失，不参与比较
+            mask &= values > 0
+        return mask
+
+    def mask(self, ctx):
+        # 同一次执行中估计和计算共用整列掩码
+        mask = ctx.masks.get(id(self))
+        if mask is None:
+            mask = ctx.masks[id(self)] = self._compare(self._values(ctx))
+        return mask
+
+    def estimate(self, ctx):
+        return int(self.mask(ctx).sum())
+
+    def evaluate(self, ctx):
+        return np.flatnonzero(self.mask(ctx))
+
+    def filter(self, ctx, ids):
+        mask = ctx.masks.get(id(self))
+        if mask is not None:
+            return ids[mask[ids]]
+        return ids[self._compare(self._values(ctx, ids))]
+
+
+class Not(Node):
+    def __init__(self, child):
+        self.child = child
+
+    def __str__(self):
+        return f"NOT {self.child}"
+
+    def evaluate(self, ctx):
+        return np.setdiff1d(ctx.all_ids(), self.child.evaluate(ctx), assume_unique=True)
+
+    def filter(self, ctx, ids):
+        return np.setdiff1d(ids, self.child.filter(ctx, ids), assume_unique=True)
+
+
+class Or(Node):
+    def __init__(self, children):
+        self.children = children
+
+    def __str__(self):
+        return "(" + " OR ".join(str(child) for child in self.children) + ")"
+
+    def estimate(self, ctx):
+        return min(ctx.size, sum(child.estimate(ctx) for child in self.children))
+
+    def evaluate(self, ctx):
+        result = self.children[0].evaluate(ctx)
+        for child in self.children[1:]:
+            result = np.union1d(result, child.evaluate(ctx))
+        return result
+
+    def filter(self, ctx, ids):
+        result = self.children[0].filter(ctx, ids)
+        for child in self.children[1:]:
+            rest = np.setdiff1d(ids, result, assume_unique=True)
+            if len(rest) == 0:
+                break
+            result = np.union1d(result, child.filter(ctx, rest))
+        return result
+
+
+class And(Node):
+    def __init__(self, children):
+        self.children = children
+
+    def __str__(self):
+        return "(" + " AND ".join(str(child) for child in self.children) + ")"
+
+    def evaluate(self, ctx):
+        positive = [child for child in self.children if not isinstance(child, Not)]
+        negative = [child.child for child in self.children if isinstance(child, Not)]
+
+        if positive:
+            # 按估计结果数排序，最小的先整列计算作为候选集
+            start = time.perf_counter()
+            ranked = sorted((child.estimate(ctx), i, child) for i, child in enumerate(positive))
+            ctx.step("估计", ", ".join(f"{child}≈{size}" for size, _, child in ranked), start)
+            first = ranked[0][2]
+            start = time.perf_counter()
+            ids = first.evaluate(ctx)
+            ctx.step("候选", str(first), start, len(ids))
+            rest = [child for _, _, child in ranked[1:]]
+        else:
+            ids = ctx.all_ids()
+            rest = []
+
+        for child in rest:
+            if len(ids) == 0:
+                break
+            start = time.perf_counter()
+            ids = child.filter(ctx, ids)
+            ctx.step("求交", str(child), start, len(ids))
+
+        for child in negative:
+            if len(ids) == 0:
+                break
+            start = time.perf_counter()
+            ids = np.setdiff1d(ids, child.filter(ctx, ids), assume_unique=True)
+            ctx.step("排除", str(child), start, len(ids))
+        return ids
+
+    def filter(self, ctx, ids):
+        for child in self.children:
+            if len(ids) == 0:
+                break
+            ids = child.filter(ctx, ids)
+        return ids
+
+
+# ---------- 解析 ----------
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError("查询为空")
+        node = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise QueryError(f"多余的内容: {self.peek()[1]}")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek()[0] == "OR":
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_unary()]
+        while True:
+            kind, value = self.peek()
+            if kind == "AND":
+                self.take()
+            elif kind is None or kind == "OR" or (kind == "paren" and value == ")"):
+                break
+            children.append(self.parse_unary())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_unary(self):
+        kind, value = self.peek()
+        if kind == "NOT":
+            self.take()
+            return Not(self.parse_unary())
+        if kind == "paren" and value == "(":
+            self.take()
+            node = self.parse_or()
+            if self.take() != ("paren", ")"):
+                raise QueryError("缺少右括号")
+            return node
+        return self.parse_term()
+
+    def parse_term(self):
+        kind, value = self.take()
+        if kind not in ("word", "quoted"):
+            raise QueryError(f"此处需要查询条件: {value or '结尾'}")
+        op_kind, op = self.peek()
+        if kind == "word" and op_kind == "op":
+            self.take()
+            value_kind, operand = self.take()
+            if value_kind not in ("word", "quoted"):
+                raise QueryError(f"{value}{op} 后缺少取值")
+            return _make_term(value, op, operand)
+        return TextTerm("title", value)
+
+
+def _make_term(field, op, operand):
+    name = field.lower()
+    if name in TEXT_FIELD_ALIASES:
+        if op not in (":", "="):
+            raise QueryError(f"文本字段 {field} 只支持 : 和 =")
+        return TextTerm(TEXT_FIELD_ALIASES[name], operand, exact=op == "=")
+    if name in NUMERIC_FIELD_ALIASES:
+        return Compare(NUMERIC_FIELD_ALIASES[name], "=" if op == ":" else op, operand)
+    raise QueryError(f"未知字段: {field}")
+
+
+def parse_query(text):
+    """解析查询文本为语法树，语法错误抛出 QueryError"""
+    return _Parser(tokenize(text)).parse()
+
+
+# ---------- 执行 ----------
+
+
+class QueryContext:
+    """一次执行的数据源与执行记录（explain 用）"""
+
+    def __init__(self, search, columns):
+        self.search = search
+        self.columns = columns
+        self.size = len(search)
+        self.steps = []
+        self.masks = {}
+        self.total_ms = 0.0
+        self._all = None
+
+    def all_ids(self):
+        if self._all is None:
+            self._all = np.arange(self.size, dtype=np.intp)
+        return self._all
+
+    def step(self, action, detail, start, count=None):
+        elapsed = (time.perf_counter() - start) * 1000
+        self.steps.append((action, detail, count, elapsed))
+
+
+class CompiledQuery:
+    """解析一次、可多次执行的查询"""
+
+    def __init__(self, text):
+        self.text = text
+        self.root = parse_query(text)
+
+    def execute(self, search, columns):
+        """返回 (升序记录下标列表, QueryContext)"""
+        ctx = QueryContext(search, columns)
+        start = time.perf_counter()
+        ids = self.root.evaluate(ctx)
+        if not isinstance(self.root, And):
+            ctx.step("计算", str(self.root), start, len(ids))
+        ctx.total_ms = (time.perf_counter() - start) * 1000
+        return ids.tolist(), ctx
+
+    def explain(self, ctx):
+        """执行计划文本：每一步的动作、条件、结果数和耗时"""
+        lines = [f"查询: {self.text}", f"语法树: {self.root}"]
+        for i, (action, detail, count, elapsed) in enumerate(ctx.steps, 1):
+            result = "" if count is None else f" -> {count} 条"
+            lines.append(f"  {i}. {action} {detail}{result} ({elapsed:.2f} ms)")
+        lines.append(f"总计 {ctx.total_ms:.2f} ms，共 {ctx.size} 条记录")
+        return "\n".join(lines)
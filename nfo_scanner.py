@@ -0,0 +1,250 @@
+import json
+import os
+import time
+
+from nfo_atomic import TEMP_SUFFIX, is_temp_name, remove_stale_temp
+from nfo_index import NFOIndex, path_key
+
+
+# ================ 共享目录扫描器 ================
+#
+# 基于 os.scandir 的流式扫描：按 os.walk 自顶向下的顺序逐个目录产出 FolderManifest，
+# 文件分类直接使用 DirEntry 自带的类型信息（Windows 下连 stat 都不需要额外系统调用）。
+#
+# 目录清单持久化在索引库的 dirs 表中，键为目录路径，值为 (目录 mtime_ns, 分类后的文件名)。
+# 目录 mtime 未变化说明其直接子项没有增删改名，直接复用上次的清单而不再读取目录；
+# 目录 mtime 只反映直接子项，因此仍需逐个 stat 子目录继续向下比对。
+#
+# 读取目录时顺带删除崩溃残留的原子写入临时文件（见 nfo_atomic.remove_stale_temp）；
+# 含有尚未过期的临时文件的目录不写入清单，下次扫描仍会读取目录再检查。
+
+NFO_EXTENSIONS = (".nfo",)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg")
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov", ".rm", ".mpeg", ".ts", ".strm")
+
+# mtime 距今不足该秒数的目录不写入清单：同一时间戳内可能还有未观察到的修改（FAT 精度为 2 秒）
+MTIME_SETTLE_SECONDS = 2
+
+
+class FolderManifest:
+    """单个目录的扫描结果；*_names 为目录内的原始顺序，路径属性按需拼接"""
+
+    __slots__ = (
+        "path", "subdir_names", "nfo_names", "image_names", "video_names",
+        "nfos", "nfo_stats", "reused", "_prefix",
+    )
+
+    def __init__(self, path, subdirs, nfos, images, videos, reused=False):
+        self.path = path
+        self.subdir_names = subdirs
+        self.nfo_names = nfos
+        self.image_names = images
+        self.video_names = videos
+        self._prefix = path if path.endswith(os.sep) else path + os.sep
+        self.nfos = self._join(nfos)
+        # stat_files=True 时为 {nfo路径: os.stat_result}，读取失败的文件不在其中
+        self.nfo_stats = {}
+        # 是否复用了持久化清单（未读取目录）
+        self.reused = reused
+
+    def _join(self, names):
+        prefix = self._prefix
+        return [prefix + name for name in names]
+
+    @property
+    def subdirs(self):
+        return self._join(self.subdir_names)
+
+    @property
+    def images(self):
+        return self._join(self.image_names)
+
+    @property
+    def videos(self):
+        return self._join(self.video_names)
+
+    @property
+    def posters(self):
+        """文件名含 poster 的图片"""
+        return self._join([name for name in self.image_names if "poster" in name.lower()])
+
+    def __repr__(self):
+        return f"FolderManifest({self.path!r}, nfos={len(self.nfos)}, subdirs={len(self.subdir_names)})"
+
+
+def _read_listing(folder):
+    """读取目录并分类，返回 ([子目录], [nfo], [图片], [视频], {子目录或NFO名: DirEntry}, 是否留有临时文件)"""
+    subdirs = []
+    nfos = []
+    images = []
+    videos = []
+    entries = {}
+    has_temp = False
+    with os.scandir(folder) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            name = entry.name
+            if is_dir:
+                # 与 os.walk 默认行为一致，不进入目录符号链接
+                if not entry.is_symlink():
+                    subdirs.append(name)
+                    entries[name] = entry
+                continue
+            lower = name.lower()
+            if lower.endswith(NFO_EXTENSIONS):
+                nfos.append(name)
+                entries[name] = entry
+            elif lower.endswith(IMAGE_EXTENSIONS):
+                images.append(name)
+            elif lower.endswith(VIDEO_EXTENSIONS):
+                videos.append(name)
+            elif lower.endswith(TEMP_SUFFIX) and is_temp_name(name):
+                if not remove_stale_temp(entry.path, _stat_entry(entry, entry.path)):
+                    has_temp = True
+    return subdirs, nfos, images, videos, entries, has_temp
+
+
+def _stat_entry(entry, path):
+    """优先使用 DirEntry 缓存的 stat（Windows 下来自目录读取结果，无额外调用）"""
+    try:
+        return entry.stat() if entry is not None else os.stat(path)
+    except OSError as e:
+        print(f"读取文件信息失败 {path}: {str(e)}")
+        return None
+
+
+def scan_library(root, index=None, use_index=True, stat_files=False, is_running=None):
+    """流式扫描 root（含自身），逐个目录产出 FolderManifest
+
+    index: 已打开的 NFOIndex（调用方负责关闭）；为 None 且 use_index 时自行打开默认索引。
+    stat_files: 同时获取 NFO 的 stat，结果放在 manifest.nfo_stats。
+    is_running: 可选的回调，返回 False 时停止扫描。
+
+    只有完整扫描结束后才删除已消失目录的清单；中途停止时仍保存已读取的清单。
+    """
+    own_index = False
+    cached = {}
+    if use_index:
+        try:
+            if index is None:
+                index = NFOIndex()
+                own_index = True
+            cached = index.load_dirs(root)
+        except Exception as e:
+            print(f"打开目录索引失败: {str(e)}")
+            if own_index and index is not None:
+                index.close()
+            index = None
+            own_index = False
+    else:
+        index = None
+
+    updates = []
+    completed = False
+    settle_before = time.time_ns() - MTIME_SETTLE_SECONDS * 1_000_000_000
+    # 栈元素：(目录路径, 路径键, 目录 stat)；不使用索引时不需要键和 stat
+    stack = [(root, path_key(root) if index is not None else None, None)]
+
+    try:
+        while stack:
+            if is_running is not None and not is_running():
+                return
+            folder, key, dir_stat = stack.pop()
+            if index is None:
+                manifest, children = _scan_folder_plain(folder, stat_files)
+            else:
+                manifest, children = _scan_folder_indexed(
+                    folder, key, dir_stat, cached, updates, stat_files, settle_before
+                )
+            if manifest is None:
+                continue
+            yield manifest
+            # 逆序入栈，出栈顺序与 os.walk 自顶向下的顺序一致
+            stack.extend(reversed(children))
+        completed = True
+    finally:
+        if index is not None:
+            try:
+                index.store_dirs(updates)
+                if completed:
+                    # cached 中剩下的是本次没有访问到的目录（已删除或改名）
+                    index.remove_dirs(cached.keys())
+            except Exception as e:
+                print(f"更新目录索引失败: {str(e)}")
+            if own_index:
+                index.close()
+
+
+def _stat_nfos(manifest, entries):
+    nfo_stats = manifest.nfo_stats
+    for name, nfo_path in zip(manifest.nfo_names, manifest.nfos):
+        stat = _stat_entry(entries.get(name), nfo_path)
+        if stat is not None:
+            nfo_stats[nfo_path] = stat
+
+
+def _scan_folder_plain(folder, stat_files):
+    """不使用目录清单：直接读取目录，返回 (FolderManifest, 子目录栈元素)"""
+    try:
+        subdirs, nfos, images, videos, entries, _ = _read_listing(folder)
+    except OSError as e:
+        print(f"遍历目录失败 {folder}: {str(e)}")
+        return None, []
+    manifest = FolderManifest(folder, subdirs, nfos, images, videos)
+    if stat_files:
+        _stat_nfos(manifest, entries)
+    return manifest, [(entries[name].path, None, None) for name in subdirs]
+
+
+def _scan_folder_indexed(folder, key, dir_stat, cached, updates, stat_files, settle_before):
+    """目录 mtime 与清单一致时复用清单，否则读取目录并记录新清单；不可读返回 (None, [])"""
+    entry = cached.pop(key, None)
+    try:
+        if dir_stat is None:
+            dir_stat = os.stat(folder)
+        mtime_ns = dir_stat.st_mtime_ns
+    except OSError as e:
+        print(f"遍历目录失败 {folder}: {str(e)}")
+        return None, []
+
+    entries = {}
+    if entry is not None and entry[0] == mtime_ns:
+        subdirs, nfos, images, videos = json.loads(entry[1])
+        reused = True
+    else:
+        try:
+            subdirs, nfos, images, videos, entries, has_temp = _read_listing(folder)
+        except OSError as e:
+            print(f"遍历目录失败 {folder}: {str(e)}")
+            return None, []
+        reused = False
+        if mtime_ns < settle_before and not has_temp:
+            listing = json.dumps([subdirs, nfos, images, videos], ensure_ascii=False)
+            updates.append((key, mtime_ns, listing))
+
+    manifest = FolderManifest(folder, subdirs, nfos, images, videos, reused)
+    if stat_files:
+        _stat_nfos(manifest, entries)
+
+    key_prefix = key if key.endswith(os.sep) else key + os.sep
+    normcase = os.path.normcase
+    children = []
+    for name, subdir in zip(subdirs, manifest.subdirs):
+        child_entry = entries.get(name)
+        child_stat = None
+        if child_entry is not None:
+            try:
+                child_stat = child_entry.stat()
+            except OSError:
+                child_stat = None
+        children.append((subdir, key_prefix + normcase(name), child_stat))
+    return manifest, children
+
+
+def iter_nfo_files(root, **kwargs):
+    """按扫描顺序产出 root 下所有 NFO 路径"""
+    for manifest in scan_library(root, **kwargs):
+        yield from manifest.nfos
@@ -0,0 +1,280 @@
+import numpy as np
+
+
+# ================ 倒排索引 ================
+#
+# 扫描时一次建立：字段值（小写）-> 记录下标的倒排表，下标与文件列表模型的 _paths 对齐。
+# 精确查找（某个演员、某个标签）直接取倒排表。
+# 包含查找使用去重取值上的三字母（trigram）索引：取查询文本中候选最少的三字母片段，
+# 只对这些候选取值做子串确认；不足三个字的查询没有片段可用，退回在去重取值上逐个匹配。
+# 三字母索引在第一次包含查找时建立，之后新增的取值增量补入；删除的取值只留下空位，
+# 查询时跳过，空位超过一半时整体重建。
+
+# 建立索引的字段：标量字段和列表字段
+SCALAR_FIELDS = ("title", "series")
+LIST_FIELDS = ("actors", "tags", "genres")
+FIELDS = SCALAR_FIELDS + LIST_FIELDS
+
+GRAM_SIZE = 3
+
+
+def normalize(value):
+    return value.strip().lower() if value else ""
+
+
+class FieldIndex:
+    """单个字段的倒排表：取值 -> 记录下标，附带包含查找用的三字母索引
+
+    大部分取值只出现在一条记录中（如标题），此时直接存 int，出现多次才转为 set。
+    """
+
+    __slots__ = ("postings", "_keys", "_grams", "_pending", "_removed")
+
+    def __init__(self):
+        self.postings = {}
+        self._keys = []  # 已编入三字母索引的取值，下标即 _grams 中的位置
+        self._grams = None  # 三字母片段 -> [位置]，None 表示尚未建立
+        self._pending = []  # 建立之后新增、尚未编入的取值
+        self._removed = 0  # _keys 中已删除取值的空位数
+
+    def __len__(self):
+        """去重取值数"""
+        return len(self.postings)
+
+    def add(self, key, doc):
+        postings = self.postings
+        existing = postings.get(key)
+        if existing is None:
+            postings[key] = doc
+            if self._grams is not None:
+                self._pending.append(key)
+        elif isinstance(existing, set):
+            existing.add(doc)
+        elif existing != doc:
+            postings[key] = {existing, doc}
+
+    def discard(self, key, doc):
+        postings = self.postings
+        existing = postings.get(key)
+        if existing is None:
+            return
+        if isinstance(existing, set):
+            existing.discard(doc)
+            if len(existing) == 1:
+                postings[key] = next(iter(existing))
+        elif existing == doc:
+            del postings[key]
+            if self._grams is not None:
+                self._removed += 1
+
+    def exact(self, key):
+        existing = self.postings.get(key)
+        if existing is None:
+            return set()
+        return set(existing) if isinstance(existing, set) else {existing}
+
+    def _index_keys(self, keys):
+        positions = self._keys
+        grams = self._grams
+        for key in keys:
+            position = len(positions)
+            positions.append(key)
+            for gram in {key[i:i + GRAM_SIZE] for i in range(len(key) - GRAM_SIZE + 1)}:
+                bucket = grams.get(gram)
+                if bucket is None:
+                    grams[gram] = [position]
+                else:
+                    bucket.append(position)
+
+    def _sync(self):
+        """建立或补全三字母索引"""
+        if self._grams is None or self._removed * 2 > len(self._keys):
+            self._keys = []
+            self._grams = {}
+            self._pending = []
+            self._removed = 0
+            self._index_keys(self.postings)
+        elif self._pending:
+            pending, self._pending = self._pending, []
+            self._index_keys(pending)
+
+    def _candidates(self, text):
+        """包含 text 中所有三字母片段的候选取值（可能有重复和已删除的取值），text 至少三个字"""
+        self._sync()
+        grams = self._grams
+        best = None
+        for i in range(len(text) - GRAM_SIZE + 1):
+            bucket = grams.get(text[i:i + GRAM_SIZE])
+            if bucket is None:
+                return ()
+            if best is None or len(bucket) < len(best):
+                best = bucket
+        keys = self._keys
+        return [keys[position] for position in best]
+
+    def contains(self, text):
+        """取值包含 text 的记录下标集合"""
+        postings = self.postings
+        if len(text) < GRAM_SIZE:
+            matched = [key for key in postings if text in key]
+        else:
+            matched = {key for key in self._candidates(text) if text in key and key in postings}
+        result = set()
+        for key in matched:
+            existing = postings[key]
+            if isinstance(existing, set):
+                result |= existing
+            else:
+                result.add(existing)
+        return result
+
+    def values(self):
+        """全部去重取值（小写）"""
+        return list(self.postings)
+
+    def counts(self):
+        """{取值: 记录数}"""
+        return {key: len(docs) if isinstance(docs, set) else 1 for key, docs in self.postings.items()}
+
+
+def _record_keys(record):
+    """记录各字段的规范化取值，按 FIELDS 顺序，每个字段为去重后的元组
+
+    解析器已去掉首尾空白，这里只需转小写。
+    """
+    if record is None:
+        return ((),) * len(FIELDS)
+    title = record.title.lower() if record.title else ""
+    series = record.series.lower() if record.series else ""
+    return (
+        (title,) if title else (),
+        (series,) if series else (),
+        tuple({value.lower() for value in record.actors if value}),
+        tuple({value.lower() for value in record.tags if value}),
+        tuple({value.lower() for value in record.genres if value}),
+    )
+
+
+class SearchIndex:
+    """各字段倒排索引，记录下标与 NFOFileModel._paths 对齐
+
+    随加载批次追加，保存/批量操作后按下标更新，删除记录后压缩下标。
+    查询结果为记录下标的 set。
+    """
+
+    def __init__(self):
+        self._docs = []  # 每条记录已索引的取值，更新/删除时据此撤销
+        # 每次内容变化递增，调用方据此判断缓存的查询结果是否仍然有效
+        self.version = 0
+        self.clear()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def clear(self):
+        self.fields = {name: FieldIndex() for name in FIELDS}
+        self._indexes = [self.fields[name] for name in FIELDS]
+        self._docs = []
+        self.version += 1
+
+    def append(self, records):
+        start = len(self._docs)
+        for doc, record in enumerate(records, start):
+            keys = _record_keys(record)
+            self._docs.append(keys)
+            self._add(doc, keys)
+        self.version += 1
+
+    def update(self, doc, record):
+        if not 0 <= doc < len(self._docs):
+            return
+        keys = _record_keys(record)
+        old = self._docs[doc]
+        if keys == old:
+            return
+        for index, values in zip(self._indexes, old):
+            for key in values:
+                index.discard(key, doc)
+        self._docs[doc] = keys
+        self._add(doc, keys)
+        self.version += 1
+
+    def keep(self, mask):
+        """按布尔掩码删除记录并重编下标（与 _paths 压缩同步）"""
+        docs = [keys for keys, keep in zip(self._docs, mask) if keep]
+        self.clear()
+        self._docs = docs
+        for doc, keys in enumerate(docs):
+            self._add(doc, keys)
+
+    def _add(self, doc, keys):
+        # FieldIndex.add 的内联版本，建索引是加载时的热点
+        for index, values in zip(self._indexes, keys):
+            postings = index.postings
+            for key in values:
+                existing = postings.get(key)
+                if existing is None:
+                    postings[key] = doc
+                    if index._grams is not None:
+                        index._pending.append(key)
+                elif isinstance(existing, set):
+                    existing.add(doc)
+                elif existing != doc:
+                    postings[key] = {existing, doc}
+
+    # ---------- 查询 ----------
+
+    def exact(self, field, value):
+        """字段取值等于 value（不区分大小写）的记录"""
+        return self.fields[field].exact(normalize(value))
+
+    def contains(self, field, text):
+        """字段取值包含 text（不区分大小写）的记录；列表字段任一取值包含即可"""
+        text = text.lower()
+        if not text:
+            return set(range(len(self._docs)))
+        return self.fields[field].contains(text)
+
+    def exact_any(self, field, values):
+        """字段取值等于 values 中任意一个（已规范化）的记录"""
+        postings = self.fields[field].postings
+        result = set()
+        for key in values:
+            existing = postings.get(key)
+            if isinstance(existing, set):
+                result |= existing
+            elif existing is not None:
+                result.add(existing)
+        return result
+
+    def value_counts(self, field):
+        """字段全部取值（小写）及各自的记录数"""
+        return self.fields[field].counts()
+
+    def first_doc(self, field, key):
+        """字段取值为 key（已规范化）的第一条记录，没有返回 -1"""
+        existing = self.fields[field].postings.get(key)
+        if existing is None:
+            return -1
+        return min(existing) if isinstance(existing, set) else existing
+
+    def contains_within(self, field, text, docs):
+        """只在 docs 中检查包含关系（上一次结果的增量缩小）"""
+        text = text.lower()
+        position = FIELDS.index(field)
+        all_keys = self._docs
+        return {doc for doc in docs if any(text in key for key in all_keys[doc][position])}
+
+    def not_contains(self, field, text):
+        """contains 的补集（空字段也算不包含）"""
+        return self.complement(self.contains(field, text))
+
+    def complement(self, docs):
+        return set(range(len(self._docs))).difference(docs)
+
+
+def sorted_ids(docs):
+    """记录下标集合 -> 升序列表（加载顺序）"""
+    if not docs:
+        return []
+    return np.sort(np.fromiter(docs, dtype=np.intp, count=len(docs))).tolist()
@@ -0,0 +1,174 @@
+import re
+import xml.dom.minidom as minidom
+import xml.etree.ElementTree as ET
+
+from nfo_atomic import atomic_open
+
+
+# ================ NFO 写出 ================
+#
+# 输出格式与旧的保存流程逐字节一致：
+#   ET.tostring -> minidom.parseString -> toprettyxml(indent="  ", encoding="utf-8")
+#   -> 去掉所有空白行 -> 以 "\n" 连接（末尾无换行），再以文本模式写入
+# 这里直接在 ElementTree 上按 minidom 的缩进规则单遍生成文本，边生成边过滤空白行并写入文件，
+# 不再构建第二棵 DOM，也不产生整份文档的多份拷贝。
+
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>'
+INDENT = "  "
+
+# XML 1.0 不允许的字符：旧流程会在 minidom.parseString 处报错
+_INVALID_XML_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+
+def _escape(text):
+    """与 minidom._write_data 相同的转义（文本和属性值都转义双引号）"""
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def _text(text):
+    """元素文本经 ET 序列化再由 expat 解析后，换行会被规范为 \\n"""
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return _escape(text)
+
+
+class _LineFilter:
+    """逐段写入，丢弃 strip() 后为空的行，行之间以 \\n 连接、末尾不加换行"""
+
+    __slots__ = ("write_out", "pending", "started")
+
+    def __init__(self, write_out):
+        self.write_out = write_out
+        self.pending = []  # 当前未结束的行
+        self.started = False
+
+    def write(self, chunk):
+        if "\n" not in chunk:
+            self.pending.append(chunk)
+            return
+        lines = chunk.split("\n")
+        lines[0] = "".join(self.pending) + lines[0] if self.pending else lines[0]
+        for line in lines[:-1]:
+            self._emit(line)
+        self.pending = [lines[-1]] if lines[-1] else []
+
+    def _emit(self, line):
+        if line.strip():
+            if self.started:
+                self.write_out("\n" + line)
+            else:
+                self.write_out(line)
+                self.started = True
+
+    def close(self):
+        if self.pending:
+            self._emit("".join(self.pending))
+            self.pending = []
+
+
+def _write_element(elem, indent, write, unit=INDENT):
+    """按 minidom Element.writexml 的规则输出（addindent=unit，默认两个空格，newl="\\n"）"""
+    tag = elem.tag
+    parts = [indent, "<", tag]
+    for name, value in elem.attrib.items():
+        parts.append(f' {name}="{_escape(value)}"')
+
+    text = elem.text
+    children = list(elem)
+    if not children:
+        if text:
+            # 唯一的子节点是文本：不换行、不缩进
+            parts.append(f">{_text(text)}</{tag}>\n")
+        else:
+            parts.append("/>\n")
+        write("".join(parts))
+        return
+
+    parts.append(">\n")
+    child_indent = indent + unit
+    if text:
+        parts.append(f"{child_indent}{_text(text)}\n")
+    write("".join(parts))
+    for child in children:
+        _write_element(child, child_indent, write, unit)
+        tail = child.tail
+        if tail:
+            write(f"{child_indent}{_text(tail)}\n")
+    write(f"{indent}</{tag}>\n")
+
+
+def _needs_fallback(root):
+    """命名空间、注释等特殊节点或非法字符交给旧流程处理（保持原有的输出或报错）"""
+    for elem in root.iter():
+        tag = elem.tag
+        if not isinstance(tag, str) or tag.startswith("{"):
+            return True
+        for value in (elem.text, elem.tail if elem is not root else None):
+            if value is not None and (not isinstance(value, str) or _INVALID_XML_RE.search(value)):
+                return True
+        for name, value in elem.attrib.items():
+            if not isinstance(name, str) or not isinstance(value, str):
+                return True
+            if name.startswith("{") or _INVALID_XML_RE.search(value):
+                return True
+    return False
+
+
+def legacy_pretty_xml(root):
+    """旧的 minidom 往返流程，作为特殊文档的回退和基准对照"""
+    xml_str = ET.tostring(root, encoding="utf-8")
+    parsed_str = minidom.parseString(xml_str)
+    pretty_str = parsed_str.toprettyxml(indent=INDENT, encoding="utf-8")
+    return "\n".join(line for line in pretty_str.decode("utf-8").split("\n") if line.strip())
+
+
+def stream_pretty_xml(root, write):
+    """把格式化后的文档分段交给 write（str）"""
+    if _needs_fallback(root):
+        write(legacy_pretty_xml(root))
+        return
+    _stream(root, write)
+
+
+def _stream(root, write):
+    line_filter = _LineFilter(write)
+    line_filter.write(XML_DECLARATION + "\n")
+    _write_element(root, "", line_filter.write)
+    line_filter.close()
+
+
+def format_element(elem, indent="", unit=INDENT):
+    """单个元素的格式化文本（与整份文档中的写法一致，首行带 indent，末尾无换行）"""
+    parts = []
+    line_filter = _LineFilter(parts.append)
+    _write_element(elem, indent, line_filter.write, unit)
+    line_filter.close()
+    return "".join(parts)
+
+
+def pretty_xml(root):
+    """格式化后的完整文档字符串"""
+    parts = []
+    stream_pretty_xml(root, parts.append)
+    return "".join(parts)
+
+
+def write_nfo(path, root, batch=None):
+    """格式化 root 并原子写入 path（UTF-8 文本模式，换行与旧流程一致）
+
+    batch 为 nfo_atomic.WriteBatch 时目录落盘推迟到批次结束。
+    """
+    legacy = legacy_pretty_xml(root) if _needs_fallback(root) else None
+    with atomic_open(path, "w", encoding="utf-8", batch=batch) as f:
+        if legacy is not None:
+            f.write(legacy)
+        else:
+            _stream(root, f.write)